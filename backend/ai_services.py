@@ -1,46 +1,58 @@
-import openai
-import os
+import asyncio
 from typing import Dict, Any, List
-import httpx
-from bs4 import BeautifulSoup
-import json
-import re
 
-# Настройка OpenAI
-openai.api_key = os.getenv("OPENAI_API_KEY")
+# Ответ LLM по общей схеме рецепта с починкой JSON и переспросом полей
+from llm_output import extract_structured
+from structured_data import is_complete
+from html_parser import parse_html_async
+import metrics
+from fetcher import fetch_text
+from content_reducer import reduce_page, record_outcome
+from classifier import classify
+
+# Поля, которые модель заполняет по странице и по тексту (подписи, транскрипции)
+# Кухню и сложность определяет локальный классификатор, а не модель
+URL_RECIPE_FIELDS = [
+    "title", "description", "ingredients", "instructions", "cooking_time",
+    "servings", "tags", "image_url"
+]
+TEXT_RECIPE_FIELDS = URL_RECIPE_FIELDS[:-1]
 
 async def extract_recipe_from_url(url: str) -> Dict[str, Any]:
     """
     Извлекает рецепт из URL с помощью AI
     """
     try:
-        # Получаем содержимое страницы
-        async with httpx.AsyncClient() as client:
-            response = await client.get(url)
-            response.raise_for_status()
-            html_content = response.text
-        
-        # Извлекаем текст с помощью BeautifulSoup
-        soup = BeautifulSoup(html_content, 'html.parser')
-        
-        # Удаляем скрипты и стили
-        for script in soup(["script", "style"]):
-            script.decompose()
+        # Получаем содержимое страницы через общий пул соединений
+        html_content = await fetch_text(url)
         
-        # Получаем текст
-        text = soup.get_text()
+        # Разбираем HTML в пуле процессов: разметка schema.org, картинка и
+        # очищенный текст страницы (без скриптов и стилей) за один обход
+        page = await parse_html_async(html_content)
         
-        # Очищаем текст
-        lines = (line.strip() for line in text.splitlines())
-        chunks = (phrase.strip() for line in lines for phrase in line.split("  "))
-        text = ' '.join(chunk for chunk in chunks if chunk)
+        # Сначала пробуем разметку schema.org (JSON-LD / microdata):
+        # если рецепт в ней полный, LLM не нужен
+        structured = page["structured"]
+        if is_complete(structured):
+            metrics.incr("extraction.structured_data")
+            recipe_data = complete_structured_recipe(structured, url)
+            recipe_data["image_url"] = recipe_data["image_url"] or page["image_url"]
+            return recipe_data
         
-        # Ограничиваем размер текста для GPT
-        if len(text) > 4000:
-            text = text[:4000]
+        # Вместо первых 4000 символов (обычно вступление и реклама) — блоки,
+        # больше всего похожие на рецепт, в пределах бюджета токенов
+        text = await asyncio.to_thread(reduce_page, page)
         
         # Используем GPT для извлечения структурированной информации
+        metrics.incr("extraction.llm")
         recipe_data = await extract_recipe_with_gpt(text, url)
+        record_outcome(recipe_data)
+        
+        # Поля, найденные в разметке, надежнее ответа модели
+        if structured:
+            recipe_data.update(structured)
+        if not recipe_data.get("image_url"):
+            recipe_data["image_url"] = page["image_url"]
         
         return recipe_data
         
@@ -77,8 +89,6 @@ async def extract_recipe_with_gpt(text: str, url: str) -> Dict[str, Any]:
             "instructions": ["шаг 1", "шаг 2", ...],
             "cooking_time": 30,
             "servings": 2,
-            "difficulty": "Easy/Medium/Hard",
-            "cuisine": "Italian/Chinese/Japanese/Indian/Mexican/French/Mediterranean/American/International",
             "tags": ["тег1", "тег2", ...],
             "image_url": "URL изображения или null"
         }
@@ -87,9 +97,7 @@ async def extract_recipe_with_gpt(text: str, url: str) -> Dict[str, Any]:
         1. Если информация не найдена, используй разумные значения по умолчанию
         2. cooking_time в минутах
         3. servings - количество порций
-        4. difficulty: Easy (до 30 мин), Medium (30-60 мин), Hard (более 60 мин)
-        5. cuisine: определи по названию или ингредиентам
-        6. tags: добавь релевантные теги (например, "вегетарианский", "быстро", "десерт")
+        4. tags: добавь релевантные теги (например, "вегетарианский", "быстро", "десерт")
         """
         
         user_prompt = f"""
@@ -100,22 +108,34 @@ async def extract_recipe_with_gpt(text: str, url: str) -> Dict[str, Any]:
         URL: {url}
         """
         
-        # Используем новый API OpenAI
-        client = openai.OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+        fallback = {
+            "title": "Recipe from URL",
+            "description": f"Recipe extracted from {url}",
+            "ingredients": [],
+            "instructions": [],
+            "cooking_time": 30,
+            "servings": 2,
+            "difficulty": "Easy",
+            "cuisine": "International",
+            "tags": [],
+            "image_url": None,
+            "source_url": url
+        }
         
-        response = client.chat.completions.create(
-            model="gpt-3.5-turbo",
-            messages=[
+        # Структурированный ответ по схеме RecipeCreate; невалидные поля
+        # переспрашиваются отдельно, остальные берутся из fallback
+        recipe_data = await extract_structured(
+            [
                 {"role": "system", "content": system_prompt},
                 {"role": "user", "content": user_prompt}
             ],
+            fields=URL_RECIPE_FIELDS,
+            defaults=fallback,
             temperature=0.3,
             max_tokens=1000
         )
         
-        # Парсим JSON ответ
-        content = response.choices[0].message.content
-        recipe_data = json.loads(content)
+        recipe_data.update(classify(recipe_data))
         
         # Добавляем source_url
         recipe_data["source_url"] = url
@@ -155,8 +175,6 @@ async def extract_recipe_from_text(text: str) -> Dict[str, Any]:
             "instructions": ["шаг 1", "шаг 2", ...],
             "cooking_time": 30,
             "servings": 2,
-            "difficulty": "Easy/Medium/Hard",
-            "cuisine": "Italian/Chinese/Japanese/Indian/Mexican/French/Mediterranean/American/International",
             "tags": ["тег1", "тег2", ...]
         }
         
@@ -164,26 +182,32 @@ async def extract_recipe_from_text(text: str) -> Dict[str, Any]:
         1. Если информация не найдена, используй разумные значения по умолчанию
         2. cooking_time в минутах
         3. servings - количество порций
-        4. difficulty: Easy (до 30 мин), Medium (30-60 мин), Hard (более 60 мин)
-        5. cuisine: определи по названию или ингредиентам
-        6. tags: добавь релевантные теги
+        4. tags: добавь релевантные теги
         """
         
-        # Используем новый API OpenAI
-        client = openai.OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+        fallback = {
+            "title": "Recipe",
+            "description": "Recipe extracted from text",
+            "ingredients": [],
+            "instructions": [],
+            "cooking_time": 30,
+            "servings": 2,
+            "difficulty": "Easy",
+            "cuisine": "International",
+            "tags": []
+        }
         
-        response = client.chat.completions.create(
-            model="gpt-3.5-turbo",
-            messages=[
+        recipe_data = await extract_structured(
+            [
                 {"role": "system", "content": system_prompt},
                 {"role": "user", "content": f"Извлеки информацию о рецепте из следующего текста:\n\n{text}"}
             ],
+            fields=TEXT_RECIPE_FIELDS,
+            defaults=fallback,
             temperature=0.3,
             max_tokens=1000
         )
-        
-        content = response.choices[0].message.content
-        recipe_data = json.loads(content)
+        recipe_data.update(classify(recipe_data))
         
         return recipe_data
         
@@ -201,6 +225,45 @@ async def extract_recipe_from_text(text: str) -> Dict[str, Any]:
             "tags": []
         }
 
+def recipe_to_document(recipe_data: Dict[str, Any], user_id: str, source_url: str) -> Dict[str, Any]:
+    """
+    Собирает документ рецепта для сохранения из результата извлечения
+    """
+    return {
+        "user_id": user_id,
+        "title": recipe_data.get("title", "Extracted Recipe"),
+        "description": recipe_data.get("description", ""),
+        "ingredients": recipe_data.get("ingredients", []),
+        "instructions": recipe_data.get("instructions", []),
+        "cooking_time": recipe_data.get("cooking_time", 30),
+        "servings": recipe_data.get("servings", 2),
+        "difficulty": recipe_data.get("difficulty", "Easy"),
+        "cuisine": recipe_data.get("cuisine", "International"),
+        "tags": recipe_data.get("tags", []),
+        "image_url": recipe_data.get("image_url"),
+        "source_url": source_url,
+        "is_favorite": False
+    }
+
+def complete_structured_recipe(recipe: Dict[str, Any], url: str) -> Dict[str, Any]:
+    """
+    Дополняет рецепт из разметки schema.org недостающими полями без обращения к LLM
+    """
+    classified = classify(recipe)
+    return {
+        "title": recipe["title"],
+        "description": recipe.get("description", ""),
+        "ingredients": recipe.get("ingredients", []),
+        "instructions": recipe.get("instructions", []),
+        "cooking_time": classified["cooking_time"],
+        "servings": recipe.get("servings", 2),
+        "difficulty": classified["difficulty"],
+        "cuisine": recipe.get("cuisine") or classified["cuisine"],
+        "tags": recipe.get("tags", []),
+        "image_url": recipe.get("image_url"),
+        "source_url": url
+    }
+
 def parse_ingredients(text: str) -> List[str]:
     """
     Парсит ингредиенты из текста
@@ -228,45 +291,3 @@ def parse_instructions(text: str) -> List[str]:
             instructions.append(line)
     
     return instructions
-
-def estimate_cooking_time(instructions: List[str]) -> int:
-    """
-    Оценивает время приготовления на основе количества инструкций
-    """
-    base_time = 30
-    time_per_step = 10
-    return base_time + (len(instructions) * time_per_step)
-
-def determine_difficulty(cooking_time: int, ingredients_count: int) -> str:
-    """
-    Определяет сложность рецепта
-    """
-    if cooking_time <= 30 and ingredients_count <= 5:
-        return "Easy"
-    elif cooking_time <= 60 and ingredients_count <= 10:
-        return "Medium"
-    else:
-        return "Hard"
-
-def determine_cuisine(title: str, ingredients: List[str]) -> str:
-    """
-    Определяет кухню на основе названия и ингредиентов
-    """
-    title_lower = title.lower()
-    ingredients_text = ' '.join(ingredients).lower()
-    
-    cuisines = {
-        'italian': ['паста', 'ризотто', 'пицца', 'базилик', 'оливковое масло'],
-        'chinese': ['рис', 'соя', 'имбирь', 'чеснок', 'кунжут'],
-        'japanese': ['суши', 'сашими', 'мисо', 'васаби', 'нори'],
-        'indian': ['карри', 'куркума', 'имбирь', 'чеснок', 'кориандр'],
-        'mexican': ['тако', 'буррито', 'авокадо', 'перец чили', 'лайм'],
-        'french': ['вино', 'сыр', 'масло', 'лук', 'чеснок'],
-        'mediterranean': ['оливки', 'оливковое масло', 'томаты', 'базилик', 'фета']
-    }
-    
-    for cuisine, keywords in cuisines.items():
-        if any(keyword in title_lower for keyword in keywords) or any(keyword in ingredients_text for keyword in keywords):
-            return cuisine.capitalize()
-    
-    return "International"
@@ -0,0 +1,120 @@
+import asyncio
+import hashlib
+import os
+from array import array
+from typing import Dict, AsyncIterator, Optional
+
+from dotenv import load_dotenv
+
+import metrics
+
+load_dotenv()
+
+FFMPEG_BINARY = os.getenv("FFMPEG_BINARY", "ffmpeg")
+# Распознаванию речи хватает 16 кГц моно; opus дает ~3 КБ/с вместо ~32 КБ/с у PCM
+AUDIO_SAMPLE_RATE = int(os.getenv("AUDIO_SAMPLE_RATE", 16000))
+AUDIO_CODEC = os.getenv("AUDIO_CODEC", "opus")
+AUDIO_SEGMENT_SECONDS = int(os.getenv("AUDIO_SEGMENT_SECONDS", 60))
+# Отпечаток строится по первым секундам звука, огрубленным до 8 кГц
+FINGERPRINT_SECONDS = int(os.getenv("AUDIO_FINGERPRINT_SECONDS", 30))
+FINGERPRINT_SAMPLE_RATE = 8000
+FINGERPRINT_BLOCK_SECONDS = 0.1
+
+_CODECS = {
+    "opus": ("ogg", ["-c:a", "libopus", "-b:a", "24k", "-application", "voip"]),
+    "flac": ("flac", ["-c:a", "flac"]),
+}
+
+def _codec():
+    if AUDIO_CODEC not in _CODECS:
+        raise Exception(f"Неподдерживаемый AUDIO_CODEC: {AUDIO_CODEC}")
+    return _CODECS[AUDIO_CODEC]
+
+def _header_args(headers: Dict[str, str] = None) -> list:
+    if not headers:
+        return []
+    return ["-headers", "".join(f"{key}: {value}\r\n" for key, value in headers.items())]
+
+def _input_args(source: str, headers: Dict[str, str] = None) -> list:
+    args = [FFMPEG_BINARY, "-nostdin", "-hide_banner", "-loglevel", "error", "-y", *_header_args(headers)]
+    # -vn: видеопоток не декодируется вовсе
+    return args + ["-i", source, "-vn", "-ac", "1", "-ar", str(AUDIO_SAMPLE_RATE)]
+
+async def stream_audio_segments(source: str, output_dir: str, headers: Dict[str, str] = None,
+                                segment_seconds: int = None) -> AsyncIterator[str]:
+    """
+    Декодирует аудио из файла или URL в сегменты по segment_seconds секунд и
+    отдает путь к каждому сегменту, как только ffmpeg его дописал. Так
+    транскрипцию первых сегментов можно начинать, пока видео еще скачивается
+    """
+    extension, codec_args = _codec()
+    pattern = os.path.join(output_dir, f"audio_%04d.{extension}")
+    process = await asyncio.create_subprocess_exec(
+        *_input_args(source, headers), *codec_args,
+        "-f", "segment",
+        "-segment_time", str(segment_seconds or AUDIO_SEGMENT_SECONDS),
+        "-reset_timestamps", "1",
+        # ffmpeg пишет в stdout имя каждого завершенного сегмента
+        "-segment_list", "pipe:1",
+        "-segment_list_type", "flat",
+        pattern,
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.PIPE
+    )
+    stderr_task = asyncio.create_task(process.stderr.read())
+    total_bytes = 0
+    try:
+        while True:
+            line = await process.stdout.readline()
+            if not line:
+                break
+            segment_path = os.path.join(output_dir, os.path.basename(line.decode().strip()))
+            total_bytes += os.path.getsize(segment_path)
+            yield segment_path
+        await process.wait()
+        stderr = await stderr_task
+        if process.returncode != 0:
+            raise Exception(f"Ошибка ffmpeg: {stderr.decode(errors='replace').strip()}")
+        metrics.observe("audio.bytes", total_bytes)
+    finally:
+        if process.returncode is None:
+            process.kill()
+            await process.wait()
+        if not stderr_task.done():
+            stderr_task.cancel()
+
+async def fingerprint(source: str, headers: Dict[str, str] = None, seconds: int = None) -> Optional[str]:
+    """
+    Грубый отпечаток первых seconds секунд звука: для каждой пары соседних
+    блоков по 100 мс бит «громкость выросла». Он одинаков у роликов с одним
+    и тем же звуком (трендовая музыка), поэтому сам по себе ролик не
+    определяет — см. transcript_cache.fingerprint_key. Возвращает None,
+    если звука слишком мало
+    """
+    process = await asyncio.create_subprocess_exec(
+        FFMPEG_BINARY, "-nostdin", "-hide_banner", "-loglevel", "error", *_header_args(headers),
+        "-t", str(seconds or FINGERPRINT_SECONDS), "-i", source, "-vn",
+        "-ac", "1", "-ar", str(FINGERPRINT_SAMPLE_RATE), "-f", "s16le", "pipe:1",
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.PIPE
+    )
+    stdout, stderr = await process.communicate()
+    if process.returncode != 0:
+        raise Exception(f"Ошибка ffmpeg: {stderr.decode(errors='replace').strip()}")
+
+    # Подсчет энергии по сотням тысяч отсчетов — вне event loop
+    return await asyncio.to_thread(_envelope_hash, stdout)
+
+def _envelope_hash(pcm: bytes) -> Optional[str]:
+    samples = array("h")
+    samples.frombytes(pcm[:len(pcm) - len(pcm) % 2])
+    block = int(FINGERPRINT_SAMPLE_RATE * FINGERPRINT_BLOCK_SECONDS)
+    energies = [
+        sum(sample * sample for sample in samples[start:start + block])
+        for start in range(0, len(samples) - block + 1, block)
+    ]
+    # Меньше 5 секунд звука или полная тишина — отпечаток ненадежен
+    if len(energies) < 50 or not any(energies):
+        return None
+    bits = "".join("1" if later > earlier else "0" for earlier, later in zip(energies, energies[1:]))
+    return hashlib.sha1(bits.encode()).hexdigest()
@@ -0,0 +1,158 @@
+import asyncio
+import hashlib
+import os
+import time
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+import jwt
+from dotenv import load_dotenv
+
+import fetcher
+import metrics
+
+load_dotenv()
+
+# Проект Supabase: токены подписаны ключами из JWKS проекта (ES256/RS256)
+SUPABASE_URL = os.getenv("SUPABASE_URL", "").rstrip("/")
+SUPABASE_JWKS_URL = os.getenv(
+    "SUPABASE_JWKS_URL", f"{SUPABASE_URL}/auth/v1/.well-known/jwks.json" if SUPABASE_URL else ""
+)
+# Общий секрет проекта для токенов HS256 (старые проекты Supabase)
+JWT_SECRET = os.getenv("JWT_SECRET", "")
+JWT_AUDIENCE = os.getenv("JWT_AUDIENCE", "authenticated")
+JWT_ISSUER = os.getenv("JWT_ISSUER", f"{SUPABASE_URL}/auth/v1" if SUPABASE_URL else "")
+JWT_LEEWAY = int(os.getenv("JWT_LEEWAY", 30))
+# Как часто фоном обновлять JWKS и не чаще какого интервала — при незнакомом kid
+AUTH_JWKS_REFRESH = int(os.getenv("AUTH_JWKS_REFRESH", 600))
+AUTH_JWKS_MIN_REFRESH = int(os.getenv("AUTH_JWKS_MIN_REFRESH", 30))
+# Сколько уже проверенных токенов помнить (до истечения их срока)
+AUTH_TOKEN_CACHE_SIZE = int(os.getenv("AUTH_TOKEN_CACHE_SIZE", 10000))
+
+_ASYMMETRIC_ALGORITHMS = {"RS256", "RS384", "RS512", "ES256", "ES384", "ES512", "EdDSA"}
+
+class AuthError(Exception):
+    """Токен не прошел проверку"""
+
+# kid -> ключ из JWKS
+_keys: Dict[str, jwt.PyJWK] = {}
+_keys_loaded_at = 0.0
+_refresh_lock = asyncio.Lock()
+_refresher: Optional[asyncio.Task] = None
+# sha256(токен) -> (user_id, exp)
+_verified: "OrderedDict[bytes, Tuple[str, float]]" = OrderedDict()
+
+async def refresh_keys() -> None:
+    """
+    Загружает JWKS проекта (условным запросом: при 304 ключи берутся из кэша загрузчика)
+    """
+    global _keys, _keys_loaded_at
+    if not SUPABASE_JWKS_URL:
+        return
+    jwks = await fetcher.fetch_json(SUPABASE_JWKS_URL)
+    keys = {}
+    for key in jwks.get("keys", []):
+        try:
+            keys[key.get("kid", "")] = jwt.PyJWK(key)
+        except jwt.PyJWTError as e:
+            print(f"[ERROR] Пропущен ключ JWKS {key.get('kid')}: {e}")
+    _keys = keys
+    _keys_loaded_at = time.monotonic()
+    metrics.incr("auth.jwks_refreshes")
+
+async def _refresh_loop() -> None:
+    while True:
+        try:
+            await refresh_keys()
+        except Exception as e:
+            # Старые ключи остаются в силе до следующей попытки
+            print(f"[ERROR] Не удалось обновить JWKS: {e}")
+        await asyncio.sleep(AUTH_JWKS_REFRESH)
+
+async def start() -> None:
+    """
+    Запускает фоновое обновление JWKS (при старте приложения)
+    """
+    global _refresher
+    if not SUPABASE_JWKS_URL and not JWT_SECRET:
+        print("[ERROR] Аутентификация не настроена: задайте SUPABASE_URL или JWT_SECRET")
+    if SUPABASE_JWKS_URL and _refresher is None:
+        _refresher = asyncio.create_task(_refresh_loop())
+
+async def stop() -> None:
+    """
+    Останавливает фоновое обновление JWKS
+    """
+    global _refresher
+    if _refresher is not None:
+        _refresher.cancel()
+        await asyncio.gather(_refresher, return_exceptions=True)
+        _refresher = None
+
+async def _signing_key(kid: str) -> jwt.PyJWK:
+    key = _keys.get(kid)
+    if key is None and SUPABASE_JWKS_URL:
+        # Незнакомый kid — ключи могли ротировать; обновляем не чаще AUTH_JWKS_MIN_REFRESH
+        async with _refresh_lock:
+            key = _keys.get(kid)
+            if key is None and time.monotonic() - _keys_loaded_at >= AUTH_JWKS_MIN_REFRESH:
+                try:
+                    await refresh_keys()
+                except Exception as e:
+                    print(f"[ERROR] Не удалось обновить JWKS: {e}")
+                key = _keys.get(kid)
+    if key is None:
+        raise AuthError("Unknown signing key")
+    return key
+
+async def _decode(token: str) -> Dict:
+    try:
+        header = jwt.get_unverified_header(token)
+    except jwt.PyJWTError as e:
+        raise AuthError(str(e))
+    algorithm = header.get("alg")
+    if algorithm == "HS256" and JWT_SECRET:
+        key, algorithms = JWT_SECRET, ["HS256"]
+    elif algorithm in _ASYMMETRIC_ALGORITHMS:
+        key = (await _signing_key(header.get("kid", ""))).key
+        algorithms = [algorithm]
+    else:
+        raise AuthError(f"Unsupported token algorithm: {algorithm}")
+    options = {"require": ["exp", "sub"]}
+    try:
+        return jwt.decode(
+            token, key, algorithms=algorithms, audience=JWT_AUDIENCE or None,
+            issuer=JWT_ISSUER or None, leeway=JWT_LEEWAY,
+            options={**options, "verify_aud": bool(JWT_AUDIENCE)}
+        )
+    except jwt.PyJWTError as e:
+        raise AuthError(str(e))
+
+async def verify_token(token: str) -> str:
+    """
+    Проверяет JWT Supabase и возвращает user_id (claim sub). Повторная
+    проверка того же токена до истечения его срока — поиск в LRU без
+    криптографии, поэтому результат одинаков на всех воркерах и стоит
+    микросекунды
+    """
+    digest = hashlib.sha256(token.encode()).digest()
+    cached = _verified.get(digest)
+    if cached:
+        user_id, expires_at = cached
+        if expires_at > time.time():
+            _verified.move_to_end(digest)
+            metrics.incr("auth.cache_hits")
+            return user_id
+        del _verified[digest]
+
+    metrics.incr("auth.verifications")
+    try:
+        claims = await _decode(token)
+    except AuthError:
+        metrics.incr("auth.rejected")
+        raise
+    user_id = str(claims["sub"])
+    _verified[digest] = (user_id, float(claims["exp"]))
+    while len(_verified) > AUTH_TOKEN_CACHE_SIZE:
+        _verified.popitem(last=False)
+    return user_id
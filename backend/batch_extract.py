@@ -0,0 +1,115 @@
+import asyncio
+import os
+from typing import Dict, Any, List, AsyncIterator
+from urllib.parse import urlsplit
+
+from dotenv import load_dotenv
+
+import database
+import extraction_cache
+import metrics
+
+load_dotenv()
+
+# Сколько URL можно передать в одном пакете
+BATCH_EXTRACT_MAX_URLS = int(os.getenv("BATCH_EXTRACT_MAX_URLS", 100))
+# Сколько URL пакета извлекается одновременно, всего и с одного сайта
+BATCH_EXTRACT_CONCURRENCY = int(os.getenv("BATCH_EXTRACT_CONCURRENCY", 8))
+BATCH_EXTRACT_CONCURRENCY_PER_HOST = int(os.getenv("BATCH_EXTRACT_CONCURRENCY_PER_HOST", 2))
+
+# Пакеты, которые еще выполняются (в том числе после отключения клиента)
+_running = set()
+
+def dedupe_urls(urls: List[str]) -> Dict[str, List[str]]:
+    """
+    Группирует URL по нормализованному виду: первый URL группы извлекается,
+    остальные считаются его дубликатами
+    """
+    groups = {}
+    for url in urls:
+        groups.setdefault(extraction_cache.normalize_url(url), []).append(url)
+    return {group[0]: group[1:] for group in groups.values()}
+
+async def _extract(url: str) -> Dict[str, Any]:
+    # Стек извлечения (yt-dlp, OpenAI, BeautifulSoup) грузится при первом использовании
+    from ai_services import extract_recipe_from_url
+    from media_processor import MediaProcessor, is_media_url
+
+    if is_media_url(url):
+        return await MediaProcessor().process_url(url)
+    return await extraction_cache.get_or_extract(url, extract_recipe_from_url)
+
+async def _run(user_id: str, urls: List[str], queue: asyncio.Queue) -> None:
+    from ai_services import recipe_to_document
+
+    global_semaphore = asyncio.Semaphore(BATCH_EXTRACT_CONCURRENCY)
+    host_semaphores: Dict[str, asyncio.Semaphore] = {}
+    documents = []
+    document_urls = []
+    counts = {"extracted": 0, "failed": 0, "duplicate": 0, "saved": 0}
+
+    async def extract_one(url: str) -> None:
+        host = urlsplit(url).netloc.lower()
+        host_semaphore = host_semaphores.setdefault(host, asyncio.Semaphore(BATCH_EXTRACT_CONCURRENCY_PER_HOST))
+        try:
+            async with host_semaphore, global_semaphore:
+                recipe_data = await _extract(url)
+            if not extraction_cache.is_cacheable(recipe_data):
+                # Заглушка вместо рецепта (извлечение не удалось) — не сохраняем
+                counts["failed"] += 1
+                await queue.put({"url": url, "status": "failed", "error": "Recipe not found"})
+                return
+            documents.append(recipe_to_document(recipe_data, user_id, url))
+            document_urls.append(url)
+            counts["extracted"] += 1
+            await queue.put({"url": url, "status": "extracted", "title": recipe_data.get("title")})
+        except Exception as e:
+            counts["failed"] += 1
+            await queue.put({"url": url, "status": "failed", "error": str(e)})
+
+    try:
+        groups = dedupe_urls(urls)
+        for url, duplicates in groups.items():
+            for duplicate in duplicates:
+                counts["duplicate"] += 1
+                await queue.put({"url": duplicate, "status": "duplicate", "duplicate_of": url})
+        await asyncio.gather(*(extract_one(url) for url in groups))
+
+        # Все извлеченные рецепты пакета сохраняются одним insert_many
+        if documents:
+            try:
+                recipe_ids = await database.insert_recipes(documents)
+            except Exception as e:
+                recipe_ids = [None] * len(documents)
+                print(f"[ERROR] Ошибка сохранения пакета рецептов: {e}")
+            for url, recipe_id in zip(document_urls, recipe_ids):
+                if recipe_id:
+                    counts["saved"] += 1
+                    await queue.put({"url": url, "status": "saved", "recipe_id": recipe_id})
+                else:
+                    await queue.put({"url": url, "status": "failed", "error": "Failed to save recipe"})
+
+        metrics.incr("batch_extract.urls", len(urls))
+        metrics.incr("batch_extract.saved", counts["saved"])
+        await queue.put({"status": "done", **counts})
+    finally:
+        # Сигнал конца потока для генератора ответа
+        await queue.put(None)
+
+async def run_batch(user_id: str, urls: List[str]) -> AsyncIterator[Dict[str, Any]]:
+    """
+    Извлекает рецепты по списку URL и отдает события по мере готовности:
+    duplicate, extracted/failed по каждому URL, затем saved после общего
+    insert_many и итоговое done. Пакет выполняется отдельной задачей, поэтому
+    отключение клиента не отменяет извлечение и сохранение
+    """
+    queue: asyncio.Queue = asyncio.Queue()
+    task = asyncio.create_task(_run(user_id, urls, queue))
+    _running.add(task)
+    task.add_done_callback(_running.discard)
+    while True:
+        event = await queue.get()
+        if event is None:
+            break
+        yield event
+    await task
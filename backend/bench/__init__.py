@@ -0,0 +1,3 @@
+"""
+Бенчмарки сервиса. Запуск из каталога backend: python -m bench <имя> [аргументы]
+"""
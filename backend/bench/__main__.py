@@ -0,0 +1,29 @@
+import importlib
+import sys
+from typing import Dict, List, Tuple
+
+# имя -> (модуль пакета bench, функция, аргументы и описание для справки)
+BENCHMARKS: Dict[str, Tuple[str, str, str]] = {
+    "reads": ("mongo", "reads", "[запросов/с на клиента] — задержка чтения под нагрузкой записи, pymongo против Motor"),
+    "writes": ("mongo", "writes", "— запросов к базе на PUT и DELETE рецепта, было и стало"),
+    "llm": ("llm", "main", "[запросов] — общий пул AsyncOpenAI против клиента на вызов (сервер-заглушка, 200 мс)"),
+    "html": ("html_parsing", "main", "[файлы или каталоги с HTML] — время разбора и остановки event loop"),
+    "audio": ("audio_extraction", "main", "[видео] — звук ролика одним WAV против потоковых сегментов ffmpeg"),
+    "transcription": ("transcription_rtf", "main", "<аудио> [ядра через запятую] — RTF локального распознавания по числу ядер"),
+    "search": ("search_queries", "main", "[N] [--no-seed] — засеять N рецептов (по умолчанию 1 000 000) и замерить поиск"),
+    "similarity": ("similar_recipes", "main", "[N ...] — перебор против IVF (по умолчанию до 1 000 000 рецептов)"),
+    "workers": ("workers", "main", "[путь] — время запуска и пропускная способность для 1, 2, 4... воркеров"),
+}
+
+def main(argv: List[str]) -> None:
+    if not argv or argv[0] not in BENCHMARKS:
+        print("Использование: python -m bench <имя> [аргументы]")
+        for name, (_, _, usage) in BENCHMARKS.items():
+            print(f"  {name} {usage}")
+        sys.exit(1)
+    module, function, _ = BENCHMARKS[argv[0]]
+    # Модули бенчмарков импортируются по требованию: у каждого свои тяжелые зависимости
+    getattr(importlib.import_module(f"bench.{module}"), function)(argv[1:])
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,76 @@
+import asyncio
+import multiprocessing
+import os
+import subprocess
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List
+
+from audio import AUDIO_SAMPLE_RATE, FFMPEG_BINARY, stream_audio_segments
+
+def _full_file(video: str, output_dir: str) -> List[str]:
+    # Прежний путь: вся дорожка декодируется в один WAV, транскрипция ждет его целиком
+    path = os.path.join(output_dir, "audio.wav")
+    subprocess.run([
+        FFMPEG_BINARY, "-nostdin", "-hide_banner", "-loglevel", "error", "-y",
+        "-i", video, "-vn", "-ac", "1", "-ar", str(AUDIO_SAMPLE_RATE), path
+    ], check=True)
+    return [path]
+
+def _variant(name: str, video: str, output_dir: str) -> Dict[str, float]:
+    # Выполняется в отдельном процессе: пиковая память — только этого варианта
+    import resource
+
+    started = time.perf_counter()
+    first_segment = None
+    if name == "весь файл":
+        paths = _full_file(video, output_dir)
+    else:
+        async def collect():
+            nonlocal first_segment
+            segments = []
+            async for path in stream_audio_segments(video, output_dir):
+                first_segment = first_segment or time.perf_counter() - started
+                segments.append(path)
+            return segments
+        paths = asyncio.run(collect())
+    elapsed = time.perf_counter() - started
+    peak = max(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss, resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss)
+    return {
+        "seconds": elapsed,
+        "first": first_segment or elapsed,
+        "megabytes": sum(os.path.getsize(path) for path in paths) / 2 ** 20,
+        "rss": peak / 1024
+    }
+
+def _benchmark(video: str = None, duration: int = 180) -> None:
+    """
+    Извлечение звука из ролика через ffmpeg: вся дорожка в один WAV против
+    потокового разбиения на сегменты. Время, время до первого сегмента,
+    размер звука на диске и пиковая память (процесс и ffmpeg). Без video
+    берется синтетический ролик 720x1280 длиной duration секунд
+    """
+    with tempfile.TemporaryDirectory() as temp_dir:
+        if not video:
+            video = os.path.join(temp_dir, "video.mp4")
+            subprocess.run([
+                FFMPEG_BINARY, "-nostdin", "-loglevel", "error", "-y",
+                "-f", "lavfi", "-i", "testsrc2=size=720x1280:rate=30",
+                "-f", "lavfi", "-i", "sine=frequency=440:sample_rate=44100",
+                "-t", str(duration), "-c:v", "libx264", "-preset", "ultrafast", "-c:a", "aac", video
+            ], check=True)
+        print(f"Ролик: {os.path.getsize(video) / 2 ** 20:.1f} МБ")
+        print(f"{'способ':>10} {'время, с':>9} {'первый сегмент, с':>18} {'звук, МБ':>9} {'память, МБ':>11}")
+        for name in ("весь файл", "сегменты"):
+            output_dir = os.path.join(temp_dir, str(len(os.listdir(temp_dir))))
+            os.makedirs(output_dir)
+            with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn")) as pool:
+                result = pool.submit(_variant, name, video, output_dir).result()
+            print(
+                f"{name:>10} {result['seconds']:>9.2f} {result['first']:>18.2f} "
+                f"{result['megabytes']:>9.2f} {result['rss']:>11.0f}"
+            )
+
+def main(args: List[str]) -> None:
+    _benchmark(args[0] if args else None)
@@ -0,0 +1,36 @@
+import asyncio
+import random
+import time
+from typing import List
+
+def percentile(values: list, share: float) -> float:
+    """
+    Перцентиль отсортированного списка (share от 0 до 1)
+    """
+    return values[min(len(values) - 1, int(len(values) * share))] if values else 0.0
+
+async def open_loop(operation, rate: float, deadline: float, latencies: list = None) -> None:
+    """
+    Вызывает operation rate раз в секунду до deadline. Запросы приходят по
+    расписанию, а не после ответа на предыдущий: если event loop заблокирован,
+    ожидание в очереди входит в задержку, как у клиента API
+    """
+    interval = 1 / rate
+    # Случайная фаза, чтобы клиенты не приходили все разом
+    scheduled = time.perf_counter() + random.uniform(0, interval)
+    while scheduled < deadline:
+        await asyncio.sleep(max(0.0, scheduled - time.perf_counter()))
+        await operation()
+        if latencies is not None:
+            latencies.append(time.perf_counter() - scheduled)
+        scheduled += interval
+
+async def measure_stalls(stalls: List[float], interval: float = 0.01) -> None:
+    """
+    Пишет в stalls, насколько позже срока просыпается задача, — столько
+    event loop был занят. Запускается задачей и отменяется после замера
+    """
+    while True:
+        expected = time.perf_counter() + interval
+        await asyncio.sleep(interval)
+        stalls.append(time.perf_counter() - expected)
@@ -0,0 +1,94 @@
+import asyncio
+import importlib.util
+import os
+import time
+from typing import List
+
+from html_parser import BLOCK_KEYWORDS, parse_html, parse_html_async, shutdown_executor
+from bench.common import measure_stalls
+
+def _synthetic_page(ads: int = 5500) -> str:
+    """
+    Страница рецепта с рекламой и меню вокруг (~1,5 МБ)
+    """
+    noise = "".join(
+        f'<div class="ad-slot banner-{number}"><a href="/promo/{number}"><span>Реклама {number}</span>'
+        f'<img src="/ads/{number}.gif" width="300" height="50"></a><p>Скидки на кухонную технику '
+        f'и доставку продуктов, акция номер {number}</p></div>'
+        for number in range(ads)
+    )
+    ingredients = "".join(f"<li>Ингредиент {number} — {number * 10} г</li>" for number in range(15))
+    steps = "".join(f"<li>Шаг {number}. Перемешайте и готовьте {number + 2} минут.</li>" for number in range(10))
+    return (
+        '<html><head><meta property="og:image" content="/recipe.jpg"><style>body{margin:0}</style></head>'
+        f'<body><nav>{noise[:len(noise) // 3]}</nav><article class="recipe-card"><h1>Пирог</h1>'
+        f'<div class="recipe-ingredients"><ul>{ingredients}</ul></div>'
+        f'<div class="recipe-instructions"><ol>{steps}</ol></div></article>'
+        f'<aside>{noise[len(noise) // 3:]}</aside><script>var x = 1;</script></body></html>'
+    )
+
+def _legacy_parse(html: str) -> str:
+    # Прежний разбор: html.parser и отдельный find_all на каждый признак и ключевое слово
+    from bs4 import BeautifulSoup
+
+    soup = BeautifulSoup(html, "html.parser")
+    soup.find("meta", property="og:image")
+    soup.find_all("img")
+    blocks = []
+    for keyword in BLOCK_KEYWORDS:
+        blocks += soup.find_all(class_=lambda value: value and keyword in value.lower())
+    for tag in soup.find_all(["ul", "ol", "p"]):
+        tag.get_text(separator=" ", strip=True)
+    for tag in soup(["script", "style"]):
+        tag.decompose()
+    return soup.get_text()
+
+async def _benchmark_loop(pages: List[str]) -> None:
+    async def inline(html):
+        parse_html(html)
+        await asyncio.sleep(0)
+
+    # Первый вызов поднимает пул процессов — в замер он не входит
+    await parse_html_async(pages[0])
+    for name, parse in (("в event loop", inline), ("пул процессов", parse_html_async)):
+        stalls = []
+        ticker = asyncio.create_task(measure_stalls(stalls))
+        started = time.perf_counter()
+        await asyncio.gather(*(parse(html) for html in pages))
+        elapsed = time.perf_counter() - started
+        ticker.cancel()
+        print(f"{name:>14}: {len(pages)} страниц за {elapsed:.2f} с, остановка loop до {max(stalls, default=elapsed) * 1000:.0f} мс")
+
+def _benchmark(paths: List[str], rounds: int = 5) -> None:
+    """
+    Разбор корпуса сохраненных страниц (по умолчанию — синтетическая страница
+    на 1,5 МБ): прежний разбор против одного обхода на разных бэкендах и
+    задержки event loop при разборе в loop и в пуле процессов
+    """
+    pages = []
+    for path in paths:
+        names = [os.path.join(path, name) for name in sorted(os.listdir(path))] if os.path.isdir(path) else [path]
+        for name in names:
+            with open(name, encoding="utf-8", errors="replace") as file:
+                pages.append(file.read())
+    pages = pages or [_synthetic_page()]
+    megabytes = sum(len(html.encode()) for html in pages) / 2 ** 20
+    print(f"Страниц: {len(pages)}, {megabytes:.1f} МБ")
+
+    variants = [("прежний, html.parser", _legacy_parse), ("один обход, html.parser", lambda html: parse_html(html, "html.parser"))]
+    if importlib.util.find_spec("lxml"):
+        variants.append(("один обход, lxml", lambda html: parse_html(html, "lxml")))
+    for name, parse in variants:
+        started = time.perf_counter()
+        for _ in range(rounds):
+            for html in pages:
+                parse(html)
+        print(f"{name:>24}: {(time.perf_counter() - started) * 1000 / (rounds * len(pages)):7.1f} мс на страницу")
+
+    try:
+        asyncio.run(_benchmark_loop((pages * 16)[:max(16, len(pages))]))
+    finally:
+        shutdown_executor()
+
+def main(args: List[str]) -> None:
+    _benchmark(args)
@@ -0,0 +1,82 @@
+import asyncio
+import json
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import List
+
+from bench.common import measure_stalls
+
+def _start_mock_server(latency: float, model: str) -> ThreadingHTTPServer:
+    """
+    Локальный OpenAI-совместимый сервер: отвечает на chat.completions через latency секунд
+    """
+    body = json.dumps({
+        "id": "bench", "object": "chat.completion", "created": 0, "model": model,
+        "choices": [{"index": 0, "message": {"role": "assistant", "content": "{}"}, "finish_reason": "stop"}],
+        "usage": {"prompt_tokens": 1, "completion_tokens": 1, "total_tokens": 2}
+    }).encode()
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_POST(self):
+            self.rfile.read(int(self.headers.get("content-length", 0)))
+            time.sleep(latency)
+            self.send_response(200)
+            self.send_header("content-type", "application/json")
+            self.send_header("content-length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+async def _benchmark(requests: int = 100, latency: float = 0.2) -> None:
+    """
+    Одновременные запросы к локальному серверу-заглушке: новый синхронный
+    клиент OpenAI на каждый вызов (как было) против общего AsyncOpenAI с пулом
+    соединений. Показывает общее время и самую долгую остановку event loop
+    """
+    server = _start_mock_server(latency, os.getenv("OPENAI_MODEL", "gpt-3.5-turbo"))
+    base_url = f"http://127.0.0.1:{server.server_port}/v1"
+    # Настройки провайдера читаются при импорте llm_client и создании клиента
+    os.environ["LLM_PROVIDERS"] = "openai"
+    os.environ["LLM_OPENAI_BASE_URL"] = base_url
+    os.environ["LLM_OPENAI_API_KEY"] = "bench"
+    import httpx
+    import openai
+    import llm_client
+
+    messages = [{"role": "user", "content": "bench"}]
+
+    async def legacy():
+        # Как раньше: новый клиент (и новое соединение) на каждый вызов, запрос блокирует loop
+        client = openai.OpenAI(api_key="bench", base_url=base_url, http_client=httpx.Client())
+        client.chat.completions.create(model=llm_client.OPENAI_MODEL, messages=messages)
+
+    async def pooled():
+        await llm_client.chat_completion(messages)
+
+    print(f"{'клиент':>12} {'запросов':>9} {'время, с':>9} {'запросов/с':>11} {'остановка loop, мс':>19}")
+    try:
+        for name, call in (("OpenAI", legacy), ("AsyncOpenAI", pooled)):
+            stalls = []
+            ticker = asyncio.create_task(measure_stalls(stalls))
+            started = time.perf_counter()
+            await asyncio.gather(*(call() for _ in range(requests)))
+            elapsed = time.perf_counter() - started
+            ticker.cancel()
+            print(f"{name:>12} {requests:>9} {elapsed:>9.2f} {requests / elapsed:>11.1f} {max(stalls, default=elapsed) * 1000:>19.0f}")
+    finally:
+        await llm_client.close_client()
+        server.shutdown()
+
+def main(args: List[str]) -> None:
+    asyncio.run(_benchmark(int(args[0]) if args else 100))
@@ -0,0 +1,152 @@
+import asyncio
+import time
+from typing import List
+
+from bson import ObjectId
+from pymongo import DESCENDING
+
+import database
+from bench.common import open_loop, percentile
+
+# Рецепты бенчмарков пишутся этому пользователю и удаляются после замера
+BENCH_USER_ID = "bench_database"
+
+def _recipe(number: int) -> dict:
+    return {
+        "user_id": BENCH_USER_ID,
+        "title": f"Рецепт {number}",
+        "description": "",
+        "ingredients": ["мука 200 г", "яйца 2 шт", "молоко 300 мл"],
+        "instructions": ["Смешать", "Запечь"],
+        "cooking_time": 30,
+        "servings": 2,
+        "difficulty": "Easy",
+        "cuisine": "International",
+        "tags": [],
+        "is_favorite": False
+    }
+
+async def _benchmark_reads(seconds: float = 10, readers: int = 32, writers: int = 8,
+                           rate: float = 20) -> None:
+    """
+    Задержка чтения списка рецептов (p50/p99) под нагрузкой записи:
+    Motor против синхронного pymongo, вызванного прямо из event loop
+    (как до перехода на Motor). Каждый клиент делает rate запросов в секунду
+    """
+    from pymongo import MongoClient
+
+    database.connect()
+    recipes = database.recipes_collection
+    sync_recipes = MongoClient(database.mongodb_url, maxPoolSize=database.max_pool_size)[database.database_name].recipes
+    await recipes.insert_many([_recipe(number) for number in range(200)])
+
+    async def blocking_read():
+        list(sync_recipes.find({"user_id": BENCH_USER_ID}).sort(
+            [("created_at", DESCENDING), ("_id", DESCENDING)]
+        ).limit(20))
+
+    async def blocking_write():
+        result = sync_recipes.insert_one(_recipe(0))
+        sync_recipes.find_one({"_id": result.inserted_id})
+
+    async def read():
+        await database.get_user_recipes(BENCH_USER_ID, limit=20)
+
+    async def write():
+        await recipes.insert_one(_recipe(0))
+
+    print(f"{'драйвер':>8} {'чтений':>7} {'p50, мс':>8} {'p99, мс':>8} {'max, мс':>8}")
+    try:
+        for name, read_one, write_one in (("pymongo", blocking_read, blocking_write), ("motor", read, write)):
+            latencies = []
+            deadline = time.perf_counter() + seconds
+            await asyncio.gather(
+                *(open_loop(read_one, rate, deadline, latencies) for _ in range(readers)),
+                *(open_loop(write_one, rate, deadline) for _ in range(writers))
+            )
+            latencies.sort()
+            print(
+                f"{name:>8} {len(latencies):>7} {percentile(latencies, 0.5) * 1000:>8.1f} "
+                f"{percentile(latencies, 0.99) * 1000:>8.1f} {latencies[-1] * 1000:>8.1f}"
+            )
+    finally:
+        await recipes.delete_many({"user_id": BENCH_USER_ID})
+        sync_recipes.database.client.close()
+        database.close()
+
+async def _benchmark_writes(operations: int = 200) -> None:
+    """
+    Запросы к MongoDB и задержка PUT и DELETE рецепта: запись с владельцем
+    в фильтре против прежних «прочитать, проверить владельца, записать, перечитать»
+    """
+    from pymongo import monitoring
+
+    class CommandCounter(monitoring.CommandListener):
+        def __init__(self):
+            self.recipes = 0
+            self.total = 0
+
+        def started(self, event):
+            if event.command_name in ("find", "findAndModify", "update", "delete"):
+                self.total += 1
+                self.recipes += event.command.get(event.command_name) == "recipes"
+
+        def succeeded(self, event):
+            pass
+
+        def failed(self, event):
+            pass
+
+    counter = CommandCounter()
+    # Слушатель регистрируется до создания клиента в connect()
+    monitoring.register(counter)
+    database.connect()
+    recipes = database.recipes_collection
+    result = await recipes.insert_many([_recipe(number) for number in range(operations)])
+    recipe_ids = [str(recipe_id) for recipe_id in result.inserted_ids]
+
+    async def read_checked(recipe_id):
+        recipe = await database.get_recipe(recipe_id)
+        if not recipe or recipe["user_id"] != BENCH_USER_ID:
+            raise Exception("Recipe not found")
+
+    async def legacy_put(recipe_id):
+        await read_checked(recipe_id)
+        await recipes.update_one({"_id": ObjectId(recipe_id)}, {"$set": {"servings": 4}})
+        await database.get_recipe(recipe_id)
+
+    async def legacy_delete(recipe_id):
+        await read_checked(recipe_id)
+        await recipes.delete_one({"_id": ObjectId(recipe_id)})
+
+    async def put(recipe_id):
+        await database.update_recipe(recipe_id, BENCH_USER_ID, {"servings": 4})
+
+    async def delete(recipe_id):
+        await database.delete_recipe(recipe_id, BENCH_USER_ID)
+
+    half = len(recipe_ids) // 2
+    runs = (
+        ("PUT, было", legacy_put, recipe_ids),
+        ("PUT", put, recipe_ids),
+        ("DELETE, было", legacy_delete, recipe_ids[:half]),
+        ("DELETE", delete, recipe_ids[half:]),
+    )
+    print(f"{'операция':>13} {'запросов к recipes':>19} {'всего запросов':>15} {'мс':>6}")
+    try:
+        for name, operation, ids in runs:
+            counter.recipes = counter.total = 0
+            started = time.perf_counter()
+            for recipe_id in ids:
+                await operation(recipe_id)
+            elapsed = (time.perf_counter() - started) * 1000 / len(ids)
+            print(f"{name:>13} {counter.recipes / len(ids):>19.1f} {counter.total / len(ids):>15.1f} {elapsed:>6.2f}")
+    finally:
+        await recipes.delete_many({"user_id": BENCH_USER_ID})
+        database.close()
+
+def reads(args: List[str]) -> None:
+    asyncio.run(_benchmark_reads(rate=float(args[0]) if args else 20))
+
+def writes(args: List[str]) -> None:
+    asyncio.run(_benchmark_writes())
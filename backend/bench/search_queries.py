@@ -0,0 +1,56 @@
+import asyncio
+import random
+import time
+from typing import List
+
+import database
+from search import INGREDIENT_GROUPS, build_search_filter
+
+async def _benchmark(count: int, seed: bool) -> None:
+    """
+    Засевает count синтетических рецептов (если seed) и замеряет поиск по тексту,
+    по ингредиентам и с фильтрами
+    """
+    database.connect()
+    user_id = "bench_search"
+    if seed:
+        words = [word for words in INGREDIENT_GROUPS.values() for word in words] + [
+            "лук", "морковь", "картофель", "чеснок", "помидоры", "рис", "перец", "соль", "сахар"
+        ]
+        cuisines = ["Italian", "Chinese", "Japanese", "Indian", "Mexican", "French", "International"]
+        inserted = 0
+        while inserted < count:
+            batch = []
+            for _ in range(min(5000, count - inserted)):
+                ingredients = random.sample(words, 8)
+                batch.append({
+                    "user_id": user_id,
+                    "title": " ".join(random.sample(words, 2)),
+                    "description": "",
+                    "ingredients": ingredients,
+                    "instructions": [],
+                    "cooking_time": random.choice([10, 20, 30, 45, 60, 90, 150]),
+                    "servings": 2,
+                    "difficulty": random.choice(["Easy", "Medium", "Hard"]),
+                    "cuisine": random.choice(cuisines),
+                    "tags": [],
+                    "is_favorite": False
+                })
+            await database.insert_recipes(batch)
+            inserted += len(batch)
+        print(f"Добавлено рецептов: {inserted}")
+        await database.create_indexes()
+
+    queries = {
+        "текст": build_search_filter(user_id, query="курица"),
+        "с курицей без молочного": build_search_filter(user_id, include=["курица"], exclude=["dairy"]),
+        "текст + фильтры": build_search_filter(user_id, query="рис", cuisine="Chinese", max_time=30),
+    }
+    for name, match in queries.items():
+        started = time.perf_counter()
+        result = await database.search_recipes(match, ranked="$text" in match, offset=0, limit=20)
+        print(f"{name:>26}: {(time.perf_counter() - started) * 1000:7.1f} мс, найдено {result['total']}")
+
+def main(args: List[str]) -> None:
+    counts = [int(arg) for arg in args if arg != "--no-seed"]
+    asyncio.run(_benchmark(counts[0] if counts else 1_000_000, seed="--no-seed" not in args))
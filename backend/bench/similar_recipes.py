@@ -0,0 +1,47 @@
+import time
+from typing import List
+
+import numpy as np
+
+from search import INGREDIENT_GROUPS
+from similarity import VectorIndex, embed
+
+def _benchmark(sizes: List[int], queries: int = 200, limit: int = 10) -> None:
+    """
+    Перебор против IVF на синтетических рецептах: recall@limit и задержка
+    """
+    rng = np.random.default_rng(0)
+    words = sorted({word for group in INGREDIENT_GROUPS.values() for word in group}) + [
+        "лук", "морковь", "картофель", "чеснок", "помидоры", "рис", "перец", "соль", "сахар",
+        "укроп", "петрушка", "огурцы", "капуста", "свекла", "грибы", "гречка", "лимон", "мед",
+    ]
+    dishes = ["суп", "салат", "паста", "плов", "пирог", "рагу", "запеканка", "омлет", "каша", "соус"]
+    print(f"{'N':>9} {'перебор, мс':>12} {'IVF, мс':>9} {'recall@' + str(limit):>10} {'память, МБ':>11}")
+    for size in sizes:
+        index = VectorIndex(ivf_min=size + 1)
+        for number in range(size):
+            ingredients = list(rng.choice(words, size=8, replace=False))
+            title = f"{rng.choice(dishes)} {ingredients[0]} {ingredients[1]}"
+            index.add(str(number), embed(title, ingredients))
+        probes = [index.ids[row] for row in rng.choice(size, size=min(queries, size), replace=False)]
+        embeddings = [bytes(index.vectors[index.rows[recipe_id]]) for recipe_id in probes]
+
+        started = time.perf_counter()
+        exact = [index.search(embedding, limit, exact=True) for embedding in embeddings]
+        brute_ms = (time.perf_counter() - started) * 1000 / len(embeddings)
+
+        index.train()
+        started = time.perf_counter()
+        approximate = [index.search(embedding, limit) for embedding in embeddings]
+        ivf_ms = (time.perf_counter() - started) * 1000 / len(embeddings)
+
+        # Сравниваем по близости, а не по id: у синтетических рецептов много равноудаленных соседей
+        recall = np.mean([
+            sum(score >= truth[-1][1] - 1e-6 for _, score in found) / len(truth)
+            for found, truth in zip(approximate, exact) if truth
+        ])
+        memory = index.vectors[:size].nbytes / 2 ** 20
+        print(f"{size:>9} {brute_ms:>12.2f} {ivf_ms:>9.2f} {recall:>10.3f} {memory:>11.1f}")
+
+def main(args: List[str]) -> None:
+    _benchmark([int(size) for size in args] or [10_000, 100_000, 1_000_000])
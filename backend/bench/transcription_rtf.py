@@ -0,0 +1,30 @@
+import asyncio
+import time
+from typing import List
+
+from transcription import SAMPLE_RATE, TRANSCRIBE_COMPUTE_TYPE, TRANSCRIBE_MODEL, LocalWhisperBackend
+
+async def _benchmark(audio_path: str, core_counts: List[int]) -> None:
+    """
+    RTF локального бэкенда распознавания по числу ядер
+    """
+    from faster_whisper import decode_audio
+
+    audio = decode_audio(audio_path, sampling_rate=SAMPLE_RATE)
+    duration = len(audio) / SAMPLE_RATE
+    print(f"Аудио: {duration:.1f} с, модель {TRANSCRIBE_MODEL} ({TRANSCRIBE_COMPUTE_TYPE})")
+    for cores in core_counts:
+        backend = LocalWhisperBackend(workers=cores, cpu_threads=1)
+        backend.load()
+        started = time.perf_counter()
+        await backend.transcribe_samples(audio)
+        elapsed = time.perf_counter() - started
+        # RTF < 1 — распознавание быстрее реального времени
+        print(f"ядер: {cores:>2}  время: {elapsed:6.1f} с  RTF: {elapsed / duration:.3f}")
+        await backend.close()
+
+def main(args: List[str]) -> None:
+    if not args:
+        raise SystemExit("Использование: python -m bench transcription <audio> [ядра через запятую]")
+    cores = [int(n) for n in args[1].split(",")] if len(args) > 1 else [1, 2, 4]
+    asyncio.run(_benchmark(args[0], cores))
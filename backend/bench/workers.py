@@ -0,0 +1,71 @@
+import asyncio
+import os
+import subprocess
+import sys
+import time
+from typing import List
+
+import httpx
+
+import run
+
+def _start_server(workers: int, port: int) -> subprocess.Popen:
+    return subprocess.Popen(
+        [sys.executable, run.__file__],
+        env={**os.environ, "WEB_CONCURRENCY": str(workers), "PORT": str(port), "DEBUG": "False"},
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL
+    )
+
+async def _wait_ready(url: str, timeout: float = 60) -> float:
+    started = time.perf_counter()
+    async with httpx.AsyncClient() as client:
+        while time.perf_counter() - started < timeout:
+            try:
+                if (await client.get(url)).status_code == 200:
+                    return time.perf_counter() - started
+            except httpx.TransportError:
+                pass
+            await asyncio.sleep(0.05)
+    raise TimeoutError(f"Server did not start in {timeout} s")
+
+async def _load(url: str, seconds: float, concurrency: int) -> int:
+    done = 0
+    deadline = time.perf_counter() + seconds
+
+    async def client_loop(client):
+        nonlocal done
+        while time.perf_counter() < deadline:
+            await client.get(url)
+            done += 1
+
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(limits=limits) as client:
+        await asyncio.gather(*(client_loop(client) for _ in range(concurrency)))
+    return done
+
+def _benchmark(path: str, worker_counts: list, seconds: float = 10, concurrency: int = 64) -> None:
+    """
+    Время запуска (от старта процесса до первого ответа) и пропускная
+    способность path для разного числа воркеров. Нагрузку дает один
+    процесс httpx, поэтому на многоядерных машинах он сам может стать
+    ограничением — сравнивайте относительные цифры
+    """
+    port = run.PORT + 1
+    url = f"http://127.0.0.1:{port}{path}"
+    print(f"{'воркеров':>9} {'запуск, с':>10} {'запросов/с':>11}")
+    for workers in worker_counts:
+        server = _start_server(workers, port)
+        try:
+            startup = asyncio.run(_wait_ready(url))
+            # Даем остальным воркерам подняться
+            time.sleep(1)
+            requests = asyncio.run(_load(url, seconds, concurrency))
+            print(f"{workers:>9} {startup:>10.2f} {requests / seconds:>11.0f}")
+        finally:
+            server.terminate()
+            server.wait()
+
+def main(args: List[str]) -> None:
+    counts = sorted({1, 2, 4, os.cpu_count() or 1})
+    _benchmark(args[0] if args else "/api/health", counts)
@@ -0,0 +1,293 @@
+import asyncio
+import re
+import sys
+from collections import defaultdict
+from typing import Dict, Any, List, Tuple
+
+# Взвешенный словарь кухонь. Вес — насколько термин характерен для кухни:
+# «мисо» почти однозначно японское (3), «чеснок» встречается везде и
+# добавляет понемногу нескольким кухням (0.3). Термины сопоставляются по
+# началу слова, поэтому «пармезан» находит и «пармезаном»
+CUISINE_LEXICON: Dict[str, Dict[str, float]] = {
+    "Italian": {
+        "паста": 2, "спагетти": 3, "феттучин": 3, "лазань": 3, "ризотто": 3, "пицц": 3,
+        "пармезан": 2.5, "моцарелл": 2.5, "рикотт": 2.5, "маскарпоне": 2, "тирамису": 3,
+        "песто": 2.5, "базилик": 1, "прошутто": 3, "панчетт": 3, "ньокки": 3, "болоньез": 3,
+        "карбонар": 3, "бальзамическ": 1, "оливковое масло": 0.5, "орегано": 0.7, "фокачч": 3,
+        "pasta": 2, "spaghetti": 3, "lasagn": 3, "risotto": 3, "pizza": 3, "parmesan": 2.5,
+        "mozzarella": 2.5, "ricotta": 2.5, "pesto": 2.5, "basil": 1, "prosciutto": 3, "gnocchi": 3,
+    },
+    "Chinese": {
+        "соевый соус": 1.5, "соев": 1, "вок": 2.5, "кунжутное масло": 1.5, "устричн": 2.5,
+        "бадьян": 2, "пять специй": 3, "хойсин": 3, "пекинск": 3, "димсам": 3, "бок-чой": 2.5,
+        "рисовый уксус": 1, "имбирь": 0.7, "кунжут": 0.7, "крахмал": 0.3, "чеснок": 0.3,
+        "лапша": 0.7, "sichuan": 3, "сычуань": 3, "wok": 2.5, "soy sauce": 1.5, "hoisin": 3,
+        "oyster sauce": 2.5, "star anise": 2, "bok choy": 2.5, "ginger": 0.7,
+    },
+    "Japanese": {
+        "суши": 3, "сашими": 3, "мисо": 3, "васаби": 3, "нори": 3, "мирин": 3, "саке": 2,
+        "даши": 3, "терияки": 2.5, "темпур": 3, "рамен": 3, "удон": 3, "соба": 3, "панко": 2,
+        "эдамаме": 2.5, "японский рис": 2.5, "рис для суши": 3, "соевый соус": 0.7, "имбирь": 0.3,
+        "sushi": 3, "sashimi": 3, "miso": 3, "wasabi": 3, "nori": 3, "mirin": 3, "dashi": 3,
+        "teriyaki": 2.5, "tempura": 3, "ramen": 3, "udon": 3, "panko": 2,
+    },
+    "Indian": {
+        "карри": 2.5, "куркум": 2, "гарам масал": 3, "масал": 2.5, "кумин": 1.5, "зира": 2,
+        "кардамон": 1, "гхи": 3, "панир": 3, "тандури": 3, "чатни": 2.5, "даль": 1.5, "нут": 1,
+        "басмати": 1.5, "кориандр": 0.7, "пажитник": 2.5, "асафетид": 3, "наан": 3, "чапати": 3,
+        "имбирь": 0.5, "чеснок": 0.3, "curry": 2.5, "turmeric": 2, "garam masala": 3,
+        "masala": 2.5, "cumin": 1.5, "ghee": 3, "paneer": 3, "tandoori": 3, "chutney": 2.5,
+        "dal": 1.5,
+    },
+    "Mexican": {
+        "тако": 3, "буррито": 3, "тортиль": 2.5, "кесадиль": 3, "начос": 3, "гуакамоле": 3,
+        "сальса": 2, "халапеньо": 3, "энчилад": 3, "авокадо": 1, "перец чили": 1.5, "чили": 0.7,
+        "лайм": 0.7, "кинз": 0.7, "фасоль": 0.7, "кукуруз": 0.7, "taco": 3, "burrito": 3,
+        "tortilla": 2.5, "quesadilla": 3, "nachos": 3, "guacamole": 3, "salsa": 2,
+        "jalapeno": 3, "enchilada": 3, "avocado": 1, "lime": 0.7, "cilantro": 0.7,
+    },
+    "French": {
+        "багет": 2, "круассан": 3, "бешамель": 2.5, "рататуй": 3, "киш": 3, "крем-брюле": 3,
+        "конфи": 2.5, "фламбе": 2, "эстрагон": 1.5, "прованск": 1.5, "бри": 2, "камамбер": 2.5,
+        "дижонск": 2, "шалот": 1, "белое вино": 0.7, "сливочное масло": 0.3, "тимьян": 0.5,
+        "baguette": 2, "croissant": 3, "bechamel": 2.5, "ratatouille": 3, "quiche": 3,
+        "confit": 2.5, "tarragon": 1.5, "dijon": 2, "shallot": 1, "brie": 2, "camembert": 2.5,
+    },
+    "Mediterranean": {
+        "фета": 2.5, "оливк": 1.5, "маслин": 1.5, "хумус": 3, "тахини": 2.5, "фалафел": 3,
+        "кускус": 2, "цацики": 3, "греческ": 2, "баклажан": 0.7, "томат": 0.3, "оливковое масло": 1,
+        "лимон": 0.3, "розмарин": 0.7, "каперс": 1.5, "булгур": 2, "feta": 2.5, "olive": 1.5,
+        "hummus": 3, "tahini": 2.5, "falafel": 3, "couscous": 2, "tzatziki": 3, "bulgur": 2,
+    },
+    "American": {
+        "бургер": 3, "чизбургер": 3, "барбекю": 2.5, "хот-дог": 3, "панкейк": 3, "брауни": 3,
+        "чизкейк": 2, "кленовый сироп": 2.5, "арахисовая паста": 2, "бекон": 1, "кетчуп": 1,
+        "маффин": 2, "кукурузный хлеб": 3, "коул слоу": 3, "burger": 3, "barbecue": 2.5,
+        "bbq": 2.5, "hot dog": 3, "pancake": 3, "brownie": 3, "cheesecake": 2,
+        "maple syrup": 2.5, "peanut butter": 2, "bacon": 1,
+    },
+}
+DEFAULT_CUISINE = "International"
+# Минимальный перевес, чтобы определить кухню, а не ответить International
+MIN_CUISINE_SCORE = 2.0
+# Совпадения в названии весят больше, чем в ингредиентах
+TITLE_WEIGHT = 2.0
+
+# Приемы, которые делают рецепт сложнее независимо от времени
+TECHNIQUE_LEXICON: Dict[str, float] = {
+    "темперир": 2, "заварн": 1.5, "слоеное тесто": 2, "слоёное тесто": 2, "карамелиз": 1,
+    "фламбир": 2, "су-вид": 2, "sous vide": 2, "эмульги": 1.5, "бланшир": 0.5, "расстойк": 1,
+    "закваск": 2, "желатин": 1, "меренг": 1.5, "кондитерский мешок": 1, "фритюр": 1,
+    "марин": 0.5, "на водяной бане": 1, "термометр": 1.5, "temper": 2,
+    "proof": 1, "deep fry": 1, "sourdough": 2, "meringue": 1.5, "puff pastry": 2,
+}
+
+_DURATION_RE = re.compile(
+    r'(\d+(?:[.,]\d+)?)\s*(?:-\s*\d+(?:[.,]\d+)?\s*)?'
+    r'(час\w*|ч\b|hours?|hrs?|мин\w*|minutes?|mins?)',
+    re.IGNORECASE
+)
+
+_WORD_RE = re.compile(r'\w+(?:-\w+)*')
+# Короткие основы («вок», «нут», «тако») сопоставляются только с перечисленными
+# словоформами, а не по началу слова: иначе «вок» находился бы во «вокруг»,
+# «тако» — в «такой», а «соба» — в «собаке»
+SHORT_TERM_LENGTH = 4
+# Словоформы коротких основ и длинных, которые по началу находят чужие слова
+# («temper» — «temperature»); короткая основа без записи совпадает только
+# сама с собой
+TERM_FORMS: Dict[str, str] = {
+    "пицц": "пицца пиццы пицце пиццу пиццей пиццам пиццами пиццах",
+    "соев": "соевый соевая соевое соевые соевого соевой соевому соевым соевую соевыми соевых соевом",
+    "вок": "вок вока воке воку воком",
+    "нут": "нут нута нуте нуту нутом",
+    "зира": "зира зиры зире зиру зирой",
+    "наан": "наан наана наане нааном",
+    "тако": "тако такос",
+    "лайм": "лайм лайма лайме лайму лаймом лаймы лаймов лаймами",
+    "кинз": "кинза кинзы кинзе кинзу кинзой",
+    "фета": "фета феты фете фету фетой",
+    "соус": "соус соуса соусе соусу соусом",
+    "рис": "рис риса рисе рису рисом",
+    "вино": "вино вина вине вином",
+    "хлеб": "хлеб хлеба хлебе хлебу хлебом",
+    "бане": "бане",
+    "wok": "wok woks",
+    "taco": "taco tacos",
+    "lime": "lime limes",
+    "dog": "dog dogs",
+    "dal": "dal dhal daal",
+    "temper": "temper tempered tempering",
+    "proof": "proof proofed",
+}
+
+class _Lexicon:
+    """
+    Словарь терминов для поиска всех вхождений за один проход по словам
+    текста. Термин — несколько слов, из которых последнее сопоставляется
+    по началу («пармезан» находит «пармезаном»), а короткое или записанное
+    в TERM_FORMS — по списку словоформ. Для каждой позиции проверяются только длины основ, которые
+    есть в словаре, — это несколько обращений к хеш-таблице вместо
+    перебора всех терминов
+    """
+    def __init__(self, lexicons: Dict[str, Dict[str, float]]):
+        # (первые слова термина) -> {основа последнего слова: [(класс, вес)]}
+        self._index: Dict[Tuple[str, ...], Dict[str, List[Tuple[str, float]]]] = defaultdict(dict)
+        # (первые слова термина) -> {словоформа короткого последнего слова: [(класс, вес)]}
+        self._forms: Dict[Tuple[str, ...], Dict[str, List[Tuple[str, float]]]] = defaultdict(dict)
+        for label, terms in lexicons.items():
+            for term, weight in terms.items():
+                *head, stem = term.lower().split()
+                if len(stem) > SHORT_TERM_LENGTH and stem not in TERM_FORMS:
+                    self._index[tuple(head)].setdefault(stem, []).append((label, weight))
+                    continue
+                entries = self._forms[tuple(head)].setdefault(stem, [])
+                entries.append((label, weight))
+                for form in TERM_FORMS.get(stem, stem).split():
+                    self._forms[tuple(head)][form] = entries
+        # Длины основ от длинной к короткой: «соев» не должен перебить «соевый соус»
+        self._lengths = {
+            head: sorted({len(stem) for stem in stems}, reverse=True)
+            for head, stems in self._index.items()
+        }
+        self._max_words = max(len(head) for head in [*self._index, *self._forms]) + 1
+
+    def _match(self, words: List[str], start: int) -> Tuple[int, List[Tuple[str, float]]]:
+        for size in range(min(self._max_words, len(words) - start), 0, -1):
+            head = tuple(words[start:start + size - 1])
+            word = words[start + size - 1]
+            stems = self._index.get(head)
+            if stems is not None:
+                for length in self._lengths[head]:
+                    if length > len(word):
+                        continue
+                    entries = stems.get(word[:length])
+                    if entries:
+                        return size, entries
+            forms = self._forms.get(head)
+            if forms is not None and word in forms:
+                return size, forms[word]
+        return 0, []
+
+    def score(self, text: str, scores: Dict[str, float], weight: float = 1.0) -> None:
+        """
+        Прибавляет к scores веса найденных терминов. Каждый термин
+        учитывается один раз: десять «чеснок» — не повод менять кухню
+        """
+        words = [word.lower() for word in _WORD_RE.findall(text)]
+        found = {}
+        position = 0
+        while position < len(words):
+            size, entries = self._match(words, position)
+            if size:
+                found[id(entries)] = entries
+            position += size or 1
+        for entries in found.values():
+            for label, term_weight in entries:
+                scores[label] += term_weight * weight
+
+_CUISINES = _Lexicon(CUISINE_LEXICON)
+_TECHNIQUES = _Lexicon({"technique": TECHNIQUE_LEXICON})
+
+def determine_cuisine(title: str, ingredients: List[str]) -> str:
+    """
+    Определяет кухню по сумме весов всех найденных терминов
+    (название весит вдвое больше ингредиентов). При ничьей или слабом
+    сигнале возвращает International
+    """
+    scores: Dict[str, float] = defaultdict(float)
+    _CUISINES.score(title or "", scores, TITLE_WEIGHT)
+    _CUISINES.score("\n".join(ingredients or []), scores)
+    if not scores:
+        return DEFAULT_CUISINE
+    ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)
+    best, best_score = ranked[0]
+    if best_score < MIN_CUISINE_SCORE or (len(ranked) > 1 and ranked[1][1] == best_score):
+        return DEFAULT_CUISINE
+    return best
+
+def estimate_cooking_time(instructions: List[str]) -> int:
+    """
+    Оценивает время приготовления в минутах: сумма длительностей,
+    указанных в шагах («20 минут», «1,5 часа»), а если их нет —
+    30 минут плюс 10 на каждый шаг
+    """
+    total = 0.0
+    for step in instructions or []:
+        for amount, unit in _DURATION_RE.findall(step):
+            value = float(amount.replace(",", "."))
+            total += value * 60 if unit.lower().startswith(("ч", "h")) else value
+    if total:
+        return max(5, int(round(total)))
+    return 30 + len(instructions or []) * 10
+
+def determine_difficulty(cooking_time: int, ingredients_count: int, instructions: List[str] = None) -> str:
+    """
+    Определяет сложность по времени, числу ингредиентов и шагов
+    и сложным приемам (темперирование, заварное тесто, су-вид и т.п.)
+    """
+    scores: Dict[str, float] = defaultdict(float)
+    steps = instructions or []
+    _TECHNIQUES.score("\n".join(steps), scores)
+    points = scores["technique"]
+    points += 0 if cooking_time <= 30 else 1 if cooking_time <= 60 else 2
+    points += 0 if ingredients_count <= 5 else 1 if ingredients_count <= 10 else 2
+    points += 0 if len(steps) <= 5 else 0.5 if len(steps) <= 10 else 1
+    if points < 1.5:
+        return "Easy"
+    if points < 3.5:
+        return "Medium"
+    return "Hard"
+
+def classify(recipe: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Заполняет кухню, сложность и время приготовления рецепта без LLM.
+    Время из рецепта сохраняется, если оно указано
+    """
+    ingredients = recipe.get("ingredients") or []
+    instructions = recipe.get("instructions") or []
+    cooking_time = recipe.get("cooking_time") or estimate_cooking_time(instructions)
+    return {
+        "cuisine": determine_cuisine(recipe.get("title", ""), ingredients),
+        "difficulty": determine_difficulty(cooking_time, len(ingredients), instructions),
+        "cooking_time": cooking_time,
+    }
+
+async def reclassify_collection(only_default: bool = False, dry_run: bool = False,
+                                batch_size: int = 500) -> Dict[str, int]:
+    """
+    Пересчитывает кухню и сложность у всех сохраненных рецептов.
+    only_default — только у рецептов с кухней International
+    """
+    import database
+
+    database.connect()
+    counts = {"scanned": 0, "changed": 0}
+    updates = []
+    async for recipe in database.iter_all_recipes(batch_size):
+        counts["scanned"] += 1
+        if only_default and recipe.get("cuisine") not in (None, "", DEFAULT_CUISINE):
+            continue
+        result = classify(recipe)
+        changes = {
+            field: result[field] for field in ("cuisine", "difficulty")
+            if recipe.get(field) != result[field]
+        }
+        if changes:
+            counts["changed"] += 1
+            updates.append((recipe["id"], changes))
+        if len(updates) >= batch_size:
+            if not dry_run:
+                await database.bulk_update_recipes(updates)
+            updates = []
+    if updates and not dry_run:
+        await database.bulk_update_recipes(updates)
+    return counts
+
+if __name__ == "__main__":
+    # python classifier.py [--only-default] [--dry-run] — переклассификация коллекции
+    counts = asyncio.run(reclassify_collection(
+        only_default="--only-default" in sys.argv,
+        dry_run="--dry-run" in sys.argv
+    ))
+    print(f"Просмотрено рецептов: {counts['scanned']}, изменено: {counts['changed']}")
@@ -0,0 +1,145 @@
+import math
+import os
+import re
+from typing import Dict, Any, List, Optional
+
+from dotenv import load_dotenv
+
+import metrics
+
+load_dotenv()
+
+# Сколько токенов текста страницы отправлять в LLM
+CONTENT_TOKEN_BUDGET = int(os.getenv("CONTENT_TOKEN_BUDGET", 1500))
+# blocks — отбор блоков по «рецептности», truncate — старое поведение
+# (первые 4000 символов), чтобы сравнить токены и качество в /api/metrics
+CONTENT_REDUCTION = os.getenv("CONTENT_REDUCTION", "blocks")
+LEGACY_TRUNCATE_CHARS = 4000
+
+# Те же признаки, что в parse_ingredients/parse_instructions, но по границам слов
+_UNIT_RE = re.compile(
+    r'\b\d+([.,/]\d+)?\s*(г|гр|кг|мл|л|шт|ст\.?\s?л|ч\.?\s?л|стакан\w*|зубч\w*|g|kg|ml|cups?|tbsp|tsp|oz|lb)\b'
+    r'|по вкусу|щепотк\w*|to taste|pinch',
+    re.IGNORECASE
+)
+_STEP_RE = re.compile(r'(^|\s)(\d{1,2}[.)]\s|шаг\s*\d+|этап\s*\d+|step\s*\d+)', re.IGNORECASE)
+_KEYWORD_RE = re.compile(r'ингредиент|приготовлени|инструкци|ingredient|instruction|directions|method', re.IGNORECASE)
+
+_encoding = None
+
+def load_encoding():
+    """
+    Загружает словарь токенизатора (при первом обращении tiktoken скачивает
+    его). Блокирующий вызов: из корутин — только через asyncio.to_thread,
+    при старте его делает прогрев
+    """
+    return _get_encoding()
+
+def _get_encoding():
+    global _encoding
+    if _encoding is None:
+        try:
+            import tiktoken
+            from llm_client import OPENAI_MODEL
+            try:
+                _encoding = tiktoken.encoding_for_model(OPENAI_MODEL)
+            except KeyError:
+                _encoding = tiktoken.get_encoding("cl100k_base")
+        except Exception as e:
+            # Без tiktoken или без сети (словарь кодировки скачивается при первом
+            # обращении) — оценка по длине; решение запоминается до перезапуска
+            print(f"[ERROR] Токенизатор недоступен, токены оцениваются по длине текста: {e}")
+            _encoding = False
+    return _encoding
+
+def count_tokens(text: str) -> int:
+    """
+    Количество токенов текста токенизатором модели (tiktoken);
+    без tiktoken — грубая оценка «4 символа на токен»
+    """
+    encoding = _get_encoding()
+    if encoding:
+        return len(encoding.encode(text, disallowed_special=()))
+    return math.ceil(len(text) / 4)
+
+def truncate_to_tokens(text: str, budget: int) -> str:
+    """Обрезает текст до budget токенов"""
+    encoding = _get_encoding()
+    if encoding:
+        tokens = encoding.encode(text, disallowed_special=())
+        return text if len(tokens) <= budget else encoding.decode(tokens[:budget])
+    return text[:budget * 4]
+
+def score_block(block: Dict[str, Any]) -> float:
+    """
+    Оценка «рецептности» блока: количества с единицами измерения,
+    нумерованные шаги, заголовки «Ингредиенты»/«Приготовление» и списки.
+    Нормируется на длину, чтобы длинная статья не побеждала за счет объема
+    """
+    text = block["text"]
+    hits = (
+        2 * len(_UNIT_RE.findall(text))
+        + 2 * len(_STEP_RE.findall(text))
+        + 3 * len(_KEYWORD_RE.findall(text))
+    )
+    if block.get("tag") in ("ul", "ol"):
+        hits += 2
+    if block.get("kind") == "keyword":
+        hits += 3
+    if not hits:
+        return 0.0
+    return hits / math.sqrt(max(len(text), 1))
+
+def select_blocks(blocks: List[Dict[str, Any]], budget: int) -> List[str]:
+    """
+    Жадно набирает блоки с лучшей оценкой на токен в пределах бюджета
+    и возвращает их в порядке документа. Вложенные блоки (список внутри
+    блока «recipe») не дублируются
+    """
+    scored = []
+    for index, block in enumerate(blocks):
+        score = score_block(block)
+        if score > 0:
+            scored.append((score, index, block["text"], count_tokens(block["text"])))
+    scored.sort(key=lambda item: item[0], reverse=True)
+
+    selected = []
+    used = 0
+    for score, index, text, tokens in scored:
+        if any(text in other or other in text for _, other in selected):
+            continue
+        if used + tokens > budget:
+            # Первый (лучший) блок не помещается целиком — берем его начало
+            if not selected:
+                selected.append((index, truncate_to_tokens(text, budget)))
+                used = budget
+            continue
+        selected.append((index, text))
+        used += tokens
+    return [text for _, text in sorted(selected)]
+
+def reduce_page(page: Dict[str, Any], budget: Optional[int] = None) -> str:
+    """
+    Текст страницы для LLM в пределах бюджета токенов: самые «рецептные»
+    блоки, а если таких нет — начало текста страницы. Токенизация — работа
+    CPU, поэтому из корутин функция вызывается через asyncio.to_thread
+    """
+    budget = budget or CONTENT_TOKEN_BUDGET
+    # Размер всей страницы нужен только для метрики — оцениваем без токенизатора,
+    # чтобы не кодировать сотни килобайт текста ради одного числа
+    page_tokens = math.ceil(len(page["text"]) / 4)
+    if CONTENT_REDUCTION == "truncate":
+        text = page["text"][:LEGACY_TRUNCATE_CHARS]
+    else:
+        text = "\n".join(select_blocks(page["blocks"], budget)) or truncate_to_tokens(page["text"], budget)
+    metrics.observe("content_reducer.page_tokens", page_tokens)
+    metrics.observe(f"content_reducer.{CONTENT_REDUCTION}.tokens", count_tokens(text))
+    return text
+
+def record_outcome(recipe: Dict[str, Any]) -> None:
+    """
+    Учитывает, удалось ли LLM извлечь рецепт (есть ингредиенты и шаги).
+    Среднее content_reducer.<режим>.success_rate — доля успешных извлечений
+    """
+    success = bool(recipe.get("ingredients")) and bool(recipe.get("instructions"))
+    metrics.observe(f"content_reducer.{CONTENT_REDUCTION}.success_rate", 1.0 if success else 0.0)
@@ -1,9 +1,14 @@
-from pymongo import MongoClient
-from pymongo.errors import PyMongoError
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import ReturnDocument, ReplaceOne, UpdateOne, ASCENDING, DESCENDING
+from pymongo.errors import PyMongoError, BulkWriteError
 import os
+import uuid
 from dotenv import load_dotenv
 from bson import ObjectId
-from datetime import datetime
+from datetime import datetime, timedelta
+import base64
+
+from search import ingredient_tokens, COOKING_TIME_BUCKETS
 
 load_dotenv()
 
@@ -11,16 +16,98 @@ load_dotenv()
 mongodb_url = os.getenv("MONGODB_URL", "mongodb://localhost:27017")
 database_name = os.getenv("MONGODB_DATABASE", "recipio")
 
-# Initialize MongoDB client
-client = MongoClient(mongodb_url)
-db = client[database_name]
+# Размер пула соединений ограничивает число одновременных запросов к MongoDB
+max_pool_size = int(os.getenv("MONGODB_MAX_POOL_SIZE", 50))
+
+# Клиент и коллекции создаются в connect() — один раз на процесс (воркер uvicorn,
+# CLI-скрипт), а не при импорте модуля
+client = None
+db = None
 
 # Collections
-recipes_collection = db.recipes
-users_collection = db.users
-profiles_collection = db.profiles
+recipes_collection = None
+users_collection = None
+profiles_collection = None
+extraction_cache_collection = None
+jobs_collection = None
+transcripts_collection = None
+recipe_versions_collection = None
+
+def connect() -> None:
+    """
+    Создает клиент MongoDB (Motor не блокирует event loop) и коллекции.
+    Повторный вызов ничего не делает
+    """
+    global client, db, recipes_collection, users_collection, profiles_collection
+    global extraction_cache_collection, jobs_collection, transcripts_collection, recipe_versions_collection
+    if client is not None:
+        return
+    client = AsyncIOMotorClient(mongodb_url, maxPoolSize=max_pool_size)
+    db = client[database_name]
+    recipes_collection = db.recipes
+    users_collection = db.users
+    profiles_collection = db.profiles
+    extraction_cache_collection = db.extraction_cache
+    jobs_collection = db.jobs
+    transcripts_collection = db.transcripts
+    recipe_versions_collection = db.recipe_versions
+
+def close() -> None:
+    """
+    Закрывает клиент MongoDB (при остановке приложения)
+    """
+    global client, db
+    if client is not None:
+        client.close()
+        client = None
+        db = None
+
+def _search_fields(recipe_data: dict) -> dict:
+    """
+    Производные поля для поиска: токены ингредиентов и вектор похожести
+    """
+    # numpy (через similarity) грузится при первой записи рецепта, а не при импорте модуля
+    from similarity import embed
+
+    return {
+        "ingredient_tokens": ingredient_tokens(recipe_data.get("ingredients")),
+        "embedding": embed(recipe_data.get("title"), recipe_data.get("ingredients"))
+    }
+
+def _serialize(document: dict) -> dict:
+    """
+    Заменяет _id на строковый id и приводит даты к ISO-строкам
+    """
+    document["id"] = str(document["_id"])
+    del document["_id"]
+    for key, value in document.items():
+        if isinstance(value, datetime):
+            document[key] = value.isoformat()
+    return document
+
+async def get_recipe_version(user_id: str) -> int:
+    """
+    Версия коллекции рецептов пользователя (для ETag): растет при каждой записи
+    """
+    try:
+        document = await recipe_versions_collection.find_one({"_id": user_id})
+        return document["version"] if document else 0
+    except PyMongoError as e:
+        raise Exception(f"Error getting recipe version: {str(e)}")
+
+async def bump_recipe_versions(user_ids) -> None:
+    """
+    Увеличивает версию коллекции рецептов пользователей после записи
+    """
+    user_ids = {user_id for user_id in user_ids if user_id}
+    if not user_ids:
+        return
+    await recipe_versions_collection.bulk_write(
+        [UpdateOne({"_id": user_id}, {"$inc": {"version": 1}}, upsert=True) for user_id in user_ids],
+        ordered=False
+    )
 
-def save_recipe(recipe_data: dict) -> dict:
+async def save_recipe(recipe_data: dict) -> dict:
     """
     Сохраняет рецепт в базу данных MongoDB
     """
@@ -28,20 +115,17 @@ def save_recipe(recipe_data: dict) -> dict:
         # Добавляем timestamp
         recipe_data["created_at"] = datetime.utcnow()
         recipe_data["updated_at"] = datetime.utcnow()
-        
-        # Вставляем документ
-        result = recipes_collection.insert_one(recipe_data)
-        
-        # Получаем созданный документ
-        created_recipe = recipes_collection.find_one({"_id": result.inserted_id})
-        created_recipe["id"] = str(created_recipe["_id"])
-        del created_recipe["_id"]
-        
-        return created_recipe
+        recipe_data.update(_search_fields(recipe_data))
+
+        # Вставляем документ; insert_one дописывает _id в recipe_data,
+        # поэтому повторно читать документ из базы не нужно
+        await recipes_collection.insert_one(recipe_data)
+        await bump_recipe_versions([recipe_data.get("user_id")])
+        return _serialize(recipe_data)
     except PyMongoError as e:
         raise Exception(f"Error saving recipe: {str(e)}")
 
-def get_recipe(recipe_id: str) -> dict:
+async def get_recipe(recipe_id: str) -> dict:
     """
     Получает рецепт по ID
     """
@@ -49,143 +133,547 @@ def get_recipe(recipe_id: str) -> dict:
         # Проверяем, что ID валидный ObjectId
         if not ObjectId.is_valid(recipe_id):
             return None
-            
-        recipe = recipes_collection.find_one({"_id": ObjectId(recipe_id)})
+
+        recipe = await recipes_collection.find_one({"_id": ObjectId(recipe_id)})
         if recipe:
-            recipe["id"] = str(recipe["_id"])
-            del recipe["_id"]
+            recipe = _serialize(recipe)
         return recipe
     except PyMongoError as e:
         raise Exception(f"Error getting recipe: {str(e)}")
 
-def get_user_recipes(user_id: str) -> list:
+async def get_recipe_owner(recipe_id: str) -> str:
+    """
+    Возвращает user_id владельца рецепта или None, если рецепта нет.
+    Читает только одно поле — для проверки доступа перед ответом 304
+    """
+    try:
+        if not ObjectId.is_valid(recipe_id):
+            return None
+        recipe = await recipes_collection.find_one({"_id": ObjectId(recipe_id)}, {"user_id": 1})
+        return recipe.get("user_id") if recipe else None
+    except PyMongoError as e:
+        raise Exception(f"Error getting recipe: {str(e)}")
+
+# Поля для облегченного представления рецепта в списках
+RECIPE_SUMMARY_FIELDS = ["title", "image_url", "cuisine", "cooking_time", "tags", "created_at"]
+
+def encode_cursor(recipe: dict) -> str:
+    """
+    Кодирует позицию рецепта (created_at, id) в непрозрачный курсор
+    """
+    raw = f"{recipe['created_at']}|{recipe['id']}"
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+class InvalidCursorError(Exception):
+    """Курсор пагинации не разбирается: поврежден или подделан клиентом"""
+
+def decode_cursor(cursor: str) -> tuple:
+    """
+    Декодирует курсор в пару (created_at, ObjectId). Бросает InvalidCursorError для неверного курсора
+    """
+    try:
+        created_at, recipe_id = base64.urlsafe_b64decode(cursor.encode()).decode().split("|")
+        return datetime.fromisoformat(created_at), ObjectId(recipe_id)
+    except Exception:
+        raise InvalidCursorError("Invalid cursor")
+
+async def get_user_recipes(user_id: str, limit: int = None, cursor: str = None,
+                           summary: bool = False) -> list:
     """
-    Получает все рецепты пользователя
+    Получает рецепты пользователя, новые первыми.
+    limit и cursor включают keyset-пагинацию по (created_at, _id),
+    summary возвращает только поля RECIPE_SUMMARY_FIELDS
     """
     try:
-        recipes = list(recipes_collection.find({"user_id": user_id}))
-        
-        # Преобразуем ObjectId в строки
-        for recipe in recipes:
-            recipe["id"] = str(recipe["_id"])
-            del recipe["_id"]
-            
+        query = {"user_id": user_id}
+        if cursor:
+            created_at, last_id = decode_cursor(cursor)
+            query["$or"] = [
+                {"created_at": {"$lt": created_at}},
+                {"created_at": created_at, "_id": {"$lt": last_id}}
+            ]
+
+        projection = RECIPE_SUMMARY_FIELDS if summary else None
+        find = recipes_collection.find(query, projection).sort(
+            [("created_at", DESCENDING), ("_id", DESCENDING)]
+        )
+        if limit:
+            find = find.limit(limit)
+
+        recipes = []
+        async for recipe in find:
+            recipes.append(_serialize(recipe))
+
+        return recipes
+    except PyMongoError as e:
+        raise Exception(f"Error getting user recipes: {str(e)}")
+
+async def iter_user_recipes(user_id: str, batch_size: int = 500):
+    """
+    Асинхронно перебирает все рецепты пользователя прямо с курсора MongoDB.
+    В памяти одновременно находится не больше batch_size документов
+    """
+    find = recipes_collection.find({"user_id": user_id}).sort(
+        [("created_at", DESCENDING), ("_id", DESCENDING)]
+    ).batch_size(batch_size)
+    async for recipe in find:
+        yield _serialize(recipe)
+
+async def iter_all_recipes(batch_size: int = 500):
+    """
+    Перебирает все рецепты коллекции (для офлайн-обработки, например
+    переклассификации). Читаются только поля, нужные классификатору
+    """
+    find = recipes_collection.find(
+        {}, {"title": 1, "ingredients": 1, "instructions": 1, "cooking_time": 1, "cuisine": 1, "difficulty": 1}
+    ).batch_size(batch_size)
+    async for recipe in find:
+        yield _serialize(recipe)
+
+async def iter_recipes_without_tokens(batch_size: int = 500):
+    """
+    Перебирает рецепты без поля ingredient_tokens (сохраненные до появления поиска)
+    """
+    find = recipes_collection.find(
+        {"ingredient_tokens": {"$exists": False}}, {"ingredients": 1}
+    ).batch_size(batch_size)
+    async for recipe in find:
+        yield _serialize(recipe)
+
+async def iter_recipes_without_embedding(batch_size: int = 500):
+    """
+    Перебирает рецепты без вектора для поиска похожих
+    """
+    find = recipes_collection.find(
+        {"embedding": {"$exists": False}}, {"title": 1, "ingredients": 1}
+    ).batch_size(batch_size)
+    async for recipe in find:
+        yield _serialize(recipe)
+
+async def iter_embeddings(user_id: str, since: datetime = None, batch_size: int = 2000):
+    """
+    Перебирает векторы рецептов пользователя как (id, embedding, updated_at);
+    since ограничивает выборку рецептами, измененными начиная с этого момента
+    """
+    query = {"user_id": user_id, "embedding": {"$exists": True}}
+    if since:
+        query["updated_at"] = {"$gte": since}
+    find = recipes_collection.find(query, {"embedding": 1, "updated_at": 1}).batch_size(batch_size)
+    async for recipe in find:
+        yield str(recipe["_id"]), recipe["embedding"], recipe["updated_at"]
+
+async def get_recipes_by_ids(recipe_ids: list, user_id: str, summary: bool = False) -> dict:
+    """
+    Получает рецепты пользователя по списку ID одним запросом: {id: рецепт}
+    """
+    try:
+        object_ids = [ObjectId(recipe_id) for recipe_id in recipe_ids if ObjectId.is_valid(recipe_id)]
+        if not object_ids:
+            return {}
+        projection = RECIPE_SUMMARY_FIELDS if summary else {"ingredient_tokens": 0, "embedding": 0}
+        find = recipes_collection.find({"_id": {"$in": object_ids}, "user_id": user_id}, projection)
+        recipes = {}
+        async for recipe in find:
+            recipe = _serialize(recipe)
+            recipes[recipe["id"]] = recipe
         return recipes
     except PyMongoError as e:
-        raise Exception(f"Error getting user recipes: {str(e)}") 
+        raise Exception(f"Error getting recipes: {str(e)}")
+
+async def bulk_update_recipes(updates: list) -> int:
+    """
+    Обновляет поля многих рецептов одним bulk_write.
+    updates — список пар (recipe_id, {поле: значение}); возвращает число измененных
+    """
+    try:
+        now = datetime.utcnow()
+        result = await recipes_collection.bulk_write(
+            [
+                UpdateOne({"_id": ObjectId(recipe_id)}, {"$set": {**fields, "updated_at": now}})
+                for recipe_id, fields in updates
+            ],
+            ordered=False
+        )
+        if result.modified_count:
+            # Обновления идут пачками по ID — версии поднимаем владельцам этих рецептов
+            await bump_recipe_versions(await recipes_collection.distinct(
+                "user_id", {"_id": {"$in": [ObjectId(recipe_id) for recipe_id, _ in updates]}}
+            ))
+        return result.modified_count
+    except PyMongoError as e:
+        raise Exception(f"Error updating recipes: {str(e)}")
+
+async def search_recipes(match: dict, ranked: bool, offset: int = 0, limit: int = 20,
+                         summary: bool = False) -> dict:
+    """
+    Ищет рецепты одним агрегационным запросом: страница результатов
+    (по релевантности полнотекстового поиска, затем новые первыми),
+    общее число и фасеты по кухне, сложности и времени приготовления
+    """
+    try:
+        sort = {"score": DESCENDING} if ranked else {}
+        sort.update({"created_at": DESCENDING, "_id": DESCENDING})
+        projection = {field: 1 for field in RECIPE_SUMMARY_FIELDS} if summary else {"ingredient_tokens": 0, "embedding": 0, "score": 0}
+        pipeline = [{"$match": match}]
+        if ranked:
+            pipeline.append({"$addFields": {"score": {"$meta": "textScore"}}})
+        pipeline += [
+            {"$facet": {
+                "results": [{"$sort": sort}, {"$skip": offset}, {"$limit": limit}, {"$project": projection}],
+                "total": [{"$count": "count"}],
+                "cuisine": [{"$sortByCount": "$cuisine"}],
+                "difficulty": [{"$sortByCount": "$difficulty"}],
+                "cooking_time": [{"$bucket": {
+                    "groupBy": "$cooking_time",
+                    "boundaries": COOKING_TIME_BUCKETS,
+                    "default": f"{COOKING_TIME_BUCKETS[-1]}+",
+                    "output": {"count": {"$sum": 1}}
+                }}]
+            }}
+        ]
+        result = None
+        async for result in recipes_collection.aggregate(pipeline):
+            break
+        total = result["total"][0]["count"] if result and result["total"] else 0
+        return {
+            "results": [_serialize(recipe) for recipe in result["results"]] if result else [],
+            "total": total,
+            "facets": {
+                field: {str(bucket["_id"]): bucket["count"] for bucket in result[field]} if result else {}
+                for field in ("cuisine", "difficulty", "cooking_time")
+            }
+        }
+    except PyMongoError as e:
+        raise Exception(f"Error searching recipes: {str(e)}")
+
+async def insert_recipes(recipes: list) -> list:
+    """
+    Сохраняет пачку рецептов одним insert_many (ordered=False).
+    Возвращает ID рецептов в порядке входного списка (None — не сохранен)
+    """
+    try:
+        now = datetime.utcnow()
+        for recipe_data in recipes:
+            recipe_data["created_at"] = now
+            recipe_data["updated_at"] = now
+            recipe_data.update(_search_fields(recipe_data))
+
+        # ordered=False: ошибка в одном документе не останавливает остальные
+        await recipes_collection.insert_many(recipes, ordered=False)
+        failed = set()
+    except BulkWriteError as e:
+        failed = {error["index"] for error in e.details.get("writeErrors", [])}
+    except PyMongoError as e:
+        raise Exception(f"Error saving recipes: {str(e)}")
+    try:
+        await bump_recipe_versions(recipe.get("user_id") for recipe in recipes if "_id" in recipe)
+    except PyMongoError as e:
+        raise Exception(f"Error saving recipes: {str(e)}")
+    return [
+        None if index in failed or "_id" not in recipe else str(recipe["_id"])
+        for index, recipe in enumerate(recipes)
+    ]
 
-def update_recipe(recipe_id: str, recipe_data: dict) -> dict:
+async def update_recipe(recipe_id: str, user_id: str, recipe_data: dict) -> dict:
     """
-    Обновляет рецепт
+    Обновляет рецепт пользователя за один запрос к базе.
+    Возвращает обновленный документ или None, если рецепт не найден
+    или принадлежит другому пользователю
     """
     try:
         if not ObjectId.is_valid(recipe_id):
-            raise Exception("Invalid recipe ID")
-            
+            return None
+
         recipe_data["updated_at"] = datetime.utcnow()
-        
-        result = recipes_collection.update_one(
-            {"_id": ObjectId(recipe_id)},
-            {"$set": recipe_data}
+        if "ingredients" in recipe_data:
+            recipe_data.update(_search_fields(recipe_data))
+
+        # Фильтр по _id и user_id одновременно проверяет владельца
+        updated_recipe = await recipes_collection.find_one_and_update(
+            {"_id": ObjectId(recipe_id), "user_id": user_id},
+            {"$set": recipe_data},
+            return_document=ReturnDocument.AFTER
         )
-        
-        if result.modified_count == 0:
-            raise Exception("Recipe not found")
-            
-        # Получаем обновленный документ
-        updated_recipe = recipes_collection.find_one({"_id": ObjectId(recipe_id)})
-        updated_recipe["id"] = str(updated_recipe["_id"])
-        del updated_recipe["_id"]
-        
+        if updated_recipe:
+            await bump_recipe_versions([user_id])
+            updated_recipe = _serialize(updated_recipe)
         return updated_recipe
     except PyMongoError as e:
         raise Exception(f"Error updating recipe: {str(e)}")
 
-def delete_recipe(recipe_id: str) -> bool:
+async def delete_recipe(recipe_id: str, user_id: str) -> bool:
     """
-    Удаляет рецепт
+    Удаляет рецепт пользователя за один запрос к базе.
+    Возвращает False, если рецепт не найден или принадлежит другому пользователю
     """
     try:
         if not ObjectId.is_valid(recipe_id):
-            raise Exception("Invalid recipe ID")
-            
-        result = recipes_collection.delete_one({"_id": ObjectId(recipe_id)})
+            return False
+
+        result = await recipes_collection.delete_one(
+            {"_id": ObjectId(recipe_id), "user_id": user_id}
+        )
+        if result.deleted_count:
+            await bump_recipe_versions([user_id])
         return result.deleted_count > 0
     except PyMongoError as e:
         raise Exception(f"Error deleting recipe: {str(e)}")
 
-def save_user(user_data: dict) -> dict:
+async def save_user(user_data: dict) -> dict:
     """
     Сохраняет пользователя
     """
     try:
         user_data["created_at"] = datetime.utcnow()
         user_data["updated_at"] = datetime.utcnow()
-        
-        result = users_collection.insert_one(user_data)
-        
-        created_user = users_collection.find_one({"_id": result.inserted_id})
-        created_user["id"] = str(created_user["_id"])
-        del created_user["_id"]
-        
-        return created_user
+
+        await users_collection.insert_one(user_data)
+        return _serialize(user_data)
     except PyMongoError as e:
         raise Exception(f"Error saving user: {str(e)}")
 
-def get_user(user_id: str) -> dict:
+async def get_user(user_id: str) -> dict:
     """
     Получает пользователя по ID
     """
     try:
-        user = users_collection.find_one({"id": user_id})
+        user = await users_collection.find_one({"id": user_id})
         if user:
-            user["id"] = str(user["_id"])
-            del user["_id"]
+            user = _serialize(user)
         return user
     except PyMongoError as e:
         raise Exception(f"Error getting user: {str(e)}")
 
-def update_user(user_id: str, user_data: dict) -> dict:
+async def update_user(user_id: str, user_data: dict) -> dict:
     """
     Обновляет пользователя
     """
     try:
         user_data["updated_at"] = datetime.utcnow()
-        
-        result = users_collection.update_one(
+
+        updated_user = await users_collection.find_one_and_update(
             {"id": user_id},
-            {"$set": user_data}
+            {"$set": user_data},
+            return_document=ReturnDocument.AFTER
         )
-        
-        if result.modified_count == 0:
+
+        if not updated_user:
             raise Exception("User not found")
-            
-        updated_user = users_collection.find_one({"id": user_id})
-        updated_user["id"] = str(updated_user["_id"])
-        del updated_user["_id"]
-        
-        return updated_user
+
+        return _serialize(updated_user)
     except PyMongoError as e:
         raise Exception(f"Error updating user: {str(e)}")
 
+async def get_cached_extraction(key: str) -> dict:
+    """
+    Получает закэшированный результат извлечения рецепта по ключу URL
+    """
+    try:
+        return await extraction_cache_collection.find_one(
+            {"_id": key, "expires_at": {"$gt": datetime.utcnow()}}
+        )
+    except PyMongoError as e:
+        raise Exception(f"Error getting cached extraction: {str(e)}")
+
+async def save_cached_extraction(key: str, url: str, recipe: dict, expires_at: datetime) -> None:
+    """
+    Сохраняет результат извлечения рецепта в кэш (upsert по ключу URL)
+    """
+    try:
+        await extraction_cache_collection.replace_one(
+            {"_id": key},
+            {"url": url, "recipe": recipe, "expires_at": expires_at},
+            upsert=True
+        )
+    except PyMongoError as e:
+        raise Exception(f"Error saving cached extraction: {str(e)}")
+
+async def find_transcript(keys: list, expires_at: datetime) -> dict:
+    """
+    Ищет транскрипт по любому из ключей (ID ролика или акустический отпечаток)
+    и продлевает ему срок жизни до expires_at
+    """
+    try:
+        return await transcripts_collection.find_one_and_update(
+            {"_id": {"$in": keys}, "expires_at": {"$gt": datetime.utcnow()}},
+            {"$set": {"expires_at": expires_at}, "$inc": {"hits": 1}},
+            return_document=ReturnDocument.AFTER
+        )
+    except PyMongoError as e:
+        raise Exception(f"Error finding transcript: {str(e)}")
+
+async def save_transcript(keys: list, transcript: str, recipe: dict, expires_at: datetime) -> None:
+    """
+    Сохраняет транскрипт и извлеченный рецепт под каждым из ключей
+    """
+    try:
+        document = {
+            "transcript": transcript,
+            "recipe": recipe,
+            "hits": 0,
+            "created_at": datetime.utcnow(),
+            "expires_at": expires_at
+        }
+        await transcripts_collection.bulk_write(
+            [ReplaceOne({"_id": key}, document, upsert=True) for key in keys],
+            ordered=False
+        )
+    except PyMongoError as e:
+        raise Exception(f"Error saving transcript: {str(e)}")
+
+async def create_job(job_data: dict) -> dict:
+    """
+    Создает задачу извлечения рецепта в статусе queued
+    """
+    try:
+        job_data["status"] = "queued"
+        job_data["created_at"] = datetime.utcnow()
+        job_data["updated_at"] = datetime.utcnow()
+
+        await jobs_collection.insert_one(job_data)
+        return _serialize(job_data)
+    except PyMongoError as e:
+        raise Exception(f"Error creating job: {str(e)}")
+
+async def get_job(job_id: str, user_id: str) -> dict:
+    """
+    Получает задачу пользователя по ID
+    """
+    try:
+        if not ObjectId.is_valid(job_id):
+            return None
+
+        job = await jobs_collection.find_one({"_id": ObjectId(job_id), "user_id": user_id})
+        if job:
+            job = _serialize(job)
+        return job
+    except PyMongoError as e:
+        raise Exception(f"Error getting job: {str(e)}")
+
+async def claim_job() -> dict:
+    """
+    Атомарно забирает самую старую задачу из очереди (queued -> running).
+    lease_id — аренда задачи этим воркером: если задачу вернут в очередь и
+    ее возьмет другой, прежний исполнитель ее уже не завершит.
+    Возвращает None, если очередь пуста
+    """
+    try:
+        job = await jobs_collection.find_one_and_update(
+            {"status": "queued"},
+            {"$set": {
+                "status": "running",
+                "lease_id": uuid.uuid4().hex,
+                "updated_at": datetime.utcnow(),
+                "heartbeat_at": datetime.utcnow()
+            }},
+            sort=[("created_at", ASCENDING)],
+            return_document=ReturnDocument.AFTER
+        )
+        if job:
+            job = _serialize(job)
+        return job
+    except PyMongoError as e:
+        raise Exception(f"Error claiming job: {str(e)}")
+
+async def update_job(job_id: str, job_data: dict) -> None:
+    """
+    Обновляет статус/прогресс задачи; любое обновление продлевает ее heartbeat
+    """
+    try:
+        job_data["updated_at"] = job_data["heartbeat_at"] = datetime.utcnow()
+        await jobs_collection.update_one({"_id": ObjectId(job_id)}, {"$set": job_data})
+    except PyMongoError as e:
+        raise Exception(f"Error updating job: {str(e)}")
+
+async def heartbeat_job(job_id: str, lease_id: str) -> bool:
+    """
+    Отмечает, что задача еще выполняется (процесс-исполнитель жив).
+    Возвращает False, если аренда потеряна: задачу вернули в очередь
+    """
+    try:
+        result = await jobs_collection.update_one(
+            {"_id": ObjectId(job_id), "status": "running", "lease_id": lease_id},
+            {"$set": {"heartbeat_at": datetime.utcnow()}}
+        )
+        return result.matched_count > 0
+    except PyMongoError as e:
+        raise Exception(f"Error updating job heartbeat: {str(e)}")
+
+async def finish_job(job_id: str, lease_id: str, job_data: dict) -> bool:
+    """
+    Завершает задачу (done или failed), только если аренда еще у этого
+    исполнителя. Возвращает False, если задачу уже вернули в очередь
+    """
+    try:
+        job_data["updated_at"] = datetime.utcnow()
+        job = await jobs_collection.find_one_and_update(
+            {"_id": ObjectId(job_id), "status": "running", "lease_id": lease_id},
+            {"$set": job_data, "$unset": {"lease_id": "", "heartbeat_at": ""}}
+        )
+        return job is not None
+    except PyMongoError as e:
+        raise Exception(f"Error finishing job: {str(e)}")
+
+async def requeue_stale_jobs(stale_after: int) -> int:
+    """
+    Возвращает в очередь задачи, которые числятся running, но не присылали
+    heartbeat stale_after секунд (процесс, выполнявший их, был остановлен).
+    У задач, взятых до появления heartbeat_at, смотрим на updated_at
+    """
+    try:
+        cutoff = datetime.utcnow() - timedelta(seconds=stale_after)
+        result = await jobs_collection.update_many(
+            {
+                "status": "running",
+                "$or": [
+                    {"heartbeat_at": {"$lt": cutoff}},
+                    {"heartbeat_at": {"$exists": False}, "updated_at": {"$lt": cutoff}}
+                ]
+            },
+            {"$set": {"status": "queued", "updated_at": datetime.utcnow()}, "$unset": {"heartbeat_at": "", "lease_id": ""}}
+        )
+        return result.modified_count
+    except PyMongoError as e:
+        raise Exception(f"Error requeueing jobs: {str(e)}")
+
 # Создание индексов для оптимизации
-def create_indexes():
+async def create_indexes():
     """
-    Создает индексы для оптимизации запросов
+    Создает индексы для оптимизации запросов. Вызывается миграцией
+    (python migrate.py), а не при старте каждого воркера
     """
     try:
         # Индексы для рецептов
-        recipes_collection.create_index("user_id")
-        recipes_collection.create_index("created_at")
-        recipes_collection.create_index("title")
-        
+        # Составной индекс обслуживает список рецептов пользователя
+        # с сортировкой и keyset-пагинацией по (created_at, _id)
+        await recipes_collection.create_index(
+            [("user_id", ASCENDING), ("created_at", DESCENDING), ("_id", DESCENDING)]
+        )
+        await recipes_collection.create_index("title")
+        # Полнотекстовый поиск: название важнее тегов и ингредиентов, описание — меньше всего
+        await recipes_collection.create_index(
+            [("title", "text"), ("tags", "text"), ("ingredients", "text"), ("description", "text")],
+            weights={"title": 10, "tags": 5, "ingredients": 3, "description": 1},
+            default_language="russian",
+            name="recipes_text"
+        )
+        # Фильтры «с курицей, без молочного» внутри рецептов пользователя
+        await recipes_collection.create_index([("user_id", ASCENDING), ("ingredient_tokens", ASCENDING)])
+        # Догрузка векторов, измененных после прошлой синхронизации индекса похожих
+        await recipes_collection.create_index([("user_id", ASCENDING), ("updated_at", ASCENDING)])
+
         # Индексы для пользователей
-        users_collection.create_index("email", unique=True)
-        users_collection.create_index("id")
-        
+        await users_collection.create_index("email", unique=True)
+        await users_collection.create_index("id")
+
+        # Индексы для очереди задач
+        await jobs_collection.create_index([("status", ASCENDING), ("created_at", ASCENDING)])
+        await jobs_collection.create_index("user_id")
+
+        # TTL-индекс: MongoDB сама удаляет просроченные записи кэша извлечения
+        await extraction_cache_collection.create_index("expires_at", expireAfterSeconds=0)
+        await transcripts_collection.create_index("expires_at", expireAfterSeconds=0)
+
         print("Database indexes created successfully")
     except PyMongoError as e:
-        print(f"Error creating indexes: {str(e)}")
-
-# Инициализация индексов при импорте модуля
-create_indexes() 
\ No newline at end of file
+        raise Exception(f"Error creating indexes: {str(e)}")
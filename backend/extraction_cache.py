@@ -0,0 +1,160 @@
+import asyncio
+import copy
+import hashlib
+import os
+import re
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Dict, Any, Callable, Awaitable, Optional
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
+
+import database
+import metrics
+
+# Время жизни закэшированного рецепта и размер кэша в памяти процесса
+CACHE_TTL = int(os.getenv("EXTRACTION_CACHE_TTL", 7 * 24 * 3600))
+CACHE_MAX_ITEMS = int(os.getenv("EXTRACTION_CACHE_MAX_ITEMS", 1000))
+
+# Параметры, которые не влияют на содержимое страницы
+TRACKING_PARAMS = {
+    "fbclid", "gclid", "yclid", "igshid", "igsh", "si", "ref", "ref_src",
+    "mc_cid", "mc_eid", "is_from_webapp", "sender_device", "share_app_id", "_r", "_t"
+}
+TRACKING_PREFIXES = ("utm_",)
+
+def normalize_url(url: str) -> str:
+    """
+    Приводит URL к каноническому виду: без трекинговых параметров,
+    Instagram — по shortcode, TikTok — по id видео
+    """
+    url = url.strip()
+    instagram = re.search(r'instagram\.com/(?:[\w.]+/)?(?:p|reel|reels|tv)/([\w-]+)', url)
+    if instagram:
+        return f"https://instagram.com/p/{instagram.group(1)}"
+    tiktok = re.search(r'tiktok\.com/.*?/video/(\d+)', url)
+    if tiktok:
+        return f"https://tiktok.com/video/{tiktok.group(1)}"
+
+    parts = urlsplit(url)
+    host = parts.netloc.lower()
+    for prefix in ("www.", "m."):
+        if host.startswith(prefix):
+            host = host[len(prefix):]
+    query = [
+        (key, value) for key, value in parse_qsl(parts.query, keep_blank_values=True)
+        if key.lower() not in TRACKING_PARAMS and not key.lower().startswith(TRACKING_PREFIXES)
+    ]
+    path = parts.path.rstrip("/") or "/"
+    return urlunsplit(("https", host, path, urlencode(sorted(query)), ""))
+
+def cache_key(url: str) -> str:
+    """
+    Ключ кэша — хэш нормализованного URL
+    """
+    return hashlib.sha256(normalize_url(url).encode()).hexdigest()
+
+def is_cacheable(recipe: Dict[str, Any]) -> bool:
+    """
+    Заглушки, которые возвращаются при ошибке извлечения, не кэшируем
+    """
+    return bool(recipe.get("ingredients") or recipe.get("instructions"))
+
+class _MemoryCache:
+    """
+    LRU-кэш с TTL, ограниченный по количеству записей
+    """
+    def __init__(self, max_items: int, ttl: int):
+        self.max_items = max_items
+        self.ttl = ttl
+        self._items = OrderedDict()
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        item = self._items.get(key)
+        if item is None:
+            return None
+        expires_at, value = item
+        if expires_at < time.monotonic():
+            del self._items[key]
+            return None
+        self._items.move_to_end(key)
+        return value
+
+    def set(self, key: str, value: Dict[str, Any], ttl: Optional[float] = None) -> None:
+        self._items[key] = (time.monotonic() + (ttl or self.ttl), value)
+        self._items.move_to_end(key)
+        while len(self._items) > self.max_items:
+            self._items.popitem(last=False)
+
+_memory = _MemoryCache(CACHE_MAX_ITEMS, CACHE_TTL)
+# Извлечения, которые выполняются прямо сейчас: ключ -> задача извлечения
+_inflight: Dict[str, asyncio.Task] = {}
+
+async def _lookup(key: str) -> Optional[Dict[str, Any]]:
+    recipe = _memory.get(key)
+    if recipe is not None:
+        metrics.incr("extraction_cache.memory_hits")
+        return recipe
+    try:
+        cached = await database.get_cached_extraction(key)
+    except Exception as e:
+        print(f"[ERROR] Ошибка чтения кэша извлечения: {e}")
+        metrics.incr("extraction_cache.errors")
+        return None
+    if cached:
+        metrics.incr("extraction_cache.mongo_hits")
+        ttl = (cached["expires_at"] - datetime.utcnow()).total_seconds()
+        _memory.set(key, cached["recipe"], ttl)
+        return cached["recipe"]
+    return None
+
+async def _store(key: str, url: str, recipe: Dict[str, Any]) -> None:
+    _memory.set(key, recipe)
+    try:
+        expires_at = datetime.utcnow() + timedelta(seconds=CACHE_TTL)
+        await database.save_cached_extraction(key, normalize_url(url), recipe, expires_at)
+    except Exception as e:
+        print(f"[ERROR] Ошибка записи кэша извлечения: {e}")
+        metrics.incr("extraction_cache.errors")
+
+async def get_or_extract(
+    url: str,
+    extract: Callable[[str], Awaitable[Dict[str, Any]]]
+) -> Dict[str, Any]:
+    """
+    Возвращает рецепт для URL из кэша (память, затем MongoDB) или извлекает его.
+    Одновременные запросы одного URL ждут одно общее извлечение
+    """
+    key = cache_key(url)
+    recipe = await _lookup(key)
+    if recipe is not None:
+        return copy.deepcopy(recipe)
+
+    task = _inflight.get(key)
+    if task is not None:
+        metrics.incr("extraction_cache.shared")
+    else:
+        metrics.incr("extraction_cache.misses")
+        # Извлечение идет в отдельной задаче, которой не владеет ни один запрос:
+        # отмена первого запроса не отменяет его для остальных ожидающих
+        task = asyncio.create_task(_extract_and_store(key, url, extract))
+        _inflight[key] = task
+        task.add_done_callback(lambda done: _release(key, done))
+    return copy.deepcopy(await asyncio.shield(task))
+
+async def _extract_and_store(
+    key: str,
+    url: str,
+    extract: Callable[[str], Awaitable[Dict[str, Any]]]
+) -> Dict[str, Any]:
+    recipe = await extract(url)
+    if is_cacheable(recipe):
+        await _store(key, url, copy.deepcopy(recipe))
+    return recipe
+
+def _release(key: str, task: "asyncio.Task") -> None:
+    if _inflight.get(key) is task:
+        del _inflight[key]
+    # Если все ожидающие отменились, исключение никто не заберет; помечаем его полученным
+    if not task.cancelled():
+        task.exception()
@@ -0,0 +1,182 @@
+import asyncio
+import json
+import os
+from collections import OrderedDict
+from typing import Dict, Any, Optional
+from urllib.parse import urlsplit
+
+import httpx
+from dotenv import load_dotenv
+
+import metrics
+
+load_dotenv()
+
+# Настройки загрузки страниц
+FETCH_TIMEOUT = float(os.getenv("FETCH_TIMEOUT", 15))
+FETCH_MAX_BYTES = int(os.getenv("FETCH_MAX_BYTES", 5 * 1024 * 1024))
+FETCH_MAX_CONNECTIONS = int(os.getenv("FETCH_MAX_CONNECTIONS", 100))
+FETCH_MAX_CONNECTIONS_PER_HOST = int(os.getenv("FETCH_MAX_CONNECTIONS_PER_HOST", 6))
+FETCH_CACHE_MAX_BYTES = int(os.getenv("FETCH_CACHE_MAX_BYTES", 50 * 1024 * 1024))
+USER_AGENT = os.getenv(
+    "FETCH_USER_AGENT",
+    "Mozilla/5.0 (compatible; RecipioBot/1.0; +https://recipio.app)"
+)
+
+# HTTP/2 доступен, только если установлен пакет h2 (httpx[http2])
+try:
+    import h2  # noqa: F401
+    HTTP2_ENABLED = True
+except ImportError:
+    HTTP2_ENABLED = False
+
+class FetchError(Exception):
+    """Ошибка загрузки: HTTP-статус, таймаут или превышение размера ответа"""
+
+class _ResponseCache:
+    """
+    LRU-кэш ответов с ETag/Last-Modified для условных запросов,
+    ограниченный суммарным размером тел
+    """
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self._items = OrderedDict()
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        item = self._items.get(key)
+        if item is not None:
+            self._items.move_to_end(key)
+        return item
+
+    def set(self, key: str, item: Dict[str, Any]) -> None:
+        if len(item["content"]) > self.max_bytes:
+            return
+        self.pop(key)
+        self._items[key] = item
+        self.size += len(item["content"])
+        while self.size > self.max_bytes:
+            _, evicted = self._items.popitem(last=False)
+            self.size -= len(evicted["content"])
+
+    def pop(self, key: str) -> None:
+        item = self._items.pop(key, None)
+        if item is not None:
+            self.size -= len(item["content"])
+
+_client = None
+_cache = _ResponseCache(FETCH_CACHE_MAX_BYTES)
+_host_semaphores: Dict[str, asyncio.Semaphore] = {}
+
+def get_client() -> httpx.AsyncClient:
+    """
+    Возвращает общий HTTP-клиент с пулом соединений, создавая его при первом вызове
+    """
+    global _client
+    if _client is None:
+        _client = httpx.AsyncClient(
+            http2=HTTP2_ENABLED,
+            follow_redirects=True,
+            timeout=FETCH_TIMEOUT,
+            limits=httpx.Limits(
+                max_connections=FETCH_MAX_CONNECTIONS,
+                max_keepalive_connections=FETCH_MAX_CONNECTIONS
+            ),
+            headers={"User-Agent": USER_AGENT}
+        )
+    return _client
+
+def _host_semaphore(url: str) -> asyncio.Semaphore:
+    host = urlsplit(url).netloc.lower()
+    if host not in _host_semaphores:
+        _host_semaphores[host] = asyncio.Semaphore(FETCH_MAX_CONNECTIONS_PER_HOST)
+    return _host_semaphores[host]
+
+async def fetch(url: str, headers: Dict[str, str] = None, params: Dict[str, Any] = None,
+                max_bytes: int = None) -> Dict[str, Any]:
+    """
+    Загружает URL через общий клиент. Тело читается потоком и обрывается
+    после max_bytes; ранее полученные ответы с ETag/Last-Modified
+    перепроверяются условным запросом и при 304 берутся из кэша
+    """
+    max_bytes = max_bytes or FETCH_MAX_BYTES
+    request_headers = dict(headers or {})
+    cache_key = str(httpx.URL(url, params=params))
+    cached = _cache.get(cache_key)
+    if cached:
+        if cached.get("etag"):
+            request_headers["If-None-Match"] = cached["etag"]
+        if cached.get("last_modified"):
+            request_headers["If-Modified-Since"] = cached["last_modified"]
+
+    try:
+        async with _host_semaphore(url):
+            async with get_client().stream("GET", url, headers=request_headers, params=params) as response:
+                if response.status_code == 304 and cached:
+                    metrics.incr("fetch.revalidated")
+                    return {**cached, "from_cache": True}
+                if response.status_code >= 400:
+                    await response.aread()
+                    raise FetchError(f"HTTP {response.status_code} for {url}: {response.text[:500]}")
+
+                content_length = response.headers.get("content-length")
+                if content_length and content_length.isdigit() and int(content_length) > max_bytes:
+                    raise FetchError(f"Response too large for {url}: {content_length} bytes")
+
+                # Считаем уже распакованные байты (gzip/brotli), чтобы не попасть на zip-бомбу
+                chunks = []
+                size = 0
+                async for chunk in response.aiter_bytes():
+                    size += len(chunk)
+                    if size > max_bytes:
+                        raise FetchError(f"Response too large for {url}: more than {max_bytes} bytes")
+                    chunks.append(chunk)
+
+                result = {
+                    "url": str(response.url),
+                    "status": response.status_code,
+                    "content": b"".join(chunks),
+                    "encoding": response.charset_encoding,
+                    "headers": dict(response.headers),
+                    "etag": response.headers.get("etag"),
+                    "last_modified": response.headers.get("last-modified"),
+                    "from_cache": False
+                }
+    except httpx.HTTPError as e:
+        raise FetchError(f"Error fetching {url}: {str(e)}")
+
+    metrics.incr("fetch.requests")
+    metrics.observe("fetch.bytes", len(result["content"]))
+    if result["etag"] or result["last_modified"]:
+        _cache.set(cache_key, result)
+    else:
+        _cache.pop(cache_key)
+    return result
+
+async def fetch_text(url: str, headers: Dict[str, str] = None, params: Dict[str, Any] = None,
+                     max_bytes: int = None) -> str:
+    """
+    Загружает URL и возвращает тело как текст
+    """
+    result = await fetch(url, headers=headers, params=params, max_bytes=max_bytes)
+    try:
+        return result["content"].decode(result["encoding"] or "utf-8", errors="replace")
+    except LookupError:
+        return result["content"].decode("utf-8", errors="replace")
+
+async def fetch_json(url: str, headers: Dict[str, str] = None, params: Dict[str, Any] = None,
+                     max_bytes: int = None) -> Any:
+    """
+    Загружает URL и разбирает тело как JSON
+    """
+    result = await fetch(url, headers=headers, params=params, max_bytes=max_bytes)
+    return json.loads(result["content"])
+
+async def close_client() -> None:
+    """
+    Закрывает общий HTTP-клиент (при остановке приложения)
+    """
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
@@ -0,0 +1,178 @@
+import asyncio
+import multiprocessing
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Any, List, TYPE_CHECKING
+
+from dotenv import load_dotenv
+
+from structured_data import recipe_from_json_ld, recipe_from_microdata
+
+if TYPE_CHECKING:
+    from bs4 import Tag
+
+load_dotenv()
+
+# Число процессов для разбора HTML; 0 — разбирать в потоке без пула процессов
+HTML_PARSER_WORKERS = int(os.getenv("HTML_PARSER_WORKERS", min(4, os.cpu_count() or 1)))
+
+def _default_backend() -> str:
+    try:
+        import lxml  # noqa: F401
+        return "lxml"
+    except ImportError:
+        return "html.parser"
+
+# Бэкенд BeautifulSoup: lxml заметно быстрее встроенного html.parser
+HTML_PARSER_BACKEND = os.getenv("HTML_PARSER_BACKEND") or _default_backend()
+
+# Классы блоков, в которых обычно лежит рецепт
+BLOCK_KEYWORDS = ['recipe', 'ingredients', 'instruction', 'step']
+LIST_TAGS = {'ul', 'ol', 'p'}
+SKIP_TAGS = {'script', 'style', 'noscript', 'template'}
+# Минимальная длина текста списка/параграфа, чтобы считать его блоком
+MIN_BLOCK_LENGTH = 30
+
+_MICRODATA_RECIPE_RE = re.compile(r'schema\.org/Recipe/?$', re.IGNORECASE)
+
+def _image_area(tag: "Tag") -> int:
+    try:
+        return int(tag.get('width', 0)) * int(tag.get('height', 0))
+    except (TypeError, ValueError):
+        return 0
+
+def _has_keyword_class(tag: "Tag") -> bool:
+    classes = tag.get('class')
+    if not classes:
+        return False
+    value = " ".join(classes).lower() if isinstance(classes, list) else str(classes).lower()
+    return any(keyword in value for keyword in BLOCK_KEYWORDS)
+
+def _clean_page_text(parts: List[str]) -> str:
+    lines = (line.strip() for part in parts for line in part.splitlines())
+    chunks = (phrase.strip() for line in lines for phrase in line.split("  "))
+    return ' '.join(chunk for chunk in chunks if chunk)
+
+def parse_html(html: str, backend: str = None) -> Dict[str, Any]:
+    """
+    Разбирает HTML за один обход дерева и собирает все, что нужно для извлечения рецепта:
+    og:image (или самую большую картинку), JSON-LD, рецепт из разметки schema.org,
+    блоки с «рецептными» классами, большие списки/параграфы и очищенный текст страницы.
+    Результат — обычный словарь, поэтому функцию можно выполнять в отдельном процессе
+    """
+    # BeautifulSoup нужен только процессам пула: процесс API его не импортирует
+    from bs4 import BeautifulSoup, NavigableString, Tag
+    from bs4.element import Comment, Declaration, Doctype, ProcessingInstruction
+
+    skip_strings = (Comment, Declaration, Doctype, ProcessingInstruction)
+    soup = BeautifulSoup(html, backend or HTML_PARSER_BACKEND)
+    og_image = None
+    largest_image = None
+    largest_area = 0
+    json_ld = []
+    has_microdata = False
+    blocks = []
+    text_parts = []
+
+    # Обход в глубину без рекурсии; флаги in_keyword/in_list не дают собирать
+    # вложенные блоки того же вида повторно (их текст уже вошел во внешний блок)
+    stack = [(soup, False, False)]
+    while stack:
+        node, in_keyword, in_list = stack.pop()
+        if isinstance(node, NavigableString):
+            if not isinstance(node, skip_strings):
+                text_parts.append(str(node))
+            continue
+        if not isinstance(node, Tag):
+            continue
+
+        name = node.name
+        if name == 'script':
+            if (node.get('type') or '').lower() == 'application/ld+json':
+                json_ld.append(node.string or node.get_text())
+            continue
+        if name in SKIP_TAGS:
+            continue
+        if name == 'meta':
+            if node.get('property') == 'og:image' and node.get('content') and not og_image:
+                og_image = node['content']
+        elif name == 'img':
+            area = _image_area(node)
+            if area > largest_area and node.get('src'):
+                largest_image = node['src']
+                largest_area = area
+        if not has_microdata and node.get('itemtype') and _MICRODATA_RECIPE_RE.search(node['itemtype']):
+            has_microdata = True
+
+        if not in_keyword and _has_keyword_class(node):
+            text = node.get_text(separator=" ", strip=True)
+            if text:
+                blocks.append({"kind": "keyword", "tag": name, "text": text})
+                in_keyword = True
+        if not in_list and name in LIST_TAGS:
+            text = node.get_text(separator=" ", strip=True)
+            if len(text) > MIN_BLOCK_LENGTH:
+                blocks.append({"kind": "list", "tag": name, "text": text})
+                in_list = True
+
+        # Дети кладутся в обратном порядке, чтобы обход шел в порядке документа
+        for child in reversed(node.contents):
+            stack.append((child, in_keyword, in_list))
+
+    structured = recipe_from_json_ld(json_ld)
+    if not structured and has_microdata:
+        structured = recipe_from_microdata(soup)
+
+    return {
+        "image_url": og_image or largest_image,
+        "json_ld": json_ld,
+        "structured": structured,
+        "blocks": blocks,
+        "text": _clean_page_text(text_parts)
+    }
+
+_executor = None
+# Ограничивает число страниц, ожидающих разбора, чтобы очередь пула не росла без предела
+_semaphore = asyncio.Semaphore(max(1, HTML_PARSER_WORKERS) * 2)
+
+def start_executor() -> None:
+    """
+    Создает пул процессов разбора HTML (при старте приложения). Процессы
+    порождаются через forkserver, а не fork: форк процесса с потоками
+    Motor и event loop небезопасен. Сервер заранее импортирует bs4,
+    поэтому новые процессы стартуют без повторного импорта
+    """
+    global _executor
+    if _executor is not None or HTML_PARSER_WORKERS <= 0:
+        return
+    if "forkserver" in multiprocessing.get_all_start_methods():
+        context = multiprocessing.get_context("forkserver")
+        context.set_forkserver_preload(["bs4", "html_parser"])
+    else:
+        context = multiprocessing.get_context("spawn")
+    _executor = ProcessPoolExecutor(max_workers=HTML_PARSER_WORKERS, mp_context=context)
+
+def _get_executor() -> ProcessPoolExecutor:
+    # Вне приложения (CLI, бенчмарк) пул создается при первом разборе
+    start_executor()
+    return _executor
+
+async def parse_html_async(html: str) -> Dict[str, Any]:
+    """
+    Разбирает HTML в пуле процессов, не занимая CPU потока event loop
+    """
+    async with _semaphore:
+        if HTML_PARSER_WORKERS <= 0:
+            return await asyncio.to_thread(parse_html, html)
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(_get_executor(), parse_html, html)
+
+def shutdown_executor() -> None:
+    """
+    Останавливает пул процессов разбора HTML (при остановке приложения)
+    """
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(cancel_futures=True)
+        _executor = None
@@ -0,0 +1,178 @@
+import asyncio
+import contextvars
+import os
+from contextlib import asynccontextmanager
+from typing import Dict, Any
+
+from dotenv import load_dotenv
+
+import database
+import metrics
+
+load_dotenv()
+
+# Количество воркеров, разбирающих очередь в одном процессе
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", 4))
+# Как часто воркер без задач заглядывает в MongoDB (задачи других процессов)
+JOB_POLL_INTERVAL = float(os.getenv("JOB_POLL_INTERVAL", 5))
+# Как часто выполняющаяся задача продлевает heartbeat_at и воркеры ищут брошенные
+JOB_HEARTBEAT_INTERVAL = float(os.getenv("JOB_HEARTBEAT_INTERVAL", 30))
+# Задача running без heartbeat дольше этого считается брошенной (процесс остановлен)
+JOB_STALE_AFTER = int(os.getenv("JOB_STALE_AFTER", 120))
+
+# Сколько задач одновременно может находиться на каждом этапе
+STAGE_CONCURRENCY = {
+    "fetch": int(os.getenv("JOB_CONCURRENCY_FETCH", 8)),
+    "download": int(os.getenv("JOB_CONCURRENCY_DOWNLOAD", 2)),
+    "audio": int(os.getenv("JOB_CONCURRENCY_AUDIO", 2)),
+    "transcribe": int(os.getenv("JOB_CONCURRENCY_TRANSCRIBE", 1)),
+    "llm": int(os.getenv("JOB_CONCURRENCY_LLM", 4)),
+}
+# Прогресс задачи (в процентах) при входе в этап
+STAGE_PROGRESS = {
+    "fetch": 10,
+    "download": 25,
+    "audio": 45,
+    "transcribe": 60,
+    "llm": 85,
+}
+
+_stage_semaphores = {name: asyncio.Semaphore(limit) for name, limit in STAGE_CONCURRENCY.items()}
+# ID задачи, которую выполняет текущая корутина (None вне воркера)
+_current_job = contextvars.ContextVar("current_job", default=None)
+_wakeup = asyncio.Event()
+_workers = []
+
+@asynccontextmanager
+async def stage(name: str):
+    """
+    Отмечает этап обработки: обновляет прогресс текущей задачи и ограничивает
+    число задач, одновременно выполняющих этот этап. Вне воркера только
+    ограничивает параллелизм
+    """
+    job_id = _current_job.get()
+    if job_id:
+        await database.update_job(job_id, {"stage": name, "progress": STAGE_PROGRESS.get(name, 0)})
+    semaphore = _stage_semaphores.get(name)
+    if semaphore is None:
+        yield
+        return
+    async with semaphore:
+        yield
+
+async def enqueue(user_id: str, url: str) -> Dict[str, Any]:
+    """
+    Ставит извлечение рецепта по URL в очередь и возвращает задачу
+    """
+    job = await database.create_job({
+        "user_id": user_id,
+        "url": url,
+        "stage": None,
+        "progress": 0,
+        "recipe_id": None,
+        "error": None
+    })
+    metrics.incr("jobs.enqueued")
+    _wakeup.set()
+    return job
+
+async def _heartbeat(job_id: str, lease_id: str) -> None:
+    # Долгие этапы (скачивание, транскрипция) идут минутами без update_job
+    while True:
+        await asyncio.sleep(JOB_HEARTBEAT_INTERVAL)
+        try:
+            if not await database.heartbeat_job(job_id, lease_id):
+                print(f"[LOG] Задача {job_id} возвращена в очередь, результат этого исполнителя не сохранится")
+                return
+        except Exception as e:
+            print(f"[ERROR] Не удалось продлить задачу {job_id}: {e}")
+
+async def _run_job(job: Dict[str, Any]) -> None:
+    # Импорт здесь: media_processor сам использует stage() из этого модуля,
+    # а стек извлечения не нужен процессу, пока нет задач
+    from ai_services import recipe_to_document
+    from media_processor import MediaProcessor
+
+    token = _current_job.set(job["id"])
+    heartbeat = asyncio.create_task(_heartbeat(job["id"], job["lease_id"]))
+    try:
+        print(f"[LOG] Задача {job['id']}: извлекаем рецепт из {job['url']}")
+        recipe_data = await MediaProcessor().process_url(job["url"])
+        # Задачу могли вернуть в очередь, пока шло извлечение: тогда рецепт
+        # сохранит новый исполнитель, а не этот
+        if not await database.heartbeat_job(job["id"], job["lease_id"]):
+            print(f"[LOG] Задача {job['id']} возвращена в очередь, рецепт не сохраняем")
+            metrics.incr("jobs.lease_lost")
+            return
+        saved_recipe = await database.save_recipe(
+            recipe_to_document(recipe_data, job["user_id"], job["url"])
+        )
+        finished = await database.finish_job(job["id"], job["lease_id"], {
+            "status": "done",
+            "stage": None,
+            "progress": 100,
+            "recipe_id": saved_recipe["id"]
+        })
+        if not finished:
+            # Аренду потеряли во время сохранения — убираем дубликат
+            await database.delete_recipe(saved_recipe["id"], job["user_id"])
+            print(f"[LOG] Задача {job['id']} возвращена в очередь во время сохранения, рецепт удален")
+            metrics.incr("jobs.lease_lost")
+            return
+        metrics.incr("jobs.done")
+    except Exception as e:
+        print(f"[ERROR] Задача {job['id']} завершилась ошибкой: {e}")
+        await database.finish_job(job["id"], job["lease_id"], {"status": "failed", "error": str(e)})
+        metrics.incr("jobs.failed")
+    finally:
+        heartbeat.cancel()
+        _current_job.reset(token)
+
+async def _worker() -> None:
+    while True:
+        try:
+            job = await database.claim_job()
+        except Exception as e:
+            print(f"[ERROR] Ошибка получения задачи из очереди: {e}")
+            job = None
+        if job is None:
+            _wakeup.clear()
+            try:
+                await asyncio.wait_for(_wakeup.wait(), JOB_POLL_INTERVAL)
+            except asyncio.TimeoutError:
+                pass
+            continue
+        try:
+            await _run_job(job)
+        except Exception as e:
+            print(f"[ERROR] Ошибка воркера очереди: {e}")
+
+async def _requeue_stale() -> None:
+    # Не только при старте: процесс другого воркера может упасть в любой момент
+    while True:
+        try:
+            requeued = await database.requeue_stale_jobs(JOB_STALE_AFTER)
+            if requeued:
+                print(f"[LOG] Возвращено в очередь задач: {requeued}")
+                _wakeup.set()
+        except Exception as e:
+            print(f"[ERROR] Ошибка восстановления задач: {e}")
+        await asyncio.sleep(JOB_HEARTBEAT_INTERVAL)
+
+async def start_workers() -> None:
+    """
+    Запускает воркеры и фоновый поиск брошенных задач (без heartbeat дольше
+    JOB_STALE_AFTER): старт воркера uvicorn не ждет ответа MongoDB
+    """
+    _workers.append(asyncio.create_task(_requeue_stale()))
+    for _ in range(JOB_WORKERS):
+        _workers.append(asyncio.create_task(_worker()))
+
+async def stop_workers() -> None:
+    """
+    Останавливает воркеры; незавершенные задачи подхватит следующий запуск
+    """
+    for worker in _workers:
+        worker.cancel()
+    await asyncio.gather(*_workers, return_exceptions=True)
+    _workers.clear()
@@ -0,0 +1,276 @@
+import asyncio
+import os
+import random
+import time
+from typing import List, Dict, Any, Optional, TYPE_CHECKING
+
+import httpx
+from dotenv import load_dotenv
+
+import metrics
+
+if TYPE_CHECKING:
+    import openai
+
+load_dotenv()
+
+# Настройки пула соединений и ограничения нагрузки на OpenAI
+OPENAI_MODEL = os.getenv("OPENAI_MODEL", "gpt-3.5-turbo")
+OPENAI_TIMEOUT = float(os.getenv("OPENAI_TIMEOUT", 60))
+OPENAI_MAX_CONNECTIONS = int(os.getenv("OPENAI_MAX_CONNECTIONS", 20))
+OPENAI_MAX_CONCURRENCY = int(os.getenv("OPENAI_MAX_CONCURRENCY", 10))
+
+# Провайдеры в порядке приоритета. Для каждого имени NAME читаются
+# LLM_NAME_BASE_URL, LLM_NAME_API_KEY, LLM_NAME_MODEL, LLM_NAME_RPM и
+# LLM_NAME_MAX_CONCURRENCY; для openai по умолчанию берутся OPENAI_*
+LLM_PROVIDERS = [name.strip() for name in os.getenv("LLM_PROVIDERS", "openai").split(",") if name.strip()]
+# Повторы с экспоненциальной задержкой на 429, 5xx и сетевые ошибки
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", 2))
+LLM_BACKOFF_BASE = float(os.getenv("LLM_BACKOFF_BASE", 0.5))
+LLM_BACKOFF_MAX = float(os.getenv("LLM_BACKOFF_MAX", 8))
+# Если ответа нет дольше LLM_HEDGE_AFTER секунд, тот же запрос уходит
+# следующему провайдеру; берется первый ответ (0 — без хеджирования)
+LLM_HEDGE_AFTER = float(os.getenv("LLM_HEDGE_AFTER", 10))
+# После LLM_BREAKER_FAILURES ошибок подряд провайдер пропускается
+# LLM_BREAKER_COOLDOWN секунд, затем получает один пробный запрос
+LLM_BREAKER_FAILURES = int(os.getenv("LLM_BREAKER_FAILURES", 5))
+LLM_BREAKER_COOLDOWN = float(os.getenv("LLM_BREAKER_COOLDOWN", 30))
+
+class LLMUnavailableError(Exception):
+    """Ни один провайдер LLM не ответил"""
+
+class _TokenBucket:
+    """
+    Ограничение частоты запросов: rpm запросов в минуту, всплеск до 10 секунд трафика
+    """
+    def __init__(self, rpm: int):
+        self.rate = rpm / 60
+        self.capacity = max(1.0, self.rate * 10)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def available(self) -> bool:
+        if not self.rate:
+            return True
+        self._refill()
+        return self.tokens >= 1
+
+    async def acquire(self) -> None:
+        if not self.rate:
+            return
+        while True:
+            self._refill()
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return
+            await asyncio.sleep((1 - self.tokens) / self.rate)
+
+class _CircuitBreaker:
+    def __init__(self):
+        self.failures = 0
+        self.opened_at = None
+        self.trial = False
+
+    def is_open(self) -> bool:
+        """Цепь разомкнута: пауза не истекла или пробный запрос уже выполняется"""
+        if self.opened_at is None:
+            return False
+        return self.trial or time.monotonic() - self.opened_at < LLM_BREAKER_COOLDOWN
+
+    def allow(self) -> bool:
+        """Можно ли отправить запрос; в полуоткрытом состоянии занимает пробный запрос"""
+        if self.opened_at is None:
+            return True
+        # Полуоткрытое состояние: пропускаем один пробный запрос
+        if not self.trial and time.monotonic() - self.opened_at >= LLM_BREAKER_COOLDOWN:
+            self.trial = True
+            return True
+        return False
+
+    def record_success(self) -> None:
+        self.failures = 0
+        self.opened_at = None
+        self.trial = False
+
+    def record_failure(self) -> bool:
+        """Учитывает ошибку; возвращает True, если цепь только что разомкнулась"""
+        self.failures += 1
+        if self.trial or (self.opened_at is None and self.failures >= LLM_BREAKER_FAILURES):
+            self.opened_at = time.monotonic()
+            self.trial = False
+            return True
+        return False
+
+class _Provider:
+    def __init__(self, name: str):
+        # SDK OpenAI импортируется ~0.2 с — при создании клиентов, а не при импорте модуля
+        import openai
+
+        prefix = f"LLM_{name.upper()}_"
+        default_openai = name == "openai"
+        self.name = name
+        self.model = os.getenv(prefix + "MODEL") or OPENAI_MODEL
+        # Локальные OpenAI-совместимые серверы ключ не проверяют, но SDK требует непустой
+        self.client = openai.AsyncOpenAI(
+            api_key=os.getenv(prefix + "API_KEY") or (os.getenv("OPENAI_API_KEY") if default_openai else "local"),
+            base_url=os.getenv(prefix + "BASE_URL") or (os.getenv("OPENAI_BASE_URL") if default_openai else None) or None,
+            timeout=OPENAI_TIMEOUT,
+            max_retries=0,
+            http_client=httpx.AsyncClient(
+                limits=httpx.Limits(
+                    max_connections=OPENAI_MAX_CONNECTIONS,
+                    max_keepalive_connections=OPENAI_MAX_CONNECTIONS
+                ),
+                timeout=OPENAI_TIMEOUT
+            )
+        )
+        self.bucket = _TokenBucket(int(os.getenv(prefix + "RPM", 0)))
+        self.breaker = _CircuitBreaker()
+        self.semaphore = asyncio.Semaphore(int(os.getenv(prefix + "MAX_CONCURRENCY", OPENAI_MAX_CONCURRENCY)))
+
+# Клиенты создаются один раз на процесс: TLS-соединения переиспользуются между запросами
+_providers: Optional[List[_Provider]] = None
+
+def _get_providers() -> List[_Provider]:
+    global _providers
+    if _providers is None:
+        _providers = [_Provider(name) for name in LLM_PROVIDERS]
+    return _providers
+
+def get_client() -> "openai.AsyncOpenAI":
+    """
+    Возвращает клиент первого провайдера (для API кроме chat, например Whisper)
+    """
+    return _get_providers()[0].client
+
+def _is_retryable(error: Exception) -> bool:
+    import openai
+
+    if isinstance(error, openai.APIConnectionError):
+        return True
+    if isinstance(error, openai.APIStatusError):
+        return error.status_code == 429 or error.status_code >= 500
+    return False
+
+def _backoff(attempt: int, error: Exception) -> float:
+    # Retry-After от провайдера важнее собственной оценки
+    response = getattr(error, "response", None)
+    retry_after = response.headers.get("retry-after") if response is not None else None
+    if retry_after and retry_after.replace(".", "", 1).isdigit():
+        return min(float(retry_after), LLM_BACKOFF_MAX)
+    return min(LLM_BACKOFF_MAX, LLM_BACKOFF_BASE * 2 ** attempt) * random.uniform(0.5, 1)
+
+async def _call_provider(provider: _Provider, messages: List[Dict[str, Any]],
+                         timeout: float, kwargs: Dict[str, Any]):
+    for attempt in range(LLM_MAX_RETRIES + 1):
+        if not provider.breaker.allow():
+            raise LLMUnavailableError(f"Circuit open for {provider.name}")
+        # Пробный запрос полуоткрытой цепи обязан завершиться записью исхода:
+        # иначе отмена (проигравший хедж) или ошибка запроса оставят trial навсегда
+        probing = provider.breaker.trial
+        recorded = False
+        try:
+            await provider.bucket.acquire()
+            started = time.perf_counter()
+            try:
+                async with provider.semaphore:
+                    response = await provider.client.chat.completions.create(
+                        model=provider.model,
+                        messages=messages,
+                        timeout=timeout,
+                        **kwargs
+                    )
+            except Exception as e:
+                if not _is_retryable(e):
+                    raise
+                metrics.incr(f"llm.{provider.name}.errors")
+                recorded = True
+                if provider.breaker.record_failure():
+                    metrics.incr(f"llm.{provider.name}.breaker_opened")
+                    print(f"[ERROR] LLM {provider.name} отключен на {LLM_BREAKER_COOLDOWN:.0f} с: {e}")
+                if attempt == LLM_MAX_RETRIES:
+                    raise
+                await asyncio.sleep(_backoff(attempt, e))
+                continue
+            provider.breaker.record_success()
+            recorded = True
+        finally:
+            if probing and not recorded:
+                provider.breaker.record_failure()
+        metrics.incr(f"llm.{provider.name}.requests")
+        metrics.observe(f"llm.{provider.name}.seconds", time.perf_counter() - started)
+        return response
+
+async def chat_completion(messages: List[Dict[str, Any]], timeout: float = None, **kwargs):
+    """
+    Выполняет запрос chat.completions через провайдеров из LLM_PROVIDERS:
+    с лимитом частоты каждого, повторами с экспоненциальной задержкой,
+    переходом к следующему при ошибке или разомкнутой цепи и хеджированием
+    медленных запросов. Модель задается провайдером (LLM_NAME_MODEL)
+    """
+    kwargs.pop("model", None)
+    timeout = timeout or OPENAI_TIMEOUT
+    # Провайдеры с разомкнутой цепью пропускаем; с исчерпанным лимитом — в конец
+    providers = [provider for provider in _get_providers() if not provider.breaker.is_open()]
+    providers.sort(key=lambda provider: not provider.bucket.available())
+    if not providers:
+        raise LLMUnavailableError("All LLM providers are unavailable (circuit open)")
+
+    remaining = iter(providers)
+    pending = {}
+    errors = []
+    hedged = False
+
+    def start_next() -> bool:
+        provider = next(remaining, None)
+        if provider is None:
+            return False
+        task = asyncio.create_task(_call_provider(provider, messages, timeout, kwargs))
+        pending[task] = provider
+        return True
+
+    start_next()
+    try:
+        while pending:
+            hedge_after = LLM_HEDGE_AFTER if LLM_HEDGE_AFTER > 0 and not hedged else None
+            done, _ = await asyncio.wait(pending, timeout=hedge_after, return_when=asyncio.FIRST_COMPLETED)
+            if not done:
+                # Первый провайдер отвечает слишком долго — дублируем запрос следующему
+                hedged = True
+                if start_next():
+                    metrics.incr("llm.hedged")
+                continue
+            for task in done:
+                provider = pending.pop(task)
+                if task.exception() is None:
+                    response = task.result()
+                    if response.usage:
+                        metrics.observe("llm.prompt_tokens", response.usage.prompt_tokens)
+                        metrics.observe("llm.completion_tokens", response.usage.completion_tokens)
+                    return response
+                errors.append(f"{provider.name}: {task.exception()}")
+                # Ошибка запроса (400 и т.п.) повторится у любого провайдера
+                if not isinstance(task.exception(), LLMUnavailableError) and not _is_retryable(task.exception()):
+                    raise task.exception()
+                # Следующий провайдер — сразу, не дожидаясь еще идущего хеджа
+                if start_next():
+                    metrics.incr("llm.failover")
+        raise LLMUnavailableError(f"All LLM providers failed: {'; '.join(errors)}")
+    finally:
+        for task in pending:
+            task.cancel()
+
+async def close_client() -> None:
+    """
+    Закрывает клиенты всех провайдеров (при остановке приложения)
+    """
+    global _providers
+    if _providers is not None:
+        for provider in _providers:
+            await provider.client.close()
+        _providers = None
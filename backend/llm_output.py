@@ -0,0 +1,187 @@
+import json
+import os
+import re
+from typing import Dict, Any, List, Optional, Tuple
+
+from dotenv import load_dotenv
+from pydantic import TypeAdapter, ValidationError
+
+import metrics
+from llm_client import chat_completion
+from schemas import RecipeCreate
+
+load_dotenv()
+
+# tools — function calling со схемой, json — response_format json_object,
+# text — обычный ответ (для моделей без structured output)
+LLM_OUTPUT_MODE = os.getenv("LLM_OUTPUT_MODE", "tools")
+TOOL_NAME = "save_recipe"
+
+_FENCE_RE = re.compile(r'```(?:json)?\s*(.*?)```', re.DOTALL | re.IGNORECASE)
+_TRAILING_COMMA_RE = re.compile(r',\s*([}\]])')
+_PY_LITERALS = {"True": "true", "False": "false", "None": "null"}
+_PY_LITERAL_RE = re.compile(r'\b(True|False|None)\b')
+# «Умные» кавычки в роли разделителей ключей и значений: после { [ , : или перед : , } ]
+_CURLY_QUOTE_RE = re.compile(r'(?<=[{\[,:])(\s*)[“”]|[“”](?=\s*[:,}\]])')
+
+_adapters = {name: TypeAdapter(field.annotation) for name, field in RecipeCreate.model_fields.items()}
+
+def recipe_schema(fields: List[str]) -> Dict[str, Any]:
+    """
+    JSON Schema рецепта (из RecipeCreate), ограниченная полями fields
+    """
+    schema = RecipeCreate.model_json_schema()
+    return {
+        "type": "object",
+        "properties": {name: schema["properties"][name] for name in fields},
+        "required": list(fields)
+    }
+
+def repair_json(content: Optional[str]) -> Optional[Dict[str, Any]]:
+    """
+    Разбирает «почти JSON» из ответа модели: текст вокруг объекта,
+    ```json-блоки, запятые перед скобкой, True/False/None, «умные» кавычки.
+    Возвращает словарь или None, если починить не удалось
+    """
+    if not content:
+        return None
+    fenced = _FENCE_RE.search(content)
+    if fenced:
+        content = fenced.group(1)
+    start, end = content.find("{"), content.rfind("}")
+    if start == -1 or end <= start:
+        return None
+    content = content[start:end + 1]
+
+    candidates = [content]
+    fixed = _TRAILING_COMMA_RE.sub(r'\1', content)
+    fixed = _PY_LITERAL_RE.sub(lambda match: _PY_LITERALS[match.group(1)], fixed)
+    # Кавычки “ ” заменяем только там, где ими размечен сам JSON (прямых кавычек
+    # в ответе нет); «» и “” внутри значений — часть текста рецепта
+    if '"' not in fixed:
+        fixed = _CURLY_QUOTE_RE.sub(lambda match: (match.group(1) or "") + '"', fixed)
+    candidates.append(fixed)
+    # Словарь в стиле Python с одинарными кавычками
+    if '"' not in fixed:
+        candidates.append(fixed.replace("'", '"'))
+
+    for candidate in candidates:
+        try:
+            data = json.loads(candidate)
+        except ValueError:
+            continue
+        if isinstance(data, dict):
+            return data
+    return None
+
+def validate_fields(data: Dict[str, Any], fields: List[str]) -> Tuple[Dict[str, Any], Dict[str, str]]:
+    """
+    Проверяет каждое поле отдельно по схеме RecipeCreate.
+    Возвращает (валидные значения, {поле: ошибка}) — так переспрашивать
+    можно только невалидные поля
+    """
+    valid = {}
+    errors = {}
+    for name in fields:
+        if name not in data:
+            # Необязательные поля (image_url) не стоят отдельного запроса
+            if RecipeCreate.model_fields[name].is_required():
+                errors[name] = "missing"
+            continue
+        try:
+            valid[name] = _adapters[name].validate_python(data[name])
+        except ValidationError as e:
+            errors[name] = e.errors()[0]["msg"]
+    return valid, errors
+
+def _request_kwargs(fields: List[str]) -> Dict[str, Any]:
+    if LLM_OUTPUT_MODE == "tools":
+        return {
+            "tools": [{
+                "type": "function",
+                "function": {
+                    "name": TOOL_NAME,
+                    "description": "Сохранить извлеченный рецепт",
+                    "parameters": recipe_schema(fields)
+                }
+            }],
+            "tool_choice": {"type": "function", "function": {"name": TOOL_NAME}}
+        }
+    if LLM_OUTPUT_MODE == "json":
+        return {"response_format": {"type": "json_object"}}
+    return {}
+
+def _response_content(response) -> str:
+    message = response.choices[0].message
+    if message.tool_calls:
+        return message.tool_calls[0].function.arguments
+    return message.content or ""
+
+def _total_tokens(response) -> int:
+    return response.usage.total_tokens if response.usage else 0
+
+async def extract_structured(messages: List[Dict[str, Any]], fields: List[str],
+                             defaults: Dict[str, Any], **kwargs) -> Dict[str, Any]:
+    """
+    Запрашивает у модели рецепт в виде структурированного ответа, чинит
+    «почти JSON» и проверяет поля по RecipeCreate. Невалидные поля
+    переспрашиваются одним коротким запросом — с прошлым ответом и ошибками,
+    а исходный текст добавляется, только если ответ не разобрался совсем.
+    Что не удалось получить, берется из defaults
+    """
+    response = await chat_completion(messages=messages, **_request_kwargs(fields), **kwargs)
+    tokens = _total_tokens(response)
+    content = _response_content(response)
+    data = repair_json(content)
+    wasted = 0
+    # Исходный текст нужен при переспросе, только если из ответа нечего исправлять
+    source = []
+    if data is None:
+        metrics.incr("llm.output.unparsed")
+        wasted = tokens
+        data = {}
+        source = [message for message in messages if message.get("role") == "user"]
+    else:
+        try:
+            json.loads(content)
+        except ValueError:
+            metrics.incr("llm.output.repaired")
+    valid, errors = validate_fields(data, fields)
+
+    if errors:
+        metrics.incr("llm.output.reasks")
+        invalid = list(errors)
+        print(f"[LOG] Переспрашиваем у модели поля: {', '.join(invalid)}")
+        followup = [
+            {"role": "system", "content": "Исправь ответ. Верни только JSON-объект с указанными полями."},
+            *source,
+            {"role": "user", "content": (
+                f"Прошлый ответ:\n{content[:2000]}\n\n"
+                f"Поля с ошибками: {json.dumps(errors, ensure_ascii=False)}\n"
+                f"Схема: {json.dumps(recipe_schema(invalid), ensure_ascii=False)}"
+            )}
+        ]
+        try:
+            retry = await chat_completion(messages=followup, **_request_kwargs(invalid),
+                                          temperature=0, max_tokens=kwargs.get("max_tokens", 1000))
+        except Exception as e:
+            # Переспрос не удался — остаются поля первого ответа и defaults;
+            # без единого пригодного поля ошибка уходит вызывающему
+            print(f"[ERROR] Переспрос полей не удался: {e}")
+            metrics.incr("llm.output.reask_failed")
+            if not valid:
+                raise
+        else:
+            metrics.observe("llm.output.reask_tokens", _total_tokens(retry))
+            fixed, errors = validate_fields(repair_json(_response_content(retry)) or {}, invalid)
+            valid.update(fixed)
+            tokens += _total_tokens(retry)
+
+    if errors:
+        metrics.incr("llm.output.defaulted_fields", len(errors))
+    if not valid:
+        # Ни одного пригодного поля: за все токены запроса ничего не получили
+        wasted = tokens
+    if wasted:
+        metrics.observe("llm.output.wasted_tokens", wasted)
+    return {**defaults, **valid}
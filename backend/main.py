@@ -1,21 +1,60 @@
-from fastapi import FastAPI, HTTPException, Depends, status
+from fastapi import FastAPI, HTTPException, Depends, Query, Request, Response, status
+from fastapi.responses import StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from pydantic import BaseModel
-from typing import List, Optional
+from pydantic import BaseModel, Field, TypeAdapter, ValidationError
+from typing import Dict, List, Optional, Union
 import httpx
 import json
 import os
 from datetime import datetime
 import uuid
+import zlib
+from contextlib import asynccontextmanager
 
-# Импортируем функции для работы с MongoDB
-from database import (
-    save_recipe, get_recipe, get_user_recipes, update_recipe, 
-    delete_recipe, save_user, get_user, update_user
-)
+# Модуль для работы с MongoDB (асинхронный, на Motor).
+# Импортируем модулем: имена эндпоинтов совпадают с именами функций БД
+import database
+import metrics
+import extraction_cache
+import llm_client
+import fetcher
+import html_parser
+import jobs
+import transcription
+import batch_extract
+import search
+import response_cache
+import auth
+import prewarm
+from schemas import RecipeCreate
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    Создает общие клиенты (MongoDB, HTTP) и запускает воркеры очереди
+    один раз на воркер uvicorn; тяжелый стек извлечения и клиент LLM
+    прогреваются в фоне (prewarm.py). При остановке все закрывается.
+    Индексы создает миграция (python migrate.py), а не каждый воркер
+    """
+    database.connect()
+    fetcher.get_client()
+    html_parser.start_executor()
+    await auth.start()
+    await transcription.preload()
+    await jobs.start_workers()
+    await prewarm.start()
+    yield
+    await prewarm.stop()
+    await jobs.stop_workers()
+    await auth.stop()
+    await transcription.close_backend()
+    await llm_client.close_client()
+    await fetcher.close_client()
+    html_parser.shutdown_executor()
+    database.close()
 
-app = FastAPI(title="Recipio API", version="1.0.0")
+app = FastAPI(title="Recipio API", version="1.0.0", lifespan=lifespan)
 
 # Настройка CORS для iOS приложения
 app.add_middleware(
@@ -24,10 +63,12 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "ETag"],
 )
 
-# Модели данных
-class RecipeCreate(BaseModel):
+# Модели данных (RecipeCreate — в schemas.py, общая с извлечением через LLM)
+class RecipeResponse(BaseModel):
+    id: str
     title: str
     description: str
     ingredients: List[str]
@@ -39,63 +80,274 @@ class RecipeCreate(BaseModel):
     tags: List[str]
     image_url: Optional[str] = None
     source_url: Optional[str] = None
+    is_favorite: bool = False
+    created_at: str
+    updated_at: str
 
-class RecipeResponse(BaseModel):
+class RecipeSummary(BaseModel):
     id: str
     title: str
-    description: str
-    ingredients: List[str]
-    instructions: List[str]
-    cooking_time: int
-    servings: int
-    difficulty: str
+    image_url: Optional[str] = None
     cuisine: str
+    cooking_time: int
     tags: List[str]
-    image_url: Optional[str] = None
-    source_url: Optional[str] = None
-    is_favorite: bool = False
     created_at: str
-    updated_at: str
+
+class RecipeSearchResponse(BaseModel):
+    results: List[Union[RecipeResponse, RecipeSummary]]
+    total: int
+    # Фасеты по всем найденным рецептам: {"cuisine": {"Italian": 12, ...}, ...}
+    facets: Dict[str, Dict[str, int]]
+    next_offset: Optional[int] = None
+
+class SimilarRecipe(RecipeSummary):
+    # Косинусная близость к исходному рецепту (0..1)
+    score: float
 
 class APIResponse(BaseModel):
     success: bool
     data: Optional[RecipeResponse] = None
     message: Optional[str] = None
+    # Уже сохраненные почти такие же рецепты (предупреждение при создании)
+    duplicates: Optional[List[SimilarRecipe]] = None
 
 class ExtractRecipeRequest(BaseModel):
     url: str
+    # sync — извлечь в рамках запроса, async — поставить задачу в очередь.
+    # По умолчанию видео (Instagram/TikTok) идут в очередь, веб-страницы — синхронно
+    mode: Optional[str] = Field(None, pattern="^(sync|async)$")
+
+class BatchExtractRequest(BaseModel):
+    urls: List[str] = Field(..., min_length=1, max_length=batch_extract.BATCH_EXTRACT_MAX_URLS)
+
+class JobResponse(BaseModel):
+    id: str
+    status: str
+    url: str
+    stage: Optional[str] = None
+    progress: int = 0
+    recipe_id: Optional[str] = None
+    error: Optional[str] = None
+    created_at: str
+    updated_at: str
+
+class JobAPIResponse(BaseModel):
+    success: bool
+    job: JobResponse
+    message: Optional[str] = None
+
+# Размер пачки при экспорте и импорте рецептов
+EXPORT_BATCH_SIZE = 500
+IMPORT_BATCH_SIZE = 500
+# Сколько ошибок импорта возвращать клиенту
+IMPORT_MAX_ERRORS = 20
 
 # Безопасность
 security = HTTPBearer()
 
-def get_current_user_id(credentials: HTTPAuthorizationCredentials = Depends(security)) -> str:
-    """Извлекает user_id из JWT токена"""
+async def get_current_user_id(credentials: HTTPAuthorizationCredentials = Depends(security)) -> str:
+    """Извлекает user_id (claim sub) из проверенного JWT Supabase"""
     try:
-        # Здесь должна быть валидация JWT токена
-        # Пока что просто извлекаем user_id из токена
-        token = credentials.credentials
-        # В реальном приложении декодируйте JWT и извлеките user_id
-        # Пока что используем простую логику
-        return "user_" + str(hash(token) % 1000)
-    except Exception:
+        return await auth.verify_token(credentials.credentials)
+    except auth.AuthError:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Invalid authentication credentials"
+            detail="Invalid authentication credentials",
+            headers={"WWW-Authenticate": "Bearer"}
         )
 
 @app.get("/")
 async def root():
     return {"message": "Recipio API is running!"}
 
-@app.get("/api/recipes", response_model=List[RecipeResponse])
-async def get_recipes(user_id: str = Depends(get_current_user_id)):
-    """Получить все рецепты пользователя"""
+_recipe_list_adapters = {
+    "full": TypeAdapter(List[RecipeResponse]),
+    "summary": TypeAdapter(List[RecipeSummary]),
+}
+
+@app.get("/api/recipes", response_model=List[Union[RecipeResponse, RecipeSummary]])
+async def get_recipes(
+    request: Request,
+    limit: Optional[int] = Query(None, ge=1, le=100),
+    cursor: Optional[str] = None,
+    view: str = Query("full", pattern="^(full|summary)$"),
+    user_id: str = Depends(get_current_user_id)
+):
+    """
+    Получить рецепты пользователя, новые первыми.
+    Без limit возвращается весь список. С limit курсор следующей страницы
+    передается в заголовке X-Next-Cursor; view=summary отдает облегченные записи.
+    Ответ с ETag: при совпадающем If-None-Match — 304
+    """
+    async def build():
+        user_recipes = await database.get_user_recipes(
+            user_id, limit=limit, cursor=cursor, summary=view == "summary"
+        )
+        headers = {}
+        if limit and len(user_recipes) == limit:
+            headers["X-Next-Cursor"] = database.encode_cursor(user_recipes[-1])
+        # validate_python отбрасывает служебные поля (ingredient_tokens, embedding)
+        adapter = _recipe_list_adapters[view]
+        return adapter.dump_json(adapter.validate_python(user_recipes)), headers
+
+    try:
+        return await response_cache.cached_response(request, user_id, build)
+    except database.InvalidCursorError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+def _split_list(value: Optional[str]) -> List[str]:
+    return [item.strip() for item in value.split(",") if item.strip()] if value else []
+
+@app.get("/api/recipes/search", response_model=RecipeSearchResponse)
+async def search_recipes(
+    q: Optional[str] = Query(None, max_length=200),
+    include: Optional[str] = None,
+    exclude: Optional[str] = None,
+    cuisine: Optional[str] = None,
+    difficulty: Optional[str] = None,
+    max_time: Optional[int] = Query(None, ge=1),
+    limit: int = Query(20, ge=1, le=100),
+    offset: int = Query(0, ge=0),
+    view: str = Query("full", pattern="^(full|summary)$"),
+    user_id: str = Depends(get_current_user_id)
+):
+    """
+    Поиск по рецептам пользователя: q — полнотекстовый запрос (название,
+    теги, ингредиенты, описание), include/exclude — ингредиенты или группы
+    через запятую (exclude=dairy — «без молочного»). Результаты ранжируются
+    по релевантности, facets считаются по всей выборке
+    """
     try:
-        user_recipes = get_user_recipes(user_id)
-        return user_recipes
+        match = search.build_search_filter(
+            user_id, query=q, include=_split_list(include), exclude=_split_list(exclude),
+            cuisine=cuisine, difficulty=difficulty, max_time=max_time
+        )
+        found = await database.search_recipes(
+            match, ranked=bool(q), offset=offset, limit=limit, summary=view == "summary"
+        )
+        next_offset = offset + limit if offset + limit < found["total"] else None
+        return RecipeSearchResponse(**found, next_offset=next_offset)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.get("/api/recipes/export")
+async def export_recipes(
+    gzip: bool = False,
+    user_id: str = Depends(get_current_user_id)
+):
+    """
+    Экспортировать все рецепты пользователя в NDJSON (по рецепту на строку).
+    Ответ стримится прямо с курсора MongoDB, поэтому память не растет
+    с размером коллекции; gzip=true сжимает поток
+    """
+    async def generate():
+        compressor = zlib.compressobj(wbits=31) if gzip else None
+        batch = []
+        async for recipe in database.iter_user_recipes(user_id, EXPORT_BATCH_SIZE):
+            recipe.pop("user_id", None)
+            recipe.pop("ingredient_tokens", None)
+            recipe.pop("embedding", None)
+            batch.append(json.dumps(recipe, ensure_ascii=False))
+            if len(batch) >= EXPORT_BATCH_SIZE:
+                chunk = ("\n".join(batch) + "\n").encode()
+                batch = []
+                yield compressor.compress(chunk) if compressor else chunk
+        chunk = ("\n".join(batch) + "\n").encode() if batch else b""
+        if compressor:
+            yield compressor.compress(chunk) + compressor.flush()
+        elif chunk:
+            yield chunk
+
+    filename = "recipes.ndjson.gz" if gzip else "recipes.ndjson"
+    return StreamingResponse(
+        generate(),
+        media_type="application/gzip" if gzip else "application/x-ndjson",
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
+
+@app.post("/api/recipes/import")
+async def import_recipes(
+    request: Request,
+    user_id: str = Depends(get_current_user_id)
+):
+    """
+    Импортировать рецепты из NDJSON (формат экспорта).
+    Тело читается потоком и сохраняется пачками через insert_many;
+    поддерживается gzip (Content-Encoding: gzip или сжатый файл экспорта)
+    """
+    # wbits=47 автоматически распознает gzip и zlib
+    decompressor = None
+    if request.headers.get("content-encoding", "").lower() == "gzip":
+        decompressor = zlib.decompressobj(wbits=47)
+
+    imported = 0
+    failed = 0
+    errors = []
+    batch = []
+    buffer = b""
+    line_number = 0
+    first_chunk = True
+
+    async def flush():
+        nonlocal imported, failed, batch
+        if batch:
+            inserted = sum(1 for recipe_id in await database.insert_recipes(batch) if recipe_id)
+            response_cache.invalidate(user_id)
+            imported += inserted
+            failed += len(batch) - inserted
+            batch = []
+
+    def parse_line(line: bytes):
+        nonlocal failed
+        if not line.strip():
+            return
+        try:
+            record = json.loads(line)
+            recipe = RecipeCreate.model_validate(record)
+            batch.append({
+                **recipe.model_dump(),
+                "user_id": user_id,
+                "is_favorite": bool(record.get("is_favorite", False))
+            })
+        except (ValueError, ValidationError) as e:
+            failed += 1
+            if len(errors) < IMPORT_MAX_ERRORS:
+                errors.append({"line": line_number, "error": str(e)})
+
+    try:
+        async for chunk in request.stream():
+            # Сжатый файл экспорта узнаем по сигнатуре gzip
+            if first_chunk and decompressor is None and chunk[:2] == b"\x1f\x8b":
+                decompressor = zlib.decompressobj(wbits=47)
+            first_chunk = first_chunk and not chunk
+            if decompressor:
+                chunk = decompressor.decompress(chunk)
+            buffer += chunk
+            *lines, buffer = buffer.split(b"\n")
+            for line in lines:
+                line_number += 1
+                parse_line(line)
+                if len(batch) >= IMPORT_BATCH_SIZE:
+                    await flush()
+        if decompressor:
+            buffer += decompressor.flush()
+        line_number += 1
+        parse_line(buffer)
+        await flush()
+    except zlib.error as e:
+        raise HTTPException(status_code=400, detail=f"Invalid gzip stream: {str(e)}")
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+    return {
+        "success": failed == 0,
+        "imported": imported,
+        "failed": failed,
+        "errors": errors
+    }
+
 @app.post("/api/recipes", response_model=APIResponse, status_code=201)
 async def create_recipe(
     recipe: RecipeCreate,
@@ -119,12 +371,22 @@ async def create_recipe(
             "is_favorite": False
         }
         
-        saved_recipe = save_recipe(recipe_data)
+        # Проверка на дубликаты не должна мешать сохранению
+        try:
+            from similarity import find_duplicates
+            duplicates = await find_duplicates(user_id, recipe.title, recipe.ingredients)
+        except Exception as e:
+            print(f"[ERROR] Не удалось проверить дубликаты: {e}")
+            duplicates = []
+
+        saved_recipe = await database.save_recipe(recipe_data)
+        response_cache.invalidate(user_id)
         
         return APIResponse(
             success=True,
             data=RecipeResponse(**saved_recipe),
-            message="Recipe created successfully"
+            message="Recipe created successfully" + ("; similar recipes already saved" if duplicates else ""),
+            duplicates=[SimilarRecipe(**duplicate) for duplicate in duplicates] or None
         )
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -132,11 +394,19 @@ async def create_recipe(
 @app.get("/api/recipes/{recipe_id}", response_model=APIResponse)
 async def get_recipe(
     recipe_id: str,
+    request: Request,
     user_id: str = Depends(get_current_user_id)
 ):
-    """Получить конкретный рецепт"""
-    try:
-        recipe = get_recipe(recipe_id)
+    """Получить конкретный рецепт (с ETag, при совпадающем If-None-Match — 304)"""
+    async def check():
+        owner = await database.get_recipe_owner(recipe_id)
+        if owner is None:
+            raise HTTPException(status_code=404, detail="Recipe not found")
+        if owner != user_id:
+            raise HTTPException(status_code=403, detail="Access denied")
+
+    async def build():
+        recipe = await database.get_recipe(recipe_id)
         if not recipe:
             raise HTTPException(status_code=404, detail="Recipe not found")
         
@@ -146,7 +416,29 @@ async def get_recipe(
         return APIResponse(
             success=True,
             data=RecipeResponse(**recipe)
-        )
+        ).model_dump_json(exclude={"duplicates"}).encode(), {}
+
+    try:
+        return await response_cache.cached_response(request, user_id, build, check)
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/api/recipes/{recipe_id}/similar", response_model=List[SimilarRecipe])
+async def get_similar_recipes(
+    recipe_id: str,
+    limit: int = Query(10, ge=1, le=50),
+    user_id: str = Depends(get_current_user_id)
+):
+    """Похожие рецепты пользователя: по ингредиентам и названию, самые близкие первыми"""
+    try:
+        recipe = await database.get_recipe(recipe_id)
+        if not recipe or recipe.get("user_id") != user_id:
+            raise HTTPException(status_code=404, detail="Recipe not found")
+
+        from similarity import similar_recipes
+        return await similar_recipes(user_id, recipe, limit=limit)
     except HTTPException:
         raise
     except Exception as e:
@@ -160,14 +452,7 @@ async def update_recipe(
 ):
     """Обновить рецепт"""
     try:
-        # Сначала проверяем существование рецепта
-        existing_recipe = get_recipe(recipe_id)
-        if not existing_recipe:
-            raise HTTPException(status_code=404, detail="Recipe not found")
-        
-        if existing_recipe.get("user_id") != user_id:
-            raise HTTPException(status_code=403, detail="Access denied")
-        
+        # is_favorite не передаем: $set оставит текущее значение в документе
         recipe_data = {
             "title": recipe.title,
             "description": recipe.description,
@@ -179,11 +464,15 @@ async def update_recipe(
             "cuisine": recipe.cuisine,
             "tags": recipe.tags,
             "image_url": recipe.image_url,
-            "source_url": recipe.source_url,
-            "is_favorite": existing_recipe.get("is_favorite", False)
+            "source_url": recipe.source_url
         }
         
-        updated_recipe = update_recipe(recipe_id, recipe_data)
+        # Обновление с проверкой владельца за один запрос к базе.
+        # Чужой рецепт неотличим от несуществующего, поэтому в обоих случаях 404
+        updated_recipe = await database.update_recipe(recipe_id, user_id, recipe_data)
+        if not updated_recipe:
+            raise HTTPException(status_code=404, detail="Recipe not found")
+        response_cache.invalidate(user_id)
         
         return APIResponse(
             success=True,
@@ -202,17 +491,13 @@ async def delete_recipe(
 ):
     """Удалить рецепт"""
     try:
-        # Сначала проверяем существование рецепта
-        existing_recipe = get_recipe(recipe_id)
-        if not existing_recipe:
-            raise HTTPException(status_code=404, detail="Recipe not found")
-        
-        if existing_recipe.get("user_id") != user_id:
-            raise HTTPException(status_code=403, detail="Access denied")
-        
-        success = delete_recipe(recipe_id)
+        # Удаление с проверкой владельца за один запрос к базе
+        success = await database.delete_recipe(recipe_id, user_id)
         if not success:
-            raise HTTPException(status_code=500, detail="Failed to delete recipe")
+            raise HTTPException(status_code=404, detail="Recipe not found")
+        from similarity import forget
+        forget(user_id, recipe_id)
+        response_cache.invalidate(user_id)
         
         return {"message": "Recipe deleted successfully"}
     except HTTPException:
@@ -220,36 +505,43 @@ async def delete_recipe(
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
-@app.post("/api/extract-recipe", response_model=APIResponse)
+@app.post("/api/extract-recipe", response_model=Union[APIResponse, JobAPIResponse])
 async def extract_recipe(
     request: ExtractRecipeRequest,
+    response: Response,
     user_id: str = Depends(get_current_user_id)
 ):
-    """Извлечь рецепт из URL"""
+    """
+    Извлечь рецепт из URL.
+    В режиме async сразу возвращает задачу (202), статус — GET /api/jobs/{id}
+    """
     try:
         # Используем существующий сервис для извлечения рецепта
-        from ai_services import extract_recipe_from_url
+        from ai_services import extract_recipe_from_url, recipe_to_document
+        from media_processor import MediaProcessor, is_media_url
         
-        recipe_data = await extract_recipe_from_url(request.url)
+        media = is_media_url(request.url)
+        mode = request.mode or ("async" if media else "sync")
+        if mode == "async":
+            job = await jobs.enqueue(user_id, request.url)
+            response.status_code = 202
+            return JobAPIResponse(
+                success=True,
+                job=JobResponse(**job),
+                message="Recipe extraction queued"
+            )
         
-        # Создаем рецепт в базе данных
-        recipe = {
-            "user_id": user_id,
-            "title": recipe_data.get("title", "Extracted Recipe"),
-            "description": recipe_data.get("description", ""),
-            "ingredients": recipe_data.get("ingredients", []),
-            "instructions": recipe_data.get("instructions", []),
-            "cooking_time": recipe_data.get("cooking_time", 30),
-            "servings": recipe_data.get("servings", 2),
-            "difficulty": recipe_data.get("difficulty", "Easy"),
-            "cuisine": recipe_data.get("cuisine", "International"),
-            "tags": recipe_data.get("tags", []),
-            "image_url": recipe_data.get("image_url"),
-            "source_url": request.url,
-            "is_favorite": False
-        }
+        # Один и тот же URL (с точностью до трекинговых параметров)
+        # извлекается один раз, дальше рецепт берется из кэша
+        if media:
+            recipe_data = await MediaProcessor().process_url(request.url)
+        else:
+            recipe_data = await extraction_cache.get_or_extract(request.url, extract_recipe_from_url)
         
-        saved_recipe = save_recipe(recipe)
+        # Создаем рецепт в базе данных
+        saved_recipe = await database.save_recipe(
+            recipe_to_document(recipe_data, user_id, request.url)
+        )
         
         return APIResponse(
             success=True,
@@ -263,6 +555,40 @@ async def extract_recipe(
             detail=f"Failed to extract recipe: {str(e)}"
         )
 
+@app.post("/api/extract-recipes/batch")
+async def extract_recipes_batch(
+    request: BatchExtractRequest,
+    user_id: str = Depends(get_current_user_id)
+):
+    """
+    Извлечь рецепты из списка URL (закладки, доска Pinterest).
+    Ответ — NDJSON с событием на строку: duplicate, extracted/failed,
+    saved (после общего insert_many) и итоговое done со счетчиками.
+    Ошибка одного URL не прерывает пакет
+    """
+    async def generate():
+        async for event in batch_extract.run_batch(user_id, request.urls):
+            yield json.dumps(event, ensure_ascii=False) + "\n"
+
+    return StreamingResponse(generate(), media_type="application/x-ndjson")
+
+@app.get("/api/jobs/{job_id}", response_model=JobAPIResponse)
+async def get_job(
+    job_id: str,
+    user_id: str = Depends(get_current_user_id)
+):
+    """Получить статус и прогресс задачи извлечения"""
+    try:
+        job = await database.get_job(job_id, user_id)
+        if not job:
+            raise HTTPException(status_code=404, detail="Job not found")
+        
+        return JobAPIResponse(success=True, job=JobResponse(**job))
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
 @app.get("/api/health")
 async def health_check():
     """Проверка здоровья API"""
@@ -273,6 +599,11 @@ async def health_check():
         "database": "MongoDB"
     }
 
+@app.get("/api/metrics")
+async def get_metrics():
+    """Счетчики процесса: попадания в кэш извлечения и т.п."""
+    return metrics.snapshot()
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8000) 
\ No newline at end of file
@@ -1,12 +1,22 @@
-import yt_dlp
+import asyncio
+import copy
 import os
 import re
-from typing import Dict, Any, Optional
+import time
+from typing import Dict, Any, List, Optional, Tuple
 import tempfile
-from ai_services import transcribe_audio, extract_recipe_from_text
+from ai_services import extract_recipe_from_text, complete_structured_recipe
+from transcription import transcribe_audio
+from structured_data import is_complete
+from html_parser import parse_html_async
+from content_reducer import CONTENT_TOKEN_BUDGET, count_tokens, reduce_page, record_outcome
+import metrics
 from dotenv import load_dotenv
-import requests
-from moviepy.editor import VideoFileClip
+import extraction_cache
+from fetcher import fetch_json, fetch_text, FetchError
+from jobs import stage
+from audio import stream_audio_segments, fingerprint as audio_fingerprint
+import transcript_cache
 
 load_dotenv()
 
@@ -16,7 +26,7 @@ def extract_instagram_shortcode(url: str) -> str:
         raise Exception("Не удалось извлечь shortcode из URL")
     return match.group(1)
 
-def download_instagram_reel_by_shortcode(shortcode: str) -> dict:
+async def download_instagram_reel_by_shortcode(shortcode: str) -> dict:
     rapidapi_key = os.getenv("RAPIDAPI_KEY")
     rapidapi_host = os.getenv("RAPIDAPI_HOST")
     if not rapidapi_key or not rapidapi_host:
@@ -28,25 +38,253 @@ def download_instagram_reel_by_shortcode(shortcode: str) -> dict:
         "X-RapidAPI-Key": rapidapi_key,
         "X-RapidAPI-Host": rapidapi_host
     }
-    response = requests.get(url, headers=headers, params=querystring)
-    if response.status_code != 200:
-        raise Exception(f"Ошибка RapidAPI: {response.text}")
-    return response.json()
+    try:
+        return await fetch_json(url, headers=headers, params=querystring)
+    except FetchError as e:
+        raise Exception(f"Ошибка RapidAPI: {e}")
+
+# Языки субтитров в порядке предпочтения
+SUBTITLE_LANGUAGES = [lang.strip() for lang in os.getenv("SUBTITLE_LANGUAGES", "ru,en").split(",") if lang.strip()]
+SUBTITLE_FORMATS = ["vtt", "srt", "ttml", "srv3", "json3"]
+
+_QUANTITY_RE = re.compile(
+    r'\d+([.,/]\d+)?\s*(г|гр|кг|мл|л|шт|ст\.?\s?л|ч\.?\s?л|стакан\w*|зубч\w*|g|gr|kg|ml|l|pcs|cups?|tbsp|tsp|oz|lb)\b'
+    r'|по вкусу|щепотк\w*|to taste|pinch',
+    re.IGNORECASE
+)
+_STEP_RE = re.compile(r'^\s*(\d+[.)]|шаг\s*\d+|step\s*\d+)', re.IGNORECASE)
+_SUBTITLE_SKIP_RE = re.compile(r'^(WEBVTT|NOTE|STYLE|Kind:|Language:|\d+$|[\d:.,]+\s*-->)')
+_SUBTITLE_TAG_RE = re.compile(r'<[^>]+>')
+
+def caption_has_recipe(text: Optional[str]) -> bool:
+    """Проверяет, что в подписи к видео уже есть полный рецепт: ингредиенты с количествами и шаги."""
+    if not text:
+        return False
+    lines = [line for line in text.splitlines() if line.strip()]
+    ingredients = sum(1 for line in lines if _QUANTITY_RE.search(line))
+    steps = sum(1 for line in lines if _STEP_RE.match(line))
+    return ingredients >= 3 and steps >= 2
+
+def pick_subtitle(info: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """Выбирает субтитры из info yt-dlp: сначала ручные, затем автоматические, по языкам и форматам."""
+    for source in ("subtitles", "automatic_captions"):
+        tracks = info.get(source) or {}
+        languages = [lang for pref in SUBTITLE_LANGUAGES for lang in tracks if lang.split("-")[0] == pref]
+        for lang in languages + [lang for lang in tracks if lang not in languages]:
+            for ext in SUBTITLE_FORMATS:
+                for track in tracks[lang]:
+                    if track.get("ext") == ext and track.get("url"):
+                        return track
+    return None
+
+def subtitles_to_text(content: str) -> str:
+    """Убирает из VTT/SRT таймкоды, номера и теги, оставляя текст без повторов подряд."""
+    lines = []
+    for line in content.splitlines():
+        line = _SUBTITLE_TAG_RE.sub("", line).strip()
+        if not line or _SUBTITLE_SKIP_RE.match(line):
+            continue
+        # В автоматических субтитрах строки часто повторяются в соседних блоках
+        if not lines or lines[-1] != line:
+            lines.append(line)
+    return " ".join(lines)
+
+def _format_size(fmt: Dict[str, Any], duration: Optional[float]) -> float:
+    size = fmt.get("filesize") or fmt.get("filesize_approx")
+    if size:
+        return size
+    if fmt.get("tbr") and duration:
+        return fmt["tbr"] * 1000 / 8 * duration
+    return float("inf")
+
+def smallest_format(info: Dict[str, Any], audio_only: bool) -> Optional[Dict[str, Any]]:
+    """Самый легкий формат со звуком: только аудио (audio_only) или видео со звуком."""
+    candidates = []
+    for fmt in info.get("formats") or []:
+        if not fmt.get("url") or fmt.get("acodec") in (None, "none"):
+            continue
+        is_audio_only = fmt.get("vcodec") == "none"
+        if is_audio_only == audio_only:
+            candidates.append(fmt)
+    if not candidates:
+        return None
+    return min(candidates, key=lambda fmt: _format_size(fmt, info.get("duration")))
+
+def _record_tier(tier: str, started: float, bytes_downloaded: float) -> None:
+    """Пишет в метрики время и объем скачанных данных для стратегии."""
+    metrics.incr(f"media.{tier}.used")
+    metrics.observe(f"media.{tier}.seconds", time.perf_counter() - started)
+    if bytes_downloaded != float("inf"):
+        metrics.observe(f"media.{tier}.bytes", bytes_downloaded)
+
+def is_media_url(url: str) -> bool:
+    """Ссылка на видео (Instagram/TikTok), которое нужно скачивать и транскрибировать."""
+    return MediaProcessor().is_instagram_url(url) or "tiktok.com" in url
 
 class MediaProcessor:
     def is_instagram_url(self, url: str) -> bool:
         """Проверяет, является ли URL ссылкой на Instagram."""
         return bool(re.match(r'https?://(?:www\.)?instagram\.com/(?:p|reel)/[\w-]+/?', url))
 
+    async def transcribe_media(self, source: str, temp_dir: str,
+                               headers: Optional[Dict[str, str]] = None) -> str:
+        """
+        Декодирует звук из файла или URL сегментами через ffmpeg и транскрибирует
+        каждый сегмент сразу, как только он готов, не дожидаясь конца загрузки.
+        """
+        async def transcribe_segment(segment_path: str) -> str:
+            # Лимит этапа transcribe берет каждый сегмент, а не уже запущенная пачка
+            async with stage("transcribe"):
+                return await transcribe_audio(segment_path)
+
+        tasks = []
+        try:
+            async with stage("audio"):
+                async for segment_path in stream_audio_segments(source, temp_dir, headers):
+                    tasks.append(asyncio.create_task(transcribe_segment(segment_path)))
+            transcripts = await asyncio.gather(*tasks)
+        except BaseException:
+            for task in tasks:
+                task.cancel()
+            raise
+        return " ".join(t.strip() for t in transcripts if t and t.strip())
+
+    async def _text_from_media(self, description: Optional[str], cache_keys: List[Optional[str]],
+                               info: Optional[Dict[str, Any]] = None,
+                               video_urls: Optional[list] = None) -> Tuple[str, Optional[Dict[str, Any]]]:
+        """
+        Получает текст рецепта, перебирая стратегии от дешевой к дорогой:
+        подпись к видео, субтитры, самый легкий аудиопоток и только потом видео.
+        Перед транскрипцией снимает отпечаток звука и, если к ролику есть подпись,
+        ищет готовый транскрипт по паре «звук + подпись» (ключ добавляется
+        в cache_keys). Возвращает (текст, запись кэша или None)
+        """
+        # 1. Подпись уже содержит полный рецепт — ничего не скачиваем
+        started = time.perf_counter()
+        if caption_has_recipe(description):
+            _record_tier("caption", started, 0)
+            print("[LOG] Рецепт найден в подписи к видео")
+            return description, None
+
+        prefix = description + "\n" if description else ""
+
+        # 2. Субтитры или автоматические субтитры
+        subtitle = pick_subtitle(info) if info else None
+        if subtitle:
+            started = time.perf_counter()
+            try:
+                async with stage("fetch"):
+                    content = await fetch_text(subtitle["url"], headers=subtitle.get("http_headers"))
+                _record_tier("subtitles", started, len(content.encode()))
+                subtitle_text = subtitles_to_text(content)
+                if subtitle_text:
+                    print(f"[LOG] Используем субтитры ({subtitle.get('ext')})")
+                    return prefix + subtitle_text, None
+            except FetchError as e:
+                print(f"[ERROR] Не удалось скачать субтитры: {e}")
+
+        # 3-4. Транскрипция: сначала только аудиопоток, затем самое легкое видео
+        sources = []
+        if info:
+            sources.append(("audio", smallest_format(info, audio_only=True)))
+            sources.append(("video", smallest_format(info, audio_only=False)))
+        for video_url in video_urls or []:
+            sources.append(("video", {"url": video_url}))
+
+        last_error = None
+        # Основной ключ кэша — ID ролика (его уже проверили); отпечаток звука
+        # снимается один раз и только при наличии подписи, с которой он сверяется
+        fingerprint_checked = not description
+        for tier, fmt in sources:
+            if not fmt:
+                continue
+            if not fingerprint_checked:
+                fingerprint_checked = True
+                try:
+                    fingerprint = await audio_fingerprint(fmt["url"], fmt.get("http_headers"))
+                except Exception as e:
+                    print(f"[ERROR] Не удалось снять отпечаток аудио ({tier}): {e}")
+                    fingerprint = None
+                key = transcript_cache.fingerprint_key(fingerprint, description)
+                if key:
+                    cache_keys.append(key)
+                    cached = await transcript_cache.lookup([key])
+                    if cached:
+                        return prefix + (cached.get("transcript") or ""), cached
+
+            started = time.perf_counter()
+            print(f"[LOG] Извлекаем и транскрибируем аудио ({tier}): {fmt['url']}")
+            try:
+                with tempfile.TemporaryDirectory() as temp_dir:
+                    transcript = await self.transcribe_media(fmt["url"], temp_dir, fmt.get("http_headers"))
+            except Exception as e:
+                print(f"[ERROR] Ошибка при извлечении аудио ({tier}): {e}")
+                last_error = e
+                continue
+            _record_tier(tier, started, _format_size(fmt, (info or {}).get("duration")))
+            print(f"[LOG] Транскрипция: {transcript}")
+            return prefix + transcript, None
+
+        if last_error and not prefix:
+            raise Exception(f"Ошибка при извлечении аудио: {last_error}")
+        return prefix, None
+
+    async def _recipe_from_media(self, url: str, description: Optional[str], image_url: Optional[str],
+                                 cache_keys: List[Optional[str]], info: Optional[Dict[str, Any]] = None,
+                                 video_urls: Optional[list] = None) -> Dict[str, Any]:
+        """
+        Извлекает рецепт из ролика; если этот ролик (по ID или по звуку с подписью) уже
+        разбирали, транскрипция и GPT пропускаются
+        """
+        cached = await transcript_cache.lookup(cache_keys)
+        if not cached:
+            text_for_gpt, cached = await self._text_from_media(description, cache_keys, info, video_urls)
+        if cached:
+            print(f"[LOG] Рецепт найден в кэше транскриптов: {cached['_id']}")
+            # Привязываем к записи ключи, под которыми ролик еще не встречался
+            new_keys = [key for key in cache_keys if key and key != cached["_id"]]
+            await transcript_cache.save(new_keys, cached.get("transcript"), cached["recipe"])
+            recipe = copy.deepcopy(cached["recipe"])
+            recipe['description'] = description or ""
+            recipe['source_url'] = url
+            recipe['image_url'] = image_url or ""
+            return recipe
+        recipe = await self._recipe_from_text(text_for_gpt, url, description, image_url)
+        await transcript_cache.save(cache_keys, text_for_gpt, copy.deepcopy(recipe))
+        return recipe
+
+    async def _recipe_from_text(self, text_for_gpt: str, url: str, description: Optional[str],
+                                image_url: Optional[str]) -> Dict[str, Any]:
+        print(f"[LOG] Текст для GPT:\n{text_for_gpt}")
+        if not text_for_gpt.strip():
+            print("[ERROR] Нет текста для анализа (ни описания, ни аудио)")
+            raise Exception("Нет текста для анализа (ни описания, ни аудио)")
+        print(f"[LOG] Отправляем текст в GPT...")
+        async with stage("llm"):
+            recipe = await extract_recipe_from_text(text_for_gpt)
+        recipe['description'] = description or ""
+        recipe['source_url'] = url
+        recipe['image_url'] = image_url or ""
+        print(f"[LOG] Ответ от GPT: {recipe}")
+        return recipe
+
     async def process_instagram_url(self, url: str) -> Dict[str, Any]:
         """Обрабатывает URL Instagram и извлекает данные поста через RapidAPI."""
         try:
             print(f"[LOG] Получена ссылка: {url}")
             shortcode = extract_instagram_shortcode(url)
             print(f"[LOG] Извлечён shortcode: {shortcode}")
-            data = download_instagram_reel_by_shortcode(shortcode)
+            async with stage("fetch"):
+                data = await download_instagram_reel_by_shortcode(shortcode)
             print(f"[LOG] Данные с RapidAPI: {data}")
-            video_url = data.get("video_url") or data.get("video_versions", [{}])[0].get("url")
+            # Версии видео от самой легкой к самой тяжелой
+            versions = sorted(
+                (v for v in data.get("video_versions") or [] if v.get("url")),
+                key=lambda v: (v.get("width") or 0) * (v.get("height") or 0)
+            )
+            video_urls = [v["url"] for v in versions]
+            if data.get("video_url") and data["video_url"] not in video_urls:
+                video_urls.append(data["video_url"])
             # Получаем картинку (thumbnail)
             image_url = None
             if 'image_versions2' in data and 'candidates' in data['image_versions2']:
@@ -57,48 +295,12 @@ class MediaProcessor:
             if isinstance(description, dict):
                 description = description.get('text', '')
             print(f"[LOG] Описание: {description}")
-            if not video_url:
+            if not video_urls and not caption_has_recipe(description):
                 print("[ERROR] Не удалось получить ссылку на видео!")
                 raise Exception("Не удалось получить ссылку на видео!")
-            with tempfile.TemporaryDirectory() as temp_dir:
-                video_path = os.path.join(temp_dir, "video.mp4")
-                print(f"[LOG] Скачиваем видео по ссылке: {video_url}")
-                ydl_opts = {
-                    'format': 'best',
-                    'outtmpl': video_path,
-                    'quiet': True
-                }
-                with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-                    ydl.download([video_url])
-                print(f"[LOG] Видео скачано: {video_path}")
-                audio_path = os.path.join(temp_dir, "audio.wav")
-                print(f"[LOG] Извлекаем аудио из видео...")
-                try:
-                    clip = VideoFileClip(video_path)
-                    clip.audio.write_audiofile(audio_path, logger=None)
-                    print(f"[LOG] Аудио извлечено: {audio_path}")
-                except Exception as e:
-                    print(f"[ERROR] Ошибка при извлечении аудио: {e}")
-                    raise Exception(f"Ошибка при извлечении аудио: {e}")
-                print(f"[LOG] Транскрибируем аудио...")
-                transcript = await transcribe_audio(audio_path)
-                print(f"[LOG] Транскрипция: {transcript}")
-                text_for_gpt = ""
-                if description:
-                    text_for_gpt += description + "\n"
-                if transcript:
-                    text_for_gpt += transcript
-                print(f"[LOG] Текст для GPT:\n{text_for_gpt}")
-                if not text_for_gpt.strip():
-                    print("[ERROR] Нет текста для анализа (ни описания, ни аудио)")
-                    raise Exception("Нет текста для анализа (ни описания, ни аудио)")
-                print(f"[LOG] Отправляем текст в GPT...")
-                recipe = await extract_recipe_from_text(text_for_gpt)
-                recipe['description'] = description or ""
-                recipe['source_url'] = url
-                recipe['image_url'] = image_url or ""
-                print(f"[LOG] Ответ от GPT: {recipe}")
-                return recipe
+            cache_keys = [transcript_cache.media_key("instagram", data.get("pk") or data.get("id"))]
+            return await self._recipe_from_media(url, description, image_url, cache_keys,
+                                                 video_urls=video_urls)
         except Exception as e:
             print(f"[ERROR] Ошибка при обработке Instagram URL: {e}")
             raise Exception(f"Error extracting recipe: {e}")
@@ -108,49 +310,23 @@ class MediaProcessor:
         Обрабатывает TikTok видео и извлекает рецепт
         """
         try:
-            with tempfile.TemporaryDirectory() as temp_dir:
-                video_path = os.path.join(temp_dir, 'video.mp4')
-                ydl_opts = {
-                    'format': 'best',
-                    'outtmpl': video_path,
-                    'quiet': True,
-                    'writethumbnail': True,
-                    'writeinfojson': True
-                }
+            # yt-dlp импортируется ~0.3 с — только когда нужен (или при прогреве, см. prewarm.py)
+            import yt_dlp
+            ydl_opts = {
+                'quiet': True,
+                'skip_download': True
+            }
+            # Только метаданные: описание, субтитры и список форматов.
+            # Что и в каком объеме скачивать, решает _text_from_media
+            async with stage("download"):
                 with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-                    info = ydl.extract_info(url, download=True)
-                # Получаем thumbnail
-                image_url = info.get('thumbnail', "")
-                description = info.get('description', "")
-                print(f"[LOG] Описание TikTok: {description}")
-                audio_path = os.path.join(temp_dir, "audio.wav")
-                print(f"[LOG] Извлекаем аудио из видео TikTok...")
-                try:
-                    clip = VideoFileClip(video_path)
-                    clip.audio.write_audiofile(audio_path, logger=None)
-                    print(f"[LOG] Аудио TikTok извлечено: {audio_path}")
-                except Exception as e:
-                    print(f"[ERROR] Ошибка при извлечении аудио TikTok: {e}")
-                    raise Exception(f"Ошибка при извлечении аудио TikTok: {e}")
-                print(f"[LOG] Транскрибируем аудио TikTok...")
-                transcript = await transcribe_audio(audio_path)
-                print(f"[LOG] Транскрипция TikTok: {transcript}")
-                text_for_gpt = ""
-                if description:
-                    text_for_gpt += description + "\n"
-                if transcript:
-                    text_for_gpt += transcript
-                print(f"[LOG] Текст для GPT TikTok:\n{text_for_gpt}")
-                if not text_for_gpt.strip():
-                    print("[ERROR] Нет текста для анализа TikTok (ни описания, ни аудио)")
-                    raise Exception("Нет текста для анализа TikTok (ни описания, ни аудио)")
-                print(f"[LOG] Отправляем текст в GPT TikTok...")
-                recipe = await extract_recipe_from_text(text_for_gpt)
-                recipe['description'] = description or ""
-                recipe['source_url'] = url
-                recipe['image_url'] = image_url or ""
-                print(f"[LOG] Ответ от GPT TikTok: {recipe}")
-                return recipe
+                    info = await asyncio.to_thread(ydl.extract_info, url, download=False)
+            # Получаем thumbnail
+            image_url = info.get('thumbnail', "")
+            description = info.get('description', "")
+            print(f"[LOG] Описание TikTok: {description}")
+            cache_keys = [transcript_cache.media_key("tiktok", info.get("id"))]
+            return await self._recipe_from_media(url, description, image_url, cache_keys, info=info)
         except Exception as e:
             print(f"[ERROR] Ошибка при обработке TikTok: {e}")
             raise Exception(f"Error processing TikTok: {str(e)}")
@@ -160,69 +336,44 @@ class MediaProcessor:
         Обрабатывает веб-страницу и извлекает рецепт
         """
         try:
-            import requests
-            from bs4 import BeautifulSoup
             import json as pyjson
-            response = requests.get(url)
-            soup = BeautifulSoup(response.text, 'html.parser')
-            # Ищем og:image
-            image_url = ""
-            og_image = soup.find('meta', property='og:image')
-            if og_image and og_image.get('content'):
-                image_url = og_image['content']
-            else:
-                # fallback: ищем самое большое изображение
-                images = soup.find_all('img')
-                max_area = 0
-                for img in images:
-                    try:
-                        width = int(img.get('width', 0))
-                        height = int(img.get('height', 0))
-                        area = width * height
-                        if area > max_area and img.get('src'):
-                            image_url = img['src']
-                            max_area = area
-                    except Exception:
-                        continue
-            # 1. Пробуем найти JSON-LD с рецептом
+            async with stage("fetch"):
+                html_content = await fetch_text(url)
+            # Разбор HTML (og:image или самая большая картинка, разметка schema.org,
+            # блоки рецепта, текст) за один обход в пуле процессов
+            page = await parse_html_async(html_content)
+            image_url = page["image_url"] or ""
+            # 1. Пробуем разметку schema.org (JSON-LD / microdata).
+            # Полный рецепт из разметки сохраняем без обращения к GPT
             recipe_text = ""
-            for script in soup.find_all('script', type='application/ld+json'):
-                try:
-                    data = pyjson.loads(script.string)
-                    if isinstance(data, list):
-                        for entry in data:
-                            if entry.get('@type') == 'Recipe':
-                                recipe_text = pyjson.dumps(entry, ensure_ascii=False)
-                                break
-                    elif data.get('@type') == 'Recipe':
-                        recipe_text = pyjson.dumps(data, ensure_ascii=False)
-                        break
-                except Exception:
-                    continue
-            # 2. Если не нашли — ищем блоки с классами recipe, ingredients, instructions, steps
-            if not recipe_text:
-                keywords = ['recipe', 'ingredients', 'instruction', 'step']
-                found_blocks = []
-                for kw in keywords:
-                    found_blocks += soup.find_all(class_=lambda c: c and kw in c.lower())
-                texts = [b.get_text(separator=" ", strip=True) for b in found_blocks if b]
-                recipe_text = "\n".join(texts)
-            # 3. Если не нашли — ищем большие списки и параграфы подряд
-            if not recipe_text:
-                blocks = []
-                for tag in soup.find_all(['ul', 'ol', 'p']):
-                    text = tag.get_text(separator=" ", strip=True)
-                    if len(text) > 30:
-                        blocks.append(text)
-                recipe_text = "\n".join(blocks)
-            # 4. Если ничего не нашли — fallback: первые 1000 символов текста страницы
-            if not recipe_text:
-                recipe_text = soup.get_text(separator=" ", strip=True)[:1000]
+            structured = page["structured"]
+            if is_complete(structured):
+                metrics.incr("extraction.structured_data")
+                recipe = complete_structured_recipe(structured, url)
+                if not recipe.get('image_url'):
+                    recipe['image_url'] = image_url or ""
+                print(f"[LOG] Рецепт извлечён из разметки schema.org: {recipe['title']}")
+                return recipe
+            # 2. Частичная разметка плюс самые «рецептные» блоки страницы
+            # в пределах бюджета токенов
+            budget = CONTENT_TOKEN_BUDGET
+            if structured:
+                recipe_text = pyjson.dumps(structured, ensure_ascii=False)
+                budget = max(budget - await asyncio.to_thread(count_tokens, recipe_text), 0)
+            if budget:
+                reduced = await asyncio.to_thread(reduce_page, page, budget)
+                recipe_text = "\n".join(filter(None, [recipe_text, reduced]))
             print(f"[LOG] Извлечён текст рецепта для GPT: {recipe_text[:500]}...")
-            recipe = await extract_recipe_from_text(recipe_text)
+            metrics.incr("extraction.llm")
+            async with stage("llm"):
+                recipe = await extract_recipe_from_text(recipe_text)
+            record_outcome(recipe)
             recipe['description'] = recipe_text[:500] or ""
             recipe['source_url'] = url
             recipe['image_url'] = image_url or ""
+            # Поля, найденные в разметке, надежнее ответа модели
+            if structured:
+                recipe.update(structured)
             print(f"[LOG] Ответ от GPT Web: {recipe}")
             return recipe
         except Exception as e:
@@ -230,7 +381,10 @@ class MediaProcessor:
             raise Exception(f"Error processing web page: {str(e)}")
 
     async def process_url(self, url: str) -> Dict[str, Any]:
-        """Обрабатывает URL и возвращает данные рецепта."""
+        """Обрабатывает URL и возвращает данные рецепта (с кэшированием по URL)."""
+        return await extraction_cache.get_or_extract(url, self._process_url)
+
+    async def _process_url(self, url: str) -> Dict[str, Any]:
         if self.is_instagram_url(url):
             return await self.process_instagram_url(url)
         elif "tiktok.com" in url:
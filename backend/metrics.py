@@ -0,0 +1,34 @@
+from collections import defaultdict
+from typing import Dict, Any
+
+# Простые счетчики внутри процесса: сколько раз сработал кэш,
+# сколько токенов ушло в LLM и т.п. Отдаются через /api/metrics
+_counters = defaultdict(int)
+_observations = {}
+
+def incr(name: str, value: int = 1) -> None:
+    """
+    Увеличивает счетчик name на value
+    """
+    _counters[name] += value
+
+def observe(name: str, value: float) -> None:
+    """
+    Записывает измерение (время, байты, токены): количество, сумму и максимум
+    """
+    stats = _observations.setdefault(name, {"count": 0, "sum": 0.0, "max": 0.0})
+    stats["count"] += 1
+    stats["sum"] += value
+    stats["max"] = max(stats["max"], value)
+
+def snapshot() -> Dict[str, Any]:
+    """
+    Возвращает текущие значения всех счетчиков и измерений
+    """
+    observations = {}
+    for name, stats in _observations.items():
+        observations[name] = {
+            **stats,
+            "avg": stats["sum"] / stats["count"] if stats["count"] else 0.0
+        }
+    return {"counters": dict(_counters), "observations": observations}
@@ -0,0 +1,32 @@
+import asyncio
+import sys
+import time
+
+import database
+
+async def migrate(backfill: bool = False) -> None:
+    """
+    Одноразовая миграция перед запуском новой версии: индексы MongoDB и,
+    с --backfill, производные поля старых рецептов (ingredient_tokens, embedding)
+    """
+    from search import backfill_ingredient_tokens
+    from similarity import backfill_embeddings
+
+    database.connect()
+    try:
+        started = time.perf_counter()
+        await database.create_indexes()
+        print(f"[LOG] Индексы готовы за {time.perf_counter() - started:.1f} с")
+        if backfill:
+            print(f"[LOG] ingredient_tokens заполнены у рецептов: {await backfill_ingredient_tokens()}")
+            print(f"[LOG] Векторы посчитаны у рецептов: {await backfill_embeddings()}")
+    finally:
+        database.close()
+
+if __name__ == "__main__":
+    # python migrate.py [--backfill] — запускается один раз при деплое (release в Procfile)
+    try:
+        asyncio.run(migrate(backfill="--backfill" in sys.argv))
+    except Exception as e:
+        print(f"[ERROR] Миграция не удалась: {e}")
+        sys.exit(1)
@@ -0,0 +1,116 @@
+import asyncio
+import importlib
+import os
+import re
+import subprocess
+import sys
+import time
+from typing import List, Optional
+
+from dotenv import load_dotenv
+
+import metrics
+
+load_dotenv()
+
+# Прогревать ли тяжелые модули в фоне после старта (иначе — при первом использовании)
+PREWARM = os.getenv("PREWARM", "True").lower() == "true"
+# Пауза после старта, чтобы прогрев не конкурировал с первыми запросами
+PREWARM_DELAY = float(os.getenv("PREWARM_DELAY", 1))
+# Модули стека извлечения, которые API не импортирует при старте: numpy,
+# SDK OpenAI, BeautifulSoup, yt-dlp и модули, которые их используют
+HEAVY_MODULES = ["numpy", "openai", "bs4", "yt_dlp", "similarity", "ai_services", "media_processor"]
+# Бюджет импорта main (мс) для python prewarm.py check
+IMPORT_BUDGET_MS = float(os.getenv("IMPORT_BUDGET_MS", 1200))
+
+_task: Optional[asyncio.Task] = None
+
+async def _prewarm() -> None:
+    await asyncio.sleep(PREWARM_DELAY)
+    for name in HEAVY_MODULES:
+        if name in sys.modules:
+            continue
+        started = time.perf_counter()
+        try:
+            # Импорт в потоке: event loop продолжает обслуживать запросы
+            await asyncio.to_thread(importlib.import_module, name)
+        except ImportError as e:
+            print(f"[ERROR] Прогрев {name} не удался: {e}")
+            continue
+        metrics.observe(f"prewarm.{name}.seconds", time.perf_counter() - started)
+    # Словарь токенизатора читается с диска (а в первый раз скачивается) —
+    # тоже в потоке, чтобы первый запрос не ждал его в event loop
+    from content_reducer import load_encoding
+    await asyncio.to_thread(load_encoding)
+    try:
+        from llm_client import get_client
+        get_client()
+    except Exception as e:
+        # Без ключа API сервис рецептов работает, извлечение через LLM — нет
+        print(f"[ERROR] Клиент LLM не создан: {e}")
+
+async def start() -> None:
+    """
+    Запускает фоновый прогрев тяжелых модулей (при старте приложения)
+    """
+    global _task
+    if PREWARM and _task is None:
+        _task = asyncio.create_task(_prewarm())
+
+async def stop() -> None:
+    """
+    Останавливает прогрев, если он еще идет
+    """
+    global _task
+    if _task is not None:
+        _task.cancel()
+        await asyncio.gather(_task, return_exceptions=True)
+        _task = None
+
+def measure_import(module: str = "main") -> dict:
+    """
+    Импортирует module в отдельном процессе с python -X importtime.
+    Возвращает время импорта (мс) и список загруженных тяжелых модулей
+    """
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True, text=True, cwd=os.path.dirname(os.path.abspath(__file__))
+    )
+    if result.returncode:
+        raise RuntimeError(result.stderr.strip().splitlines()[-1] if result.stderr else "import failed")
+    # Строки вида "import time:   self [us] | cumulative | name"
+    loaded = {}
+    for line in result.stderr.splitlines():
+        match = re.match(r'import time:\s+\d+ \|\s+(\d+) \| (\s*)(\S+)', line)
+        if match:
+            loaded[match.group(3)] = int(match.group(1)) / 1000
+    return {
+        "milliseconds": loaded.get(module, 0.0),
+        "heavy": [name for name in HEAVY_MODULES if name in loaded],
+    }
+
+def check(runs: int = 3) -> List[str]:
+    """
+    Проверка холодного старта: main не должен импортировать тяжелые
+    модули и укладываться в IMPORT_BUDGET_MS (медиана из runs запусков)
+    """
+    measurements = [measure_import() for _ in range(runs)]
+    median = sorted(measurement["milliseconds"] for measurement in measurements)[runs // 2]
+    print(f"[LOG] Импорт main: {median:.0f} мс (бюджет {IMPORT_BUDGET_MS:.0f} мс)")
+    problems = []
+    if median > IMPORT_BUDGET_MS:
+        problems.append(f"import main takes {median:.0f} ms, budget is {IMPORT_BUDGET_MS:.0f} ms")
+    heavy = measurements[0]["heavy"]
+    if heavy:
+        problems.append(f"import main loads heavy modules: {', '.join(heavy)}")
+    return problems
+
+if __name__ == "__main__":
+    # python prewarm.py check — регрессия времени старта (для CI)
+    if len(sys.argv) > 1 and sys.argv[1] == "check":
+        problems = check()
+        for problem in problems:
+            print(f"[ERROR] {problem}")
+        sys.exit(1 if problems else 0)
+    print("Использование: python prewarm.py check")
+    sys.exit(1)
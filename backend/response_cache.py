@@ -0,0 +1,95 @@
+import hashlib
+import os
+from collections import OrderedDict
+from typing import Awaitable, Callable, Dict, Optional, Tuple
+
+from fastapi import Request, Response
+
+import database
+import metrics
+
+# Сколько байт тел ответов держать в памяти процесса: список рецептов
+# может весить сотни килобайт, карточка — единицы, поэтому лимит в байтах
+RESPONSE_CACHE_MAX_BYTES = int(os.getenv("RESPONSE_CACHE_MAX_BYTES", 64 * 2 ** 20))
+
+# (user_id, ключ запроса) -> (ETag, тело, заголовки)
+_cache: "OrderedDict[Tuple[str, str], Tuple[str, bytes, Dict[str, str]]]" = OrderedDict()
+_cache_bytes = 0
+
+def make_etag(user_id: str, key: str, version: int) -> str:
+    """
+    Сильный ETag ответа: версия коллекции рецептов пользователя + запрос.
+    Любая запись рецептов пользователя увеличивает версию и меняет ETag
+    """
+    digest = hashlib.sha1(f"{user_id}|{key}".encode()).hexdigest()[:16]
+    return f'"{version}-{digest}"'
+
+def _matches(request: Request, etag: str) -> bool:
+    # If-None-Match сравнивается слабо (RFC 9110): W/"x" совпадает с "x";
+    # прокси, сжимающие ответ, помечают ETag как слабый
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    for tag in header.split(","):
+        tag = tag.strip()
+        # «*» не принимается: для GET он ответил бы 304 без проверки,
+        # что ресурс существует
+        if tag.removeprefix("W/") == etag:
+            return True
+    return False
+
+def _remove(key: Tuple[str, str]) -> None:
+    global _cache_bytes
+    _cache_bytes -= len(_cache.pop(key)[1])
+
+def invalidate(user_id: str) -> None:
+    """
+    Удаляет из кэша ответы пользователя (после записи его рецептов)
+    """
+    for key in [key for key in _cache if key[0] == user_id]:
+        _remove(key)
+
+def _store(key: Tuple[str, str], entry: Tuple[str, bytes, Dict[str, str]]) -> None:
+    global _cache_bytes
+    if key in _cache:
+        _remove(key)
+    # Ответ больше всего кэша не вытесняет остальные — просто не кэшируется
+    if len(entry[1]) > RESPONSE_CACHE_MAX_BYTES:
+        return
+    _cache[key] = entry
+    _cache_bytes += len(entry[1])
+    while _cache_bytes > RESPONSE_CACHE_MAX_BYTES:
+        _remove(next(iter(_cache)))
+
+async def cached_response(request: Request, user_id: str,
+                          build: Callable[[], Awaitable[Tuple[bytes, Dict[str, str]]]],
+                          check: Optional[Callable[[], Awaitable[None]]] = None) -> Response:
+    """
+    Отдает ответ GET-запроса с ETag. Если клиент прислал совпадающий
+    If-None-Match — 304 без чтения рецептов (нужна только версия коллекции).
+    Иначе тело берется из кэша или строится через build() и кэшируется.
+    Для одного ресурса check() проверяет существование и доступ до ответа
+    304 (бросает HTTPException): ETag включает путь с его ID, но версия
+    коллекции не говорит, есть ли такой ресурс у пользователя
+    """
+    key = f"{request.url.path}?{request.url.query}"
+    version = await database.get_recipe_version(user_id)
+    etag = make_etag(user_id, key, version)
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+
+    if _matches(request, etag):
+        if check is not None:
+            await check()
+        metrics.incr("response_cache.not_modified")
+        return Response(status_code=304, headers=headers)
+
+    entry: Optional[Tuple[str, bytes, Dict[str, str]]] = _cache.get((user_id, key))
+    if entry and entry[0] == etag:
+        metrics.incr("response_cache.hits")
+        _cache.move_to_end((user_id, key))
+        body, extra_headers = entry[1], entry[2]
+    else:
+        metrics.incr("response_cache.misses")
+        body, extra_headers = await build()
+        _store((user_id, key), (etag, body, extra_headers))
+    return Response(content=body, media_type="application/json", headers={**headers, **extra_headers})
@@ -1,13 +1,37 @@
-import uvicorn
+import importlib.util
 import os
+
+import uvicorn
 from dotenv import load_dotenv
 
 load_dotenv()
 
+HOST = os.getenv("HOST", "0.0.0.0")
+PORT = int(os.getenv("PORT", 8000))
+# Режим разработки: один процесс с перезагрузкой при изменении кода
+DEBUG = os.getenv("DEBUG", "False").lower() == "true"
+# Число воркеров; по умолчанию — по одному на ядро. Очередь задач, кэши
+# и пулы соединений у каждого воркера свои (JOB_WORKERS — на воркер)
+WEB_CONCURRENCY = int(os.getenv("WEB_CONCURRENCY") or 0) or os.cpu_count() or 1
+
+def server_options(workers: int = WEB_CONCURRENCY) -> dict:
+    """
+    Параметры uvicorn: uvloop и httptools, если установлены
+    """
+    return {
+        "host": HOST,
+        "port": PORT,
+        "workers": workers,
+        "loop": "uvloop" if importlib.util.find_spec("uvloop") else "asyncio",
+        "http": "httptools" if importlib.util.find_spec("httptools") else "h11",
+        "proxy_headers": True,
+        "forwarded_allow_ips": os.getenv("FORWARDED_ALLOW_IPS", "127.0.0.1"),
+        "timeout_keep_alive": int(os.getenv("KEEP_ALIVE_TIMEOUT", 5)),
+        "access_log": os.getenv("ACCESS_LOG", "False").lower() == "true",
+    }
+
 if __name__ == "__main__":
-    uvicorn.run(
-        "main:app",
-        host=os.getenv("HOST", "0.0.0.0"),
-        port=int(os.getenv("PORT", 8000)),
-        reload=os.getenv("DEBUG", "True").lower() == "true"
-    ) 
\ No newline at end of file
+    if DEBUG:
+        uvicorn.run("main:app", host=HOST, port=PORT, reload=True)
+    else:
+        uvicorn.run("main:app", **server_options())
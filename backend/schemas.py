@@ -0,0 +1,17 @@
+from typing import List, Optional
+
+from pydantic import BaseModel
+
+# Общие схемы рецепта: API (main.py) и ответ LLM (llm_output.py)
+class RecipeCreate(BaseModel):
+    title: str
+    description: str
+    ingredients: List[str]
+    instructions: List[str]
+    cooking_time: int
+    servings: int
+    difficulty: str
+    cuisine: str
+    tags: List[str]
+    image_url: Optional[str] = None
+    source_url: Optional[str] = None
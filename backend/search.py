@@ -0,0 +1,150 @@
+import asyncio
+import re
+import sys
+from typing import Dict, Any, List, Optional
+
+# Слова в строке ингредиента, которые не описывают сам продукт
+_STOPWORDS = {
+    "г", "гр", "кг", "мл", "л", "шт", "ст", "ч", "стакан", "стакана", "стаканов", "ложка", "ложки",
+    "ложек", "столовая", "столовые", "столовых", "чайная", "чайные", "чайных", "щепотка", "щепотки",
+    "по", "вкусу", "для", "и", "или", "на", "с", "в", "из", "без", "зубчик", "зубчика", "зубчиков",
+    "g", "kg", "ml", "l", "cup", "cups", "tbsp", "tsp", "oz", "lb", "of", "to", "taste", "and", "or",
+    "pinch", "for", "a", "the",
+}
+# Окончания, которые отбрасываются, чтобы «курица», «курицы» и «курицей» совпадали
+_ENDINGS = sorted([
+    "ами", "ями", "ого", "его", "ому", "ему", "ыми", "ими", "ой", "ей", "ий", "ый", "ая", "яя",
+    "ое", "ее", "ам", "ям", "ах", "ях", "ом", "ем", "ы", "и", "а", "я", "о", "е", "у", "ю", "ь",
+    "es", "s",
+], key=len, reverse=True)
+_WORD_RE = re.compile(r'[^\W\d_]+')
+
+# Группы продуктов для фильтров вроде «без молочного»: имя группы -> продукты
+INGREDIENT_GROUPS = {
+    "dairy": ["молоко", "сливки", "сыр", "творог", "сметана", "йогурт", "кефир", "сливочное",
+              "ряженка", "моцарелла", "пармезан", "фета", "маскарпоне", "milk", "cream", "cheese",
+              "butter", "yogurt"],
+    "meat": ["говядина", "свинина", "баранина", "телятина", "фарш", "бекон", "колбаса", "ветчина",
+             "beef", "pork", "lamb", "bacon", "ham"],
+    "poultry": ["курица", "куриный", "индейка", "утка", "chicken", "turkey", "duck"],
+    "fish": ["рыба", "лосось", "семга", "тунец", "треска", "форель", "креветки", "кальмар",
+             "fish", "salmon", "tuna", "cod", "shrimp"],
+    "gluten": ["мука", "макароны", "спагетти", "хлеб", "булгур", "кускус", "панировочные",
+               "flour", "pasta", "bread"],
+    "eggs": ["яйцо", "яйца", "желток", "egg", "eggs"],
+    "nuts": ["орехи", "грецкий", "миндаль", "фундук", "кешью", "арахис", "nuts", "almond", "peanut"],
+}
+# Синонимы имен групп на русском
+_GROUP_ALIASES = {
+    "молочное": "dairy", "молочные": "dairy", "мясо": "meat", "птица": "poultry", "рыба": "fish",
+    "глютен": "gluten", "яйца": "eggs", "орехи": "nuts",
+}
+
+# Существительное и прилагательное от него дают разные основы («курица» — «куриное филе»)
+_RELATED_WORDS = [
+    ["курица", "куриный"], ["говядина", "говяжий"], ["свинина", "свиной"],
+    ["яйцо", "яичный"], ["рыба", "рыбный"], ["грибы", "грибной"],
+]
+
+# Границы корзин времени приготовления (минуты) для фасета cooking_time
+COOKING_TIME_BUCKETS = [0, 15, 30, 60, 120]
+
+def normalize_token(word: str) -> str:
+    """
+    Приводит слово к грубой основе: нижний регистр, ё -> е, без окончания
+    """
+    word = word.lower().replace("ё", "е")
+    for ending in _ENDINGS:
+        if word.endswith(ending) and len(word) - len(ending) >= 3:
+            return word[:-len(ending)]
+    return word
+
+def tokenize(text: str) -> List[str]:
+    """Основы значимых слов текста (без чисел, единиц и служебных слов)"""
+    return [
+        normalize_token(word) for word in _WORD_RE.findall(text)
+        if word.lower() not in _STOPWORDS and len(word) > 1
+    ]
+
+def ingredient_tokens(ingredients: List[str]) -> List[str]:
+    """
+    Нормализованные токены ингредиентов рецепта для поиска
+    «с курицей, без молочного»; хранятся в поле ingredient_tokens
+    """
+    tokens = set()
+    for ingredient in ingredients or []:
+        tokens.update(tokenize(ingredient))
+    return sorted(tokens)
+
+_GROUP_TOKENS = {name: sorted({normalize_token(word) for word in words}) for name, words in INGREDIENT_GROUPS.items()}
+
+_VARIANTS = {
+    stem: stems
+    for stems in (sorted({normalize_token(word) for word in words}) for words in _RELATED_WORDS)
+    for stem in stems
+}
+
+def _ingredient_condition(phrase: str) -> Optional[Dict[str, Any]]:
+    key = phrase.strip().lower()
+    group = _GROUP_TOKENS.get(_GROUP_ALIASES.get(key, key))
+    if group:
+        return {"ingredient_tokens": {"$in": group}}
+    tokens = tokenize(phrase)
+    if not tokens:
+        return None
+    conditions = [
+        {"ingredient_tokens": {"$in": _VARIANTS[token]}} if token in _VARIANTS else {"ingredient_tokens": token}
+        for token in tokens
+    ]
+    return conditions[0] if len(conditions) == 1 else {"$and": conditions}
+
+def build_search_filter(user_id: str, query: Optional[str] = None, include: List[str] = None,
+                        exclude: List[str] = None, cuisine: Optional[str] = None,
+                        difficulty: Optional[str] = None, max_time: Optional[int] = None) -> Dict[str, Any]:
+    """
+    Фильтр MongoDB для поиска: полнотекстовый запрос, обязательные и
+    исключенные ингредиенты (или группы: dairy, meat, ...), кухня,
+    сложность и максимальное время
+    """
+    match: Dict[str, Any] = {"user_id": user_id}
+    if query:
+        match["$text"] = {"$search": query}
+    required = [condition for condition in map(_ingredient_condition, include or []) if condition]
+    if required:
+        match["$and"] = required
+    excluded = [condition for condition in map(_ingredient_condition, exclude or []) if condition]
+    if excluded:
+        match["$nor"] = excluded
+    if cuisine:
+        match["cuisine"] = cuisine
+    if difficulty:
+        match["difficulty"] = difficulty
+    if max_time:
+        match["cooking_time"] = {"$lte": max_time}
+    return match
+
+async def backfill_ingredient_tokens(batch_size: int = 500) -> int:
+    """
+    Заполняет ingredient_tokens у рецептов, сохраненных до появления поиска
+    """
+    import database
+
+    database.connect()
+    updated = 0
+    updates = []
+    async for recipe in database.iter_recipes_without_tokens(batch_size):
+        updates.append((recipe["id"], {"ingredient_tokens": ingredient_tokens(recipe.get("ingredients"))}))
+        if len(updates) >= batch_size:
+            updated += await database.bulk_update_recipes(updates)
+            updates = []
+    if updates:
+        updated += await database.bulk_update_recipes(updates)
+    return updated
+
+if __name__ == "__main__":
+    # python search.py backfill — заполнить ingredient_tokens у старых рецептов
+    if sys.argv[1:2] == ["backfill"]:
+        print(f"Обновлено рецептов: {asyncio.run(backfill_ingredient_tokens())}")
+    else:
+        print("Использование: python search.py backfill")
+        sys.exit(1)
@@ -0,0 +1,311 @@
+import asyncio
+import os
+import sys
+import time
+import zlib
+from collections import OrderedDict
+from datetime import timedelta
+from typing import Dict, Any, List, Optional, Tuple
+
+import numpy as np
+from dotenv import load_dotenv
+
+import metrics
+from search import ingredient_tokens, tokenize
+
+load_dotenv()
+
+# Размерность хэширующего векторизатора; векторы хранятся как int8 (1 байт на измерение)
+EMBEDDING_DIM = int(os.getenv("EMBEDDING_DIM", 256))
+# Косинусная близость, начиная с которой рецепт считается возможным дубликатом
+DUPLICATE_THRESHOLD = float(os.getenv("DUPLICATE_THRESHOLD", 0.7))
+# С какого числа рецептов пользователя поиск идет по IVF-индексу, а не перебором
+SIMILAR_IVF_MIN = int(os.getenv("SIMILAR_IVF_MIN", 20000))
+# Сколько ближайших кластеров IVF просматривать при поиске
+SIMILAR_IVF_PROBES = int(os.getenv("SIMILAR_IVF_PROBES", 48))
+# Сколько пользовательских индексов держать в памяти процесса
+SIMILAR_MAX_USERS = int(os.getenv("SIMILAR_MAX_USERS", 1000))
+# Сколько секунд до прошлой синхронизации перечитывать: updated_at ставит
+# записывающий воркер до записи, и запись, которая шла во время синхронизации,
+# ложится в базу со временем раньше уже прочитанного
+SIMILAR_SYNC_OVERLAP = float(os.getenv("SIMILAR_SYNC_OVERLAP", 300))
+
+_SCALE = 127
+_CHUNK_ROWS = 16384
+_TITLE_WEIGHT = 1.0
+_TRIGRAM_WEIGHT = 0.25
+
+def _feature(name: str, weight: float, vector: np.ndarray) -> None:
+    # crc32 стабилен между процессами (в отличие от hash), векторы лежат в базе
+    code = zlib.crc32(name.encode())
+    vector[code % EMBEDDING_DIM] += weight if code & 0x80000000 else -weight
+
+def embed(title: str, ingredients: List[str]) -> bytes:
+    """
+    Вектор рецепта для поиска похожих: хэширование нормализованных
+    ингредиентов, слов названия и триграмм названия (устойчивы к опечаткам
+    и разным окончаниям). Возвращает L2-нормированный вектор в int8
+    """
+    vector = np.zeros(EMBEDDING_DIM, dtype=np.float32)
+    for token in ingredient_tokens(ingredients):
+        _feature("i:" + token, 1.0, vector)
+    title_tokens = tokenize(title or "")
+    for token in title_tokens:
+        _feature("t:" + token, _TITLE_WEIGHT, vector)
+    for token in title_tokens:
+        padded = f" {token} "
+        for start in range(len(padded) - 2):
+            _feature("g:" + padded[start:start + 3], _TRIGRAM_WEIGHT, vector)
+    norm = np.linalg.norm(vector)
+    if norm:
+        vector /= norm
+    return np.round(vector * _SCALE).astype(np.int8).tobytes()
+
+def _to_array(embedding: bytes) -> np.ndarray:
+    return np.frombuffer(embedding, dtype=np.int8).astype(np.float32) / _SCALE
+
+def _kmeans(vectors: np.ndarray, iterations: int = 8, seed: int = 0) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    k-means на сферических векторах (k = sqrt(n)) по выборке, затем
+    назначение каждого вектора ближайшему центроиду. Возвращает
+    (центроиды, номер кластера каждого вектора); индекс не трогает
+    """
+    count = len(vectors)
+    clusters = max(1, int(np.sqrt(count)))
+    rng = np.random.default_rng(seed)
+    sample = vectors[rng.choice(count, size=min(count, clusters * 40), replace=False)].astype(np.float32) / _SCALE
+    centroids = sample[rng.choice(len(sample), size=clusters, replace=False)]
+    for _ in range(iterations):
+        assigned = np.argmax(sample @ centroids.T, axis=1)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assigned, sample)
+        norms = np.linalg.norm(sums, axis=1, keepdims=True)
+        # Пустой кластер сохраняет прежний центроид
+        centroids = np.where(norms > 0, sums / np.maximum(norms, 1e-9), centroids)
+    centroids = centroids.astype(np.float32)
+    lists = np.zeros(count, dtype=np.int32)
+    for start in range(0, count, _CHUNK_ROWS):
+        chunk = vectors[start:start + _CHUNK_ROWS].astype(np.float32) / _SCALE
+        lists[start:start + len(chunk)] = np.argmax(chunk @ centroids.T, axis=1)
+    return centroids, lists
+
+class VectorIndex:
+    """
+    Векторы рецептов одного пользователя: матрица int8, которая растет
+    удвоением, и IVF-разбиение на кластеры, когда рецептов становится
+    больше SIMILAR_IVF_MIN. Вставка, замена и удаление — инкрементальные
+    """
+    def __init__(self, dim: int = EMBEDDING_DIM, ivf_min: int = SIMILAR_IVF_MIN,
+                 probes: int = SIMILAR_IVF_PROBES):
+        self.dim = dim
+        self.ivf_min = ivf_min
+        self.probes = probes
+        self.vectors = np.zeros((64, dim), dtype=np.int8)
+        self.lists = np.zeros(64, dtype=np.int32)
+        self.ids: List[str] = []
+        self.rows: Dict[str, int] = {}
+        self.centroids: Optional[np.ndarray] = None
+        self.trained_size = 0
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def add(self, recipe_id: str, embedding: bytes) -> None:
+        vector = np.frombuffer(embedding, dtype=np.int8)
+        row = self.rows.get(recipe_id)
+        if row is None:
+            row = len(self.ids)
+            if row == len(self.vectors):
+                self.vectors = np.concatenate([self.vectors, np.zeros_like(self.vectors)])
+                self.lists = np.concatenate([self.lists, np.zeros_like(self.lists)])
+            self.ids.append(recipe_id)
+            self.rows[recipe_id] = row
+        self.vectors[row] = vector
+        if self.centroids is not None:
+            self.lists[row] = int(np.argmax(self.centroids @ (vector.astype(np.float32) / _SCALE)))
+
+    def needs_training(self) -> bool:
+        """
+        Кластеры (пере)обучаются, когда индекс вырос вдвое с прошлого обучения
+        """
+        return len(self.ids) >= max(self.ivf_min, 2 * self.trained_size)
+
+    def remove(self, recipe_id: str) -> None:
+        row = self.rows.pop(recipe_id, None)
+        if row is None:
+            return
+        last = len(self.ids) - 1
+        if row != last:
+            moved = self.ids[last]
+            self.ids[row] = moved
+            self.rows[moved] = row
+            self.vectors[row] = self.vectors[last]
+            self.lists[row] = self.lists[last]
+        self.ids.pop()
+
+    def train(self, iterations: int = 8, seed: int = 0) -> None:
+        """
+        Обучает IVF-разбиение в текущем потоке
+        """
+        ids = list(self.ids)
+        self._apply_training(ids, *_kmeans(self.vectors[:len(ids)], iterations, seed))
+
+    async def train_async(self) -> None:
+        """
+        Обучает IVF-разбиение в потоке по копии векторов: k-means на десятках
+        тысяч рецептов занимает секунды CPU. Пока он идет, рецепты могут
+        удаляться из индекса (строки переставляются), поэтому кластеры
+        применяются по id рецепта
+        """
+        ids = list(self.ids)
+        vectors = self.vectors[:len(ids)].copy()
+        self._apply_training(ids, *await asyncio.to_thread(_kmeans, vectors))
+
+    def _apply_training(self, ids: List[str], centroids: np.ndarray, lists: np.ndarray) -> None:
+        clusters = dict(zip(ids, lists.tolist()))
+        self.centroids = centroids
+        for row, recipe_id in enumerate(self.ids):
+            cluster = clusters.get(recipe_id)
+            if cluster is None:
+                cluster = int(np.argmax(centroids @ self._floats(np.array([row]))[0]))
+            self.lists[row] = cluster
+        self.trained_size = len(ids)
+
+    def _floats(self, rows: np.ndarray) -> np.ndarray:
+        return self.vectors[rows].astype(np.float32) / _SCALE
+
+    def search(self, embedding: bytes, limit: int = 10, exclude: Optional[str] = None,
+               exact: bool = False) -> List[Tuple[str, float]]:
+        """
+        Ближайшие рецепты по косинусной близости: [(id, score)], лучшие первыми
+        """
+        count = len(self.ids)
+        if not count:
+            return []
+        query = _to_array(embedding)
+        if self.centroids is not None and not exact:
+            probes = np.argsort(self.centroids @ query)[-self.probes:]
+            candidates = np.flatnonzero(np.isin(self.lists[:count], probes))
+        else:
+            candidates = np.arange(count)
+        # Перевод int8 -> float32 кусками, чтобы не копировать всю матрицу разом
+        scores = np.concatenate([
+            self._floats(candidates[start:start + _CHUNK_ROWS]) @ query
+            for start in range(0, len(candidates), _CHUNK_ROWS)
+        ]) if len(candidates) else np.zeros(0, dtype=np.float32)
+        take = min(limit + 1, len(scores))
+        top = np.argpartition(-scores, take - 1)[:take] if take else []
+        results = sorted(
+            ((self.ids[candidates[i]], float(scores[i])) for i in top),
+            key=lambda item: -item[1]
+        )
+        return [(recipe_id, score) for recipe_id, score in results if recipe_id != exclude][:limit]
+
+# Индексы пользователей (LRU) и момент последней синхронизации с базой
+_indexes: "OrderedDict[str, Tuple[VectorIndex, Any]]" = OrderedDict()
+_locks: Dict[str, asyncio.Lock] = {}
+
+async def get_index(user_id: str) -> VectorIndex:
+    """
+    Индекс пользователя: при первом обращении строится из базы, дальше
+    догружаются только векторы рецептов, измененных после прошлой
+    синхронизации (их могли сохранить задачи, пакетное извлечение или
+    другой воркер), с перекрытием SIMILAR_SYNC_OVERLAP секунд
+    """
+    import database
+
+    lock = _locks.setdefault(user_id, asyncio.Lock())
+    async with lock:
+        index, synced_at = _indexes.pop(user_id, (None, None))
+        if index is None:
+            index = VectorIndex()
+            metrics.incr("similar.index_loads")
+        started = time.perf_counter()
+        since = synced_at - timedelta(seconds=SIMILAR_SYNC_OVERLAP) if synced_at else None
+        # Повторно прочитанные рецепты окна перекрытия просто перезаписываются
+        async for recipe_id, embedding, updated_at in database.iter_embeddings(user_id, since=since):
+            index.add(recipe_id, embedding)
+            synced_at = max(synced_at, updated_at) if synced_at else updated_at
+        if index.needs_training():
+            await index.train_async()
+        metrics.observe("similar.sync_seconds", time.perf_counter() - started)
+        _indexes[user_id] = (index, synced_at)
+        while len(_indexes) > SIMILAR_MAX_USERS:
+            evicted, _ = _indexes.popitem(last=False)
+            _locks.pop(evicted, None)
+        return index
+
+def forget(user_id: str, recipe_id: str) -> None:
+    """
+    Удаляет рецепт из индекса пользователя (если индекс загружен)
+    """
+    entry = _indexes.get(user_id)
+    if entry:
+        entry[0].remove(recipe_id)
+
+async def _resolve(user_id: str, index: VectorIndex, matches: List[Tuple[str, float]],
+                   summary: bool) -> List[Dict[str, Any]]:
+    import database
+
+    found = await database.get_recipes_by_ids([recipe_id for recipe_id, _ in matches], user_id, summary)
+    results = []
+    for recipe_id, score in matches:
+        recipe = found.get(recipe_id)
+        if recipe is None:
+            # Рецепт удалили в другом воркере — убираем его и из нашего индекса
+            index.remove(recipe_id)
+            continue
+        results.append({**recipe, "score": round(score, 4)})
+    return results
+
+async def similar_recipes(user_id: str, recipe: Dict[str, Any], limit: int = 10,
+                          summary: bool = True) -> List[Dict[str, Any]]:
+    """
+    Похожие рецепты пользователя (без самого рецепта), лучшие первыми
+    """
+    index = await get_index(user_id)
+    embedding = recipe.get("embedding") or embed(recipe.get("title"), recipe.get("ingredients"))
+    started = time.perf_counter()
+    matches = index.search(embedding, limit, exclude=recipe.get("id"))
+    metrics.observe("similar.search_seconds", time.perf_counter() - started)
+    return await _resolve(user_id, index, matches, summary)
+
+async def find_duplicates(user_id: str, title: str, ingredients: List[str],
+                          limit: int = 3) -> List[Dict[str, Any]]:
+    """
+    Рецепты пользователя, почти совпадающие с новым (близость не ниже
+    DUPLICATE_THRESHOLD) — для предупреждения при создании
+    """
+    index = await get_index(user_id)
+    matches = [
+        (recipe_id, score) for recipe_id, score in index.search(embed(title, ingredients), limit)
+        if score >= DUPLICATE_THRESHOLD
+    ]
+    metrics.observe("similar.duplicate_rate", 1 if matches else 0)
+    return await _resolve(user_id, index, matches, summary=True) if matches else []
+
+async def backfill_embeddings(batch_size: int = 500) -> int:
+    """
+    Считает векторы для рецептов, сохраненных до появления поиска похожих
+    """
+    import database
+
+    database.connect()
+    updated = 0
+    updates = []
+    async for recipe in database.iter_recipes_without_embedding(batch_size):
+        updates.append((recipe["id"], {"embedding": embed(recipe.get("title"), recipe.get("ingredients"))}))
+        if len(updates) >= batch_size:
+            updated += await database.bulk_update_recipes(updates)
+            updates = []
+    if updates:
+        updated += await database.bulk_update_recipes(updates)
+    return updated
+
+if __name__ == "__main__":
+    # python similarity.py backfill — посчитать векторы для старых рецептов
+    if sys.argv[1:2] == ["backfill"]:
+        print(f"Обновлено рецептов: {asyncio.run(backfill_embeddings())}")
+    else:
+        print("Использование: python similarity.py backfill")
+        sys.exit(1)
@@ -0,0 +1,216 @@
+import html
+import json
+import re
+from typing import Dict, Any, List, Optional
+
+# Поля, без которых рецепт из разметки нельзя сохранить без помощи LLM
+REQUIRED_FIELDS = ["title", "ingredients", "instructions"]
+
+_DURATION_RE = re.compile(
+    r'^P(?:(?P<days>\d+(?:\.\d+)?)D)?'
+    r'(?:T(?:(?P<hours>\d+(?:\.\d+)?)H)?(?:(?P<minutes>\d+(?:\.\d+)?)M)?(?:(?P<seconds>\d+(?:\.\d+)?)S)?)?$',
+    re.IGNORECASE
+)
+_TAG_RE = re.compile(r'<[^>]+>')
+
+def parse_iso_duration(value: Any) -> Optional[int]:
+    """
+    Переводит ISO-8601 длительность (PT1H30M, P0DT45M) в минуты
+    """
+    if not isinstance(value, str):
+        return None
+    match = _DURATION_RE.match(value.strip())
+    if not match or not any(match.groupdict().values()):
+        return None
+    parts = {key: float(val) if val else 0.0 for key, val in match.groupdict().items()}
+    minutes = parts["days"] * 1440 + parts["hours"] * 60 + parts["minutes"] + parts["seconds"] / 60
+    return round(minutes) or None
+
+def _clean_text(value: Any) -> str:
+    """
+    Убирает HTML-теги и сущности, схлопывает пробелы
+    """
+    if value is None:
+        return ""
+    if isinstance(value, dict):
+        value = value.get("text") or value.get("name") or ""
+    text = html.unescape(_TAG_RE.sub(" ", str(value)))
+    return re.sub(r'\s+', ' ', text).strip()
+
+def _is_recipe_type(node: Dict[str, Any]) -> bool:
+    types = node.get("@type", [])
+    if not isinstance(types, list):
+        types = [types]
+    return any(isinstance(t, str) and t.rsplit("/", 1)[-1].rsplit(":", 1)[-1] == "Recipe" for t in types)
+
+def _find_recipe_node(data: Any) -> Optional[Dict[str, Any]]:
+    """
+    Ищет узел @type Recipe в JSON-LD, в том числе внутри списков и @graph
+    """
+    if isinstance(data, list):
+        for entry in data:
+            node = _find_recipe_node(entry)
+            if node:
+                return node
+    elif isinstance(data, dict):
+        if _is_recipe_type(data):
+            return data
+        for key in ("@graph", "mainEntity", "mainEntityOfPage"):
+            if key in data:
+                node = _find_recipe_node(data[key])
+                if node:
+                    return node
+    return None
+
+def _as_list(value: Any) -> list:
+    if value is None:
+        return []
+    return value if isinstance(value, list) else [value]
+
+def _parse_instructions(value: Any) -> List[str]:
+    """
+    Разворачивает recipeInstructions: строку, список строк, HowToStep, HowToSection/ItemList
+    """
+    steps = []
+    if isinstance(value, str):
+        # Инструкции одной строкой: делим по переносам строк
+        for line in re.split(r'\n+|<br\s*/?>|</p>|</li>', value):
+            line = _clean_text(line)
+            if line:
+                steps.append(line)
+        return steps
+    for item in _as_list(value):
+        if isinstance(item, dict) and "itemListElement" in item:
+            steps.extend(_parse_instructions(item["itemListElement"]))
+        else:
+            step = _clean_text(item)
+            if step:
+                steps.append(step)
+    return steps
+
+def _parse_image(value: Any) -> Optional[str]:
+    for item in _as_list(value):
+        if isinstance(item, str) and item:
+            return item
+        if isinstance(item, dict):
+            url = item.get("url") or item.get("contentUrl")
+            if url:
+                return url
+    return None
+
+def _parse_yield(value: Any) -> Optional[int]:
+    for item in _as_list(value):
+        if isinstance(item, (int, float)) and item > 0:
+            return int(item)
+        match = re.search(r'\d+', str(item))
+        if match and int(match.group()) > 0:
+            return int(match.group())
+    return None
+
+def _parse_keywords(*values: Any) -> List[str]:
+    tags = []
+    for value in values:
+        for item in _as_list(value):
+            for tag in str(item).split(","):
+                tag = _clean_text(tag)
+                if tag and tag.lower() not in (t.lower() for t in tags):
+                    tags.append(tag)
+    return tags
+
+def recipe_from_schema(node: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Переводит schema.org Recipe в наш формат рецепта.
+    В результат попадают только найденные поля
+    """
+    recipe = {}
+    title = _clean_text(node.get("name") or node.get("headline"))
+    if title:
+        recipe["title"] = title
+    description = _clean_text(node.get("description"))
+    if description:
+        recipe["description"] = description
+    ingredients = [_clean_text(i) for i in _as_list(node.get("recipeIngredient") or node.get("ingredients"))]
+    ingredients = [i for i in ingredients if i]
+    if ingredients:
+        recipe["ingredients"] = ingredients
+    instructions = _parse_instructions(node.get("recipeInstructions"))
+    if instructions:
+        recipe["instructions"] = instructions
+
+    cooking_time = parse_iso_duration(node.get("totalTime"))
+    if cooking_time is None:
+        prep = parse_iso_duration(node.get("prepTime")) or 0
+        cook = parse_iso_duration(node.get("cookTime")) or 0
+        cooking_time = (prep + cook) or None
+    if cooking_time:
+        recipe["cooking_time"] = cooking_time
+
+    servings = _parse_yield(node.get("recipeYield"))
+    if servings:
+        recipe["servings"] = servings
+    cuisine = _as_list(node.get("recipeCuisine"))
+    if cuisine and _clean_text(cuisine[0]):
+        recipe["cuisine"] = _clean_text(cuisine[0])
+    tags = _parse_keywords(node.get("keywords"), node.get("recipeCategory"))
+    if tags:
+        recipe["tags"] = tags
+    image_url = _parse_image(node.get("image") or node.get("thumbnailUrl"))
+    if image_url:
+        recipe["image_url"] = image_url
+    return recipe
+
+def recipe_from_json_ld(blocks: List[str]) -> Optional[Dict[str, Any]]:
+    """
+    Ищет рецепт в содержимом блоков <script type="application/ld+json">
+    """
+    for block in blocks:
+        try:
+            data = json.loads(block, strict=False)
+        except (TypeError, ValueError):
+            continue
+        node = _find_recipe_node(data)
+        if node:
+            return recipe_from_schema(node)
+    return None
+
+def _microdata_value(tag) -> Any:
+    if tag.has_attr("content"):
+        return tag["content"]
+    if tag.name in ("img", "source") and tag.get("src"):
+        return tag["src"]
+    if tag.name in ("a", "link") and tag.get("href"):
+        return tag["href"]
+    if tag.name == "time" and tag.get("datetime"):
+        return tag["datetime"]
+    return tag.get_text(separator="\n", strip=True)
+
+def recipe_from_microdata(soup) -> Optional[Dict[str, Any]]:
+    """
+    Ищет рецепт в microdata (itemtype schema.org/Recipe) и собирает его
+    в тот же словарь свойств, что и JSON-LD
+    """
+    scope = soup.find(attrs={"itemtype": re.compile(r'schema\.org/Recipe/?$', re.IGNORECASE)})
+    if not scope:
+        return None
+    node = {"@type": "Recipe"}
+    multi = {"recipeIngredient", "ingredients", "recipeInstructions", "keywords", "recipeCategory", "image"}
+    for tag in scope.find_all(attrs={"itemprop": True}):
+        # Свойства вложенных сущностей (автор, шаг HowToStep) пропускаем
+        if tag.find_parent(attrs={"itemscope": True}) is not scope:
+            continue
+        for prop in tag["itemprop"].split():
+            value = _microdata_value(tag)
+            if prop in multi:
+                node.setdefault(prop, []).append(value)
+            else:
+                node.setdefault(prop, value)
+    # Текст шагов в microdata часто идет одним блоком с <br> или <p>
+    if node.get("recipeInstructions"):
+        node["recipeInstructions"] = "\n".join(node["recipeInstructions"])
+    return recipe_from_schema(node)
+
+def is_complete(recipe: Optional[Dict[str, Any]]) -> bool:
+    """
+    Проверяет, что в рецепте есть все поля, которые нельзя заполнить по умолчанию
+    """
+    return bool(recipe) and all(recipe.get(field) for field in REQUIRED_FIELDS)
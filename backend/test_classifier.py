@@ -0,0 +1,19 @@
+from classifier import determine_cuisine, determine_difficulty
+
+def test_short_stem_does_not_match_longer_word():
+    # «тако» — не начало «такой»
+    assert determine_cuisine("Такой вкусный пирог", []) == "International"
+    assert determine_cuisine("Пирог", ["мука", "собака не ела"]) == "International"
+
+def test_short_stem_matches_listed_forms():
+    assert determine_cuisine("Тако с говядиной", []) == "Mexican"
+    assert determine_cuisine("Лапша", ["соевый соус", "обжарить в воке"]) == "Chinese"
+
+def test_listed_forms_do_not_match_longer_word():
+    # «temper» — не начало «temperature»
+    assert determine_difficulty(20, 3, ['Bring eggs to room temperature', 'Mix']) == "Easy"
+    assert determine_difficulty(20, 3, ['Temper the chocolate', 'Mix']) != "Easy"
+
+def test_verb_dal_is_not_indian_dish():
+    assert determine_cuisine("Пирог, который дал мне сосед", ["мука", "сахар"]) == "International"
+    assert determine_cuisine("Даль из красной чечевицы", ["dal", "зира"]) == "Indian"
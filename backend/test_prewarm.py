@@ -0,0 +1,10 @@
+from prewarm import IMPORT_BUDGET_MS, measure_import
+
+def test_main_import_does_not_load_heavy_modules():
+    # Импорт идет в отдельном процессе: модули, загруженные тестами, не мешают
+    assert measure_import("main")["heavy"] == []
+
+def test_main_import_fits_budget():
+    # Медиана трех запусков: первый может читать файлы с холодного диска
+    times = sorted(measure_import("main")["milliseconds"] for _ in range(3))
+    assert times[1] <= IMPORT_BUDGET_MS, f"import main takes {times[1]:.0f} ms"
@@ -0,0 +1,64 @@
+import hashlib
+import os
+from datetime import datetime, timedelta
+from typing import Dict, Any, List, Optional
+
+import database
+import metrics
+
+# Запись живет TRANSCRIPT_CACHE_TTL секунд с последнего попадания: часто
+# пересылаемые ролики остаются в кэше, остальные удаляет TTL-индекс MongoDB
+TRANSCRIPT_CACHE_TTL = int(os.getenv("TRANSCRIPT_CACHE_TTL", 30 * 24 * 3600))
+
+def media_key(platform: str, media_id: Any) -> Optional[str]:
+    """
+    Ключ по ID ролика на платформе (одинаков для всех ссылок на этот ролик)
+    """
+    return f"media:{platform}:{media_id}" if media_id else None
+
+def fingerprint_key(fingerprint: Optional[str], caption: Optional[str]) -> Optional[str]:
+    """
+    Вторичный ключ по отпечатку звука вместе с подписью к ролику. Один звук
+    бывает у тысяч разных роликов, поэтому без совпадающей подписи
+    отпечаток ключом не считается (None)
+    """
+    caption = " ".join((caption or "").lower().split())
+    if not fingerprint or not caption:
+        return None
+    return "fp:" + hashlib.sha1(f"{fingerprint}|{caption}".encode()).hexdigest()
+
+async def lookup(keys: List[Optional[str]]) -> Optional[Dict[str, Any]]:
+    """
+    Возвращает запись {transcript, recipe} по первому найденному ключу или None
+    """
+    keys = [key for key in keys if key]
+    if not keys:
+        return None
+    try:
+        expires_at = datetime.utcnow() + timedelta(seconds=TRANSCRIPT_CACHE_TTL)
+        cached = await database.find_transcript(keys, expires_at)
+    except Exception as e:
+        print(f"[ERROR] Ошибка чтения кэша транскриптов: {e}")
+        metrics.incr("transcript_cache.errors")
+        return None
+    # Среднее значение этого измерения в /api/metrics — доля попаданий
+    metrics.observe("transcript_cache.hit_rate", 1.0 if cached else 0.0)
+    if not cached:
+        metrics.incr("transcript_cache.misses")
+        return None
+    metrics.incr(f"transcript_cache.hits.{cached['_id'].split(':')[0]}")
+    return cached
+
+async def save(keys: List[Optional[str]], transcript: Optional[str], recipe: Dict[str, Any]) -> None:
+    """
+    Сохраняет транскрипт и рецепт под всеми известными ключами ролика
+    """
+    keys = [key for key in keys if key]
+    if not keys:
+        return
+    try:
+        expires_at = datetime.utcnow() + timedelta(seconds=TRANSCRIPT_CACHE_TTL)
+        await database.save_transcript(keys, transcript, recipe, expires_at)
+    except Exception as e:
+        print(f"[ERROR] Ошибка записи кэша транскриптов: {e}")
+        metrics.incr("transcript_cache.errors")
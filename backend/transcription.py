@@ -0,0 +1,213 @@
+import asyncio
+import os
+import time
+from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
+from typing import List
+
+from dotenv import load_dotenv
+
+import metrics
+
+load_dotenv()
+
+# Бэкенд распознавания речи: local (faster-whisper на CPU) или openai (Whisper API)
+TRANSCRIBE_BACKEND = os.getenv("TRANSCRIBE_BACKEND", "local")
+TRANSCRIBE_LANGUAGE = os.getenv("TRANSCRIBE_LANGUAGE") or None
+# Загружать модель при старте приложения, а не при первой транскрипции
+TRANSCRIBE_PRELOAD = os.getenv("TRANSCRIBE_PRELOAD", "false").lower() == "true"
+
+# Локальная модель: int8 на CPU, параллельные потоки декодирования
+TRANSCRIBE_MODEL = os.getenv("TRANSCRIBE_MODEL", "small")
+TRANSCRIBE_COMPUTE_TYPE = os.getenv("TRANSCRIBE_COMPUTE_TYPE", "int8")
+TRANSCRIBE_WORKERS = int(os.getenv("TRANSCRIBE_WORKERS", min(4, os.cpu_count() or 1)))
+TRANSCRIBE_BEAM_SIZE = int(os.getenv("TRANSCRIBE_BEAM_SIZE", 1))
+# Границы длины фрагмента: окно Whisper — 30 секунд
+TRANSCRIBE_MIN_CHUNK_SECONDS = float(os.getenv("TRANSCRIBE_MIN_CHUNK_SECONDS", 10))
+TRANSCRIBE_MAX_CHUNK_SECONDS = float(os.getenv("TRANSCRIBE_MAX_CHUNK_SECONDS", 28))
+# Фрагменты тише этого уровня (дБ) считаются тишиной и не распознаются
+TRANSCRIBE_SILENCE_DB = float(os.getenv("TRANSCRIBE_SILENCE_DB", -45))
+
+# Удаленный бэкенд
+TRANSCRIBE_REMOTE_MODEL = os.getenv("TRANSCRIBE_REMOTE_MODEL", "whisper-1")
+TRANSCRIBE_REMOTE_CONCURRENCY = int(os.getenv("TRANSCRIBE_REMOTE_CONCURRENCY", 4))
+
+SAMPLE_RATE = 16000
+FRAME_SECONDS = 0.03
+
+class TranscriptionBackend(ABC):
+    """Интерфейс бэкенда распознавания речи"""
+
+    def load(self) -> None:
+        """Подготавливает бэкенд (загружает модель); вызывается один раз"""
+
+    @abstractmethod
+    async def transcribe(self, audio_path: str) -> str:
+        """Распознает аудиофайл и возвращает текст"""
+
+    async def close(self) -> None:
+        """Освобождает ресурсы бэкенда"""
+
+def split_on_silence(audio, sample_rate: int = SAMPLE_RATE,
+                     min_seconds: float = None, max_seconds: float = None) -> List:
+    """
+    Делит аудио (numpy-массив float32) на фрагменты не длиннее max_seconds,
+    разрезая в самом тихом месте между min_seconds и max_seconds, чтобы не
+    рвать слова. Полностью тихие фрагменты отбрасываются
+    """
+    import numpy as np
+
+    min_seconds = min_seconds or TRANSCRIBE_MIN_CHUNK_SECONDS
+    max_seconds = max_seconds or TRANSCRIBE_MAX_CHUNK_SECONDS
+    frame = int(sample_rate * FRAME_SECONDS)
+    frames = len(audio) // frame
+    if frames == 0:
+        return []
+    # Средняя громкость (RMS) каждого окна по 30 мс
+    rms = np.sqrt(np.mean(audio[:frames * frame].reshape(frames, frame) ** 2, axis=1))
+    silence = 10 ** (TRANSCRIBE_SILENCE_DB / 20)
+    min_frames = int(min_seconds / FRAME_SECONDS)
+    max_frames = int(max_seconds / FRAME_SECONDS)
+
+    chunks = []
+    start = 0
+    while start < frames:
+        if frames - start <= max_frames:
+            end = frames
+        else:
+            window = rms[start + min_frames:start + max_frames]
+            end = start + min_frames + int(np.argmin(window))
+        if rms[start:end].max() > silence:
+            chunks.append(audio[start * frame:end * frame if end < frames else len(audio)])
+        start = end
+    return chunks
+
+class LocalWhisperBackend(TranscriptionBackend):
+    """
+    faster-whisper (CTranslate2) на CPU с int8-квантованием. Модель загружается
+    один раз на процесс; фрагменты аудио распознаются параллельно в пуле потоков
+    (CTranslate2 отпускает GIL), каждый поток использует свою часть ядер
+    """
+
+    def __init__(self, model: str = None, workers: int = None, cpu_threads: int = None):
+        self.model_name = model or TRANSCRIBE_MODEL
+        self.workers = max(1, workers or TRANSCRIBE_WORKERS)
+        self.cpu_threads = cpu_threads or max(1, (os.cpu_count() or 1) // self.workers)
+        self._model = None
+        self._executor = None
+        self._lock = asyncio.Lock()
+
+    def load(self) -> None:
+        if self._model is not None:
+            return
+        from faster_whisper import WhisperModel
+
+        started = time.perf_counter()
+        self._model = WhisperModel(
+            self.model_name,
+            device="cpu",
+            compute_type=TRANSCRIBE_COMPUTE_TYPE,
+            cpu_threads=self.cpu_threads,
+            num_workers=self.workers
+        )
+        self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="whisper")
+        print(f"[LOG] Модель распознавания {self.model_name} загружена за {time.perf_counter() - started:.1f} с")
+
+    def _transcribe_chunk(self, chunk) -> str:
+        segments, _ = self._model.transcribe(
+            chunk,
+            language=TRANSCRIBE_LANGUAGE,
+            beam_size=TRANSCRIBE_BEAM_SIZE,
+            condition_on_previous_text=False
+        )
+        return " ".join(segment.text.strip() for segment in segments)
+
+    async def transcribe_samples(self, audio) -> str:
+        """Распознает уже декодированное аудио (16 кГц моно float32)"""
+        if self._model is None:
+            async with self._lock:
+                if self._model is None:
+                    await asyncio.to_thread(self.load)
+        chunks = split_on_silence(audio)
+        metrics.incr("transcribe.chunks", len(chunks))
+        loop = asyncio.get_running_loop()
+        texts = await asyncio.gather(*[
+            loop.run_in_executor(self._executor, self._transcribe_chunk, chunk) for chunk in chunks
+        ])
+        return " ".join(text for text in texts if text)
+
+    async def transcribe(self, audio_path: str) -> str:
+        from faster_whisper import decode_audio
+
+        audio = await asyncio.to_thread(decode_audio, audio_path, sampling_rate=SAMPLE_RATE)
+        metrics.observe("transcribe.audio_seconds", len(audio) / SAMPLE_RATE)
+        return await self.transcribe_samples(audio)
+
+    async def close(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+        self._model = None
+
+class OpenAITranscriptionBackend(TranscriptionBackend):
+    """Распознавание через Whisper API по общему клиенту OpenAI"""
+
+    def __init__(self, model: str = None):
+        self.model_name = model or TRANSCRIBE_REMOTE_MODEL
+        self._semaphore = asyncio.Semaphore(TRANSCRIBE_REMOTE_CONCURRENCY)
+
+    async def transcribe(self, audio_path: str) -> str:
+        from llm_client import get_client
+
+        kwargs = {"language": TRANSCRIBE_LANGUAGE} if TRANSCRIBE_LANGUAGE else {}
+        async with self._semaphore:
+            with open(audio_path, "rb") as audio_file:
+                return await get_client().audio.transcriptions.create(
+                    model=self.model_name,
+                    file=audio_file,
+                    response_format="text",
+                    **kwargs
+                )
+
+_BACKENDS = {
+    "local": LocalWhisperBackend,
+    "openai": OpenAITranscriptionBackend,
+}
+_backend = None
+
+def get_backend() -> TranscriptionBackend:
+    """
+    Возвращает бэкенд распознавания из TRANSCRIBE_BACKEND, создавая его при первом вызове
+    """
+    global _backend
+    if _backend is None:
+        if TRANSCRIBE_BACKEND not in _BACKENDS:
+            raise Exception(f"Неподдерживаемый TRANSCRIBE_BACKEND: {TRANSCRIBE_BACKEND}")
+        _backend = _BACKENDS[TRANSCRIBE_BACKEND]()
+    return _backend
+
+async def transcribe_audio(audio_path: str) -> str:
+    """
+    Распознает речь в аудиофайле выбранным бэкендом
+    """
+    started = time.perf_counter()
+    text = await get_backend().transcribe(audio_path)
+    metrics.incr("transcribe.files")
+    metrics.observe("transcribe.seconds", time.perf_counter() - started)
+    return text.strip() if text else ""
+
+async def preload() -> None:
+    """
+    Загружает модель при старте приложения, если включен TRANSCRIBE_PRELOAD
+    """
+    if TRANSCRIBE_PRELOAD:
+        await asyncio.to_thread(get_backend().load)
+
+async def close_backend() -> None:
+    """
+    Освобождает модель и пул потоков (при остановке приложения)
+    """
+    global _backend
+    if _backend is not None:
+        await _backend.close()
+        _backend = None